@@ -0,0 +1,35 @@
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    SQLite tuned for a web application: readers don't block the writer, and writers wait for each other instead of
+    failing with "database is locked".
+
+    The pragmas can be changed with the "pragmas" option, and the "transaction_mode" option sets how transactions
+    start. IMMEDIATE takes the write lock at the start, so a transaction never has to upgrade its read lock, which
+    SQLite can't wait for.
+    """
+
+    pragmas = {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,
+        "mmap_size": 256 * 1024 * 1024,
+    }
+    transaction_mode = "IMMEDIATE"
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        self.pragmas = {**self.pragmas, **params.pop("pragmas", {})}
+        self.transaction_mode = params.pop("transaction_mode", self.transaction_mode)
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute(f"BEGIN {self.transaction_mode}")
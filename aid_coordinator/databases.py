@@ -0,0 +1,31 @@
+"""
+Database profiles for settings.DATABASES. The default is the tuned SQLite profile, a deployment can switch to
+PostgreSQL in its local_settings.py, see the README.
+"""
+
+# How long a connection is reused, in seconds
+CONN_MAX_AGE = 600
+
+
+def sqlite_database(name, **options) -> dict:
+    return {
+        "ENGINE": "aid_coordinator.backends.sqlite3",
+        "NAME": name,
+        "CONN_MAX_AGE": CONN_MAX_AGE,
+        "OPTIONS": options,
+    }
+
+
+def postgresql_database(
+    name: str, user: str = "", password: str = "", host: str = "", port: str = "", **options
+) -> dict:
+    return {
+        "ENGINE": "django.db.backends.postgresql",
+        "NAME": name,
+        "USER": user,
+        "PASSWORD": password,
+        "HOST": host,
+        "PORT": port,
+        "CONN_MAX_AGE": CONN_MAX_AGE,
+        "OPTIONS": options,
+    }
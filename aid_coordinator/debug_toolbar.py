@@ -11,6 +11,10 @@ def show_toolbar(request: HttpRequest):
     if not settings.DEBUG:
         return False
 
+    return is_internal_ip(request)
+
+
+def is_internal_ip(request: HttpRequest):
     # Extract the remote address, and no address = no toolbar
     try:
         remote_addr = ipaddress.ip_address(request.META.get("REMOTE_ADDR", "::"))
@@ -31,5 +35,5 @@ def show_toolbar(request: HttpRequest):
 
     sys.stdout.flush()
 
-    # No toolbar then
+    # Not internal then
     return False
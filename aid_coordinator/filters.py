@@ -1,4 +1,16 @@
+import hashlib
+from typing import Callable, Type
+from uuid import uuid4
+
 from django.contrib import admin
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.db import transaction
+from django.db.models import Model, QuerySet
+from django.db.models.signals import post_delete, post_save
+
+# Facets of related models, like the name of an organisation, aren't forgotten when those change, so keep them short
+FACETS_TIMEOUT = 300
 
 
 class InputFilter(admin.SimpleListFilter):
@@ -21,3 +33,69 @@ class InputFilter(admin.SimpleListFilter):
         Return the filtered queryset.
         """
         raise NotImplementedError("subclasses of ListFilter must provide a queryset() method")
+
+
+def facets_version_key(model: Type[Model]) -> str:
+    # noinspection PyProtectedMember
+    return f"facets-version-{model._meta.label_lower}"
+
+
+def forget_facets(model: Type[Model], using=None):
+    # A new random version instead of deleting keys, the cached facets of every queryset of the model are forgotten.
+    # Every worker reads the version from the shared cache, see settings.CACHES
+    transaction.on_commit(lambda: cache.set(facets_version_key(model), uuid4().hex, None), using=using)
+
+
+# noinspection PyUnusedLocal
+def facets_changed(sender, using=None, **kwargs):
+    forget_facets(sender, using)
+
+
+def watch_facets(*models: Type[Model]):
+    """
+    Forget the cached facets of these models whenever one of their objects is saved or deleted.
+    """
+    for model in models:
+        # noinspection PyProtectedMember
+        label = model._meta.label_lower
+        post_save.connect(facets_changed, sender=model, dispatch_uid=f"facets-saved-{label}")
+        post_delete.connect(facets_changed, sender=model, dispatch_uid=f"facets-deleted-{label}")
+
+
+def cached_facets(queryset: QuerySet, compute: Callable[[], list], *key_parts) -> list:
+    """
+    The values of a list filter, from the cache until an object of the model changes, see watch_facets().
+
+    The SQL of the queryset is part of the key, so filters that depend on the user each have their own values.
+    """
+    try:
+        sql, params = queryset.query.sql_with_params()
+    except EmptyResultSet:
+        return []
+
+    version = cache.get_or_set(facets_version_key(queryset.model), lambda: uuid4().hex, None)
+    digest = hashlib.md5(repr((sql, params, key_parts)).encode()).hexdigest()
+    key = f"facets-{version}-{digest}"
+
+    values = cache.get(key)
+    if values is None:
+        values = compute()
+        cache.set(key, values, FACETS_TIMEOUT)
+    return values
+
+
+class CachedAllValuesFieldListFilter(admin.AllValuesFieldListFilter):
+    def choices(self, changelist):
+        # Only when the filter is shown, exports and actions use the changelist as well
+        if isinstance(self.lookup_choices, QuerySet):
+            queryset = self.lookup_choices
+            self.lookup_choices = cached_facets(queryset, lambda: list(queryset))
+        yield from super().choices(changelist)
+
+
+class CachedRelatedOnlyFieldListFilter(admin.RelatedOnlyFieldListFilter):
+    def field_choices(self, field, request, model_admin):
+        pk_qs = model_admin.get_queryset(request).distinct().values_list(f"{self.field_path}__pk", flat=True)
+        ordering = self.field_admin_ordering(field, request, model_admin)
+        choices = super().field_choices
+        return cached_facets(pk_qs, lambda: choices(field, request, model_admin), ordering)
@@ -0,0 +1,210 @@
+"""
+Always-on instrumentation of the views: the number of queries, database time, template render time and response size
+of every request, per view.
+
+The template time is the time spent rendering template responses, which the admin and the API views return. The last
+samples of every view are kept in memory to calculate percentiles, and totals are counted for the Prometheus
+endpoint. Everything is per process, with several workers every worker reports its own requests.
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import ExitStack
+from typing import Deque, Dict, List, NamedTuple
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpRequest, HttpResponse
+
+
+class Sample(NamedTuple):
+    duration: float
+    queries: int
+    db_time: float
+    template_time: float
+    size: int
+
+
+class ViewStats:
+    def __init__(self, window: int):
+        self.samples: Deque[Sample] = deque(maxlen=window)
+        self.count = 0
+        self.errors = 0
+        self.totals = Sample(0.0, 0, 0.0, 0.0, 0)
+
+    def add(self, sample: Sample, error: bool):
+        self.samples.append(sample)
+        self.count += 1
+        self.errors += error
+        self.totals = Sample(*(total + value for total, value in zip(self.totals, sample)))
+
+    def percentiles(self, field: str, quantiles=(0.5, 0.95, 0.99)) -> Dict[float, float]:
+        values = sorted(getattr(sample, field) for sample in self.samples)
+        if not values:
+            return {quantile: 0.0 for quantile in quantiles}
+        return {quantile: values[min(int(quantile * len(values)), len(values) - 1)] for quantile in quantiles}
+
+    def maximum(self, field: str):
+        return max((getattr(sample, field) for sample in self.samples), default=0)
+
+
+class Metrics:
+    def __init__(self, window: int = 1000):
+        self.window = window
+        self.lock = threading.Lock()
+        self.views: Dict[str, ViewStats] = {}
+
+    def record(self, view: str, sample: Sample, error: bool = False):
+        with self.lock:
+            if view not in self.views:
+                self.views[view] = ViewStats(self.window)
+            self.views[view].add(sample, error)
+
+    def snapshot(self) -> Dict[str, ViewStats]:
+        with self.lock:
+            snapshot = {}
+            for view, stats in self.views.items():
+                copy = ViewStats(self.window)
+                copy.samples.extend(stats.samples)
+                copy.count, copy.errors, copy.totals = stats.count, stats.errors, stats.totals
+                snapshot[view] = copy
+            return snapshot
+
+    def reset(self):
+        with self.lock:
+            self.views = {}
+
+    def prometheus(self) -> str:
+        """
+        The metrics in the Prometheus text exposition format.
+        """
+
+        def label(view: str) -> str:
+            return view.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+        snapshot = sorted(self.snapshot().items())
+        lines = []
+        counters = (
+            ("requests_total", "Requests handled", lambda stats: stats.count),
+            ("errors_total", "Requests with a 5xx response", lambda stats: stats.errors),
+            ("queries_total", "Database queries", lambda stats: stats.totals.queries),
+            ("db_seconds_total", "Time spent in the database", lambda stats: stats.totals.db_time),
+            ("template_seconds_total", "Time spent rendering templates", lambda stats: stats.totals.template_time),
+            ("response_bytes_total", "Size of the responses", lambda stats: stats.totals.size),
+        )
+        for name, description, value in counters:
+            lines.append(f"# HELP view_{name} {description}")
+            lines.append(f"# TYPE view_{name} counter")
+            for view, stats in snapshot:
+                lines.append(f'view_{name}{{view="{label(view)}"}} {value(stats)}')
+
+        summaries = (
+            ("duration_seconds", "duration", "Response time of the recent requests"),
+            ("queries", "queries", "Database queries of the recent requests"),
+        )
+        for name, field, description in summaries:
+            lines.append(f"# HELP view_{name} {description}")
+            lines.append(f"# TYPE view_{name} summary")
+            for view, stats in snapshot:
+                for quantile, value in stats.percentiles(field).items():
+                    lines.append(f'view_{name}{{view="{label(view)}",quantile="{quantile}"}} {value}')
+                lines.append(f'view_{name}_sum{{view="{label(view)}"}} {getattr(stats.totals, field)}')
+                lines.append(f'view_{name}_count{{view="{label(view)}"}} {stats.count}')
+
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics(settings.METRICS_WINDOW)
+
+
+class QueryCounter:
+    """
+    A database execute wrapper that counts the queries and the time they take.
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.time += time.perf_counter() - start
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest):
+        counter = QueryCounter()
+        request.template_time = 0.0
+
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(counter))
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        if getattr(request, "resolver_match", None):
+            view = request.resolver_match.view_name
+        else:
+            view = "unresolved"
+
+        metrics.record(
+            view,
+            Sample(duration, counter.queries, counter.time, request.template_time, self.response_size(response)),
+            error=response.status_code >= 500,
+        )
+        return response
+
+    # noinspection PyMethodMayBeStatic
+    def process_template_response(self, request: HttpRequest, response: HttpResponse):
+        # Called just before the response is rendered, the callback right after
+        start = time.perf_counter()
+
+        def rendered(_response):
+            request.template_time += time.perf_counter() - start
+
+        response.add_post_render_callback(rendered)
+        return response
+
+    @staticmethod
+    def response_size(response: HttpResponse) -> int:
+        if response.streaming:
+            # Unknown until it has been sent
+            return 0
+        return len(response.content)
+
+
+def view_table(snapshot: Dict[str, ViewStats]) -> List[dict]:
+    """
+    The statistics for the admin page, slowest views first.
+    """
+    rows = []
+    for view, stats in snapshot.items():
+        duration = stats.percentiles("duration")
+        queries = stats.percentiles("queries")
+        rows.append(
+            {
+                "view": view,
+                "count": stats.count,
+                "errors": stats.errors,
+                "duration_p50": duration[0.5] * 1000,
+                "duration_p95": duration[0.95] * 1000,
+                "duration_p99": duration[0.99] * 1000,
+                "queries_p50": queries[0.5],
+                "queries_p95": queries[0.95],
+                "queries_max": stats.maximum("queries"),
+                "db_time_p95": stats.percentiles("db_time")[0.95] * 1000,
+                "template_time_p95": stats.percentiles("template_time")[0.95] * 1000,
+                "size_p95": stats.percentiles("size")[0.95],
+            }
+        )
+    rows.sort(key=lambda row: row["duration_p95"], reverse=True)
+    return rows
@@ -1,15 +1,159 @@
+import atexit
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from datetime import date, datetime
+from pathlib import Path
+from typing import List, Optional, Tuple
+
 from django.conf import settings
 from django.http import HttpRequest
 from django.utils.deprecation import MiddlewareMixin
 from django.utils.timezone import now
 
 
-class LogLocaleMiddleware(MiddlewareMixin):
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
+class LanguageLog:
+    """
+    Writes the language log from a background thread, so a request only has to put an entry on a queue.
+
+    Entries are written in batches to language-YYYY-MM-DD.log, with a number added when a file reaches max_bytes. Every
+    batch is a single write to a file opened for appending, so workers in other processes can log to the same files
+    without mixing up lines. The number of requests per day and language is appended to language-counts.log every
+    count_interval seconds, add up the lines for the totals.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        max_bytes: int = 10 * 1024 * 1024,
+        flush_interval: float = 1.0,
+        count_interval: float = 60.0,
+        max_batch: int = 1000,
+        max_queued: int = 10000,
+    ):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.count_interval = count_interval
+        self.max_batch = max_batch
+        self.max_queued = max_queued
+
+        self.pid = None
+        self.lock = threading.Lock()
+        self.queue: Optional[queue.Queue] = None
+        self.thread: Optional[threading.Thread] = None
+        self.counts = Counter()
+        self.dropped = 0
+
+        atexit.register(self.close)
+
+    def start(self):
+        with self.lock:
+            # After a fork the queue and the thread of the parent process are useless
+            if self.pid == os.getpid():
+                return
+
+            self.queue = queue.Queue(maxsize=self.max_queued)
+            self.counts = Counter()
+            self.pid = os.getpid()
+            self.thread = threading.Thread(target=self.run, name="language-log", daemon=True)
+            self.thread.start()
+
+    def log(self, ip: str, lang: str):
+        if self.pid != os.getpid():
+            self.start()
+
+        try:
+            self.queue.put_nowait((now(), ip, lang))
+        except queue.Full:
+            # Never let the request wait for the log
+            self.dropped += 1
+
+    def run(self):
+        next_count = time.monotonic() + self.count_interval
+        running = True
+        while running:
+            batch = []
+            try:
+                # Wait for an entry, then take whatever else is already queued
+                entry = self.queue.get(timeout=self.flush_interval)
+                while True:
+                    if entry is None:
+                        running = False
+                        break
+
+                    batch.append(entry)
+                    if len(batch) >= self.max_batch:
+                        break
+                    entry = self.queue.get_nowait()
+            except queue.Empty:
+                pass
 
-        self.log = open(settings.BASE_DIR / "language.log", "a")
+            try:
+                if batch:
+                    self.write(batch)
+                if not running or time.monotonic() >= next_count:
+                    self.write_counts()
+                    next_count = time.monotonic() + self.count_interval
+            except OSError:
+                # Losing some log lines is better than stopping the thread
+                self.dropped += len(batch)
 
+    def log_path(self, day: date) -> Path:
+        path = self.directory / f"language-{day}.log"
+        number = 0
+        while path.exists() and path.stat().st_size >= self.max_bytes:
+            number += 1
+            path = self.directory / f"language-{day}.{number}.log"
+        return path
+
+    def append(self, path: Path, lines: List[str]):
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, "".join(lines).encode())
+        finally:
+            os.close(fd)
+
+    def write(self, batch: List[Tuple[datetime, str, str]]):
+        days = {}
+        for when, ip, lang in batch:
+            day = when.date()
+            days.setdefault(day, []).append(f"{when} {ip} {lang}\n")
+            self.counts[day, lang] += 1
+
+        for day, lines in days.items():
+            self.append(self.log_path(day), lines)
+
+    def write_counts(self):
+        counts, self.counts = self.counts, Counter()
+        if self.dropped:
+            # The same clock as the entries, so both count towards the same day
+            counts[now().date(), "dropped"] += self.dropped
+            self.dropped = 0
+        if not counts:
+            return
+
+        self.append(
+            self.directory / "language-counts.log",
+            [f"{day} {lang} {count}\n" for (day, lang), count in sorted(counts.items())],
+        )
+
+    def close(self):
+        # Write what is still queued when the process exits
+        if self.pid == os.getpid():
+            try:
+                self.queue.put(None, timeout=self.flush_interval)
+            except queue.Full:
+                return
+            self.thread.join(timeout=5)
+
+
+language_log = LanguageLog(settings.LANGUAGE_LOG_DIR, max_bytes=settings.LANGUAGE_LOG_MAX_BYTES)
+
+
+class LogLocaleMiddleware(MiddlewareMixin):
     def process_request(self, request: HttpRequest):
         if "REMOTE_ADDR" in request.META:
             ip = request.META["REMOTE_ADDR"]
@@ -21,5 +165,4 @@ class LogLocaleMiddleware(MiddlewareMixin):
         else:
             lang = "unset"
 
-        self.log.write(f"{now()} {ip} {lang}\n")
-        self.log.flush()
+        language_log.log(ip, lang)
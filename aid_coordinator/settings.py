@@ -14,6 +14,8 @@ from pathlib import Path
 
 from django.utils.translation import gettext_lazy as _
 
+from aid_coordinator.databases import sqlite_database
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -64,6 +66,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "xff.middleware.XForwardedForMiddleware",
+    "aid_coordinator.metrics.MetricsMiddleware",
     "django.middleware.locale.LocaleMiddleware",
     "aid_coordinator.middleware.LogLocaleMiddleware",
     "debug_toolbar.middleware.DebugToolbarMiddleware",
@@ -108,11 +111,24 @@ WSGI_APPLICATION = "aid_coordinator.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/4.0/ref/settings/#databases
 
+# Use postgresql_database() in local_settings.py to switch to PostgreSQL
 DATABASES = {
+    "default": sqlite_database(BASE_DIR / "db.sqlite3"),
+}
+
+# Cache
+# https://docs.djangoproject.com/en/4.0/topics/cache/
+
+# Roles, API responses, item summaries and list filters are cached and forgotten after changes, so every worker must
+# use the same cache. Files work for the workers of one host, use redis in local_settings.py for several hosts.
+CACHES = {
     "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
-    }
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": BASE_DIR / "cache",
+        "OPTIONS": {
+            "MAX_ENTRIES": 10000,
+        },
+    },
 }
 
 # Password validation
@@ -165,6 +181,7 @@ DEBUG_TOOLBAR_CONFIG = {
 }
 
 AUTH_USER_MODEL = "contacts.Contact"
+AUTHENTICATION_BACKENDS = ["contacts.backends.ContactBackend"]
 LOGIN_URL = "/admin/login"
 
 REST_FRAMEWORK = {
@@ -175,7 +192,7 @@ REST_FRAMEWORK = {
     ],
     "DEFAULT_FILTER_BACKENDS": [
         "django_filters.rest_framework.DjangoFilterBackend",
-        "rest_framework.filters.SearchFilter",
+        "supply_demand.search.IndexedSearchFilter",
     ],
 }
 
@@ -184,6 +201,16 @@ IMPORT_EXPORT_SKIP_ADMIN_LOG = True
 IMPORT_EXPORT_IMPORT_PERMISSION_CODE = "add"
 IMPORT_EXPORT_EXPORT_PERMISSION_CODE = "view"
 
+# Where LogLocaleMiddleware writes language-YYYY-MM-DD.log and language-counts.log
+LANGUAGE_LOG_DIR = BASE_DIR
+LANGUAGE_LOG_MAX_BYTES = 10 * 1024 * 1024
+
+# Number of recent requests per view that MetricsMiddleware keeps for the percentiles
+METRICS_WINDOW = 1000
+
+# Changes older than this are moved to the compressed archive by the archive_changes command
+CHANGE_RETENTION_DAYS = 365
+
 REGISTRATION_OPEN = True
 ACCOUNT_ACTIVATION_DAYS = 3650
 
@@ -0,0 +1,207 @@
+"""
+The base classes for tests that guard the number of queries of the admin, the API and the views.
+
+The test data is seeded once per test case class, with enough offers, items and claims that a query per row stands
+out. The budgets are maximums: a change that needs fewer queries passes, one that adds a query per row fails.
+"""
+
+import random
+from contextlib import contextmanager
+from typing import List, Type
+
+from django.contrib.auth.models import Group, Permission
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Model
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from contacts.models import Contact, Organisation
+from logistics.models import Claim, EquipmentData, Location, Shipment
+from supply_demand.models import ItemType, Offer, OfferItem, Request, RequestItem
+from supply_demand.search import has_fts_table, indexes
+
+BRANDS = ("Cisco", "Juniper", "Arista", "Ubiquiti", "MikroTik", "Nokia", "HPE", "Dell")
+
+
+class QueryBudgetMixin:
+    """
+    The budget assertions, for test cases with their own data and a superuser to log in with.
+    """
+
+    superuser: Contact
+
+    def setUp(self):
+        super().setUp()
+        # Measure the worst case, without the summaries and API responses of an earlier test
+        cache.clear()
+        # Like the reverse proxy in front of the application does, XFF_STRICT rejects requests without it
+        self.client.defaults["HTTP_X_FORWARDED_FOR"] = "127.0.0.1"
+        self.client.force_login(self.superuser)
+
+    @contextmanager
+    def assertMaxQueries(self, budget: int):
+        with CaptureQueriesContext(connection) as context:
+            yield context
+
+        if len(context) > budget:
+            queries = "\n".join(f"{number}. {query['sql']}" for number, query in enumerate(context.captured_queries, 1))
+            self.fail(f"{len(context)} queries executed, the budget is {budget}\n{queries}")
+
+    def assertRequestWithinBudget(self, method: str, url: str, budget: int, **kwargs):
+        with self.assertMaxQueries(budget):
+            response = getattr(self.client, method)(url, **kwargs)
+            if response.streaming:
+                b"".join(response.streaming_content)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def assertGetWithinBudget(self, url: str, budget: int, **kwargs):
+        return self.assertRequestWithinBudget("get", url, budget, **kwargs)
+
+    def assertPostWithinBudget(self, url: str, data: dict, budget: int):
+        return self.assertRequestWithinBudget("post", url, budget, data=data)
+
+    def export(self, model: Type[Model], action: str, budget: int):
+        # Every row, the number of queries must not depend on it
+        data = {"action": action, "select_across": 1, "_selected_action": model.objects.values("pk")[0]["pk"]}
+        return self.assertPostWithinBudget(changelist_url(model), data, budget)
+
+    def assertSameExport(self, model: Type[Model], pks: List[int]):
+        """
+        The streaming CSV export of these objects has the same lines as the CSV export of django-import-export.
+        """
+        data = {"_selected_action": pks}
+        streamed = self.client.post(changelist_url(model), {**data, "action": "export_csv"})
+        # The first format is CSV
+        exported = self.client.post(changelist_url(model), {**data, "action": "export_admin_action", "file_format": 0})
+        lines = b"".join(streamed.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), len(pks) + 1)
+        self.assertEqual(lines, exported.content.decode("utf-8-sig").splitlines())
+        return lines
+
+
+def changelist_url(model: Type[Model]) -> str:
+    # noinspection PyProtectedMember
+    return reverse(f"admin:{model._meta.app_label}_{model._meta.model_name}_changelist")
+
+
+class QueryBudgetTestCase(QueryBudgetMixin, TestCase):
+    organisations = 50
+    contacts = 200
+    offers = 500
+    offer_items = 5000
+    requests = 200
+    request_items = 2000
+    claims = 2000
+    shipments = 20
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(0)
+
+        donors, requesters, _viewers = (Group.objects.create(name=name) for name in ("Donors", "Requesters", "Viewers"))
+        # The admin checks the model permissions before the object permissions
+        donors.permissions.set(Permission.objects.filter(content_type__model__in=("offer", "offeritem")))
+        requesters.permissions.set(Permission.objects.filter(content_type__model__in=("request", "requestitem")))
+        organisations = Organisation.objects.bulk_create(
+            [Organisation(name=f"Organisation {number}", listed=True) for number in range(cls.organisations)]
+        )
+
+        contacts = Contact.objects.bulk_create(
+            [
+                Contact(
+                    username=f"contact-{number}",
+                    first_name=f"First {number}",
+                    last_name=f"Last {number}",
+                    email=f"contact-{number}@example.com",
+                    organisation=organisations[number % len(organisations)] if number % 4 else None,
+                    listed=True,
+                )
+                for number in range(cls.contacts)
+            ]
+        )
+        Contact.groups.through.objects.bulk_create(
+            [
+                Contact.groups.through(contact_id=contact.pk, group_id=(donors, requesters)[number % 2].pk)
+                for number, contact in enumerate(contacts)
+            ]
+        )
+        donor_contacts, requester_contacts = contacts[0::2], contacts[1::2]
+        # A requester of an organisation with several requesters
+        cls.requester = requester_contacts[0]
+
+        cls.superuser = Contact.objects.create(username="admin", is_superuser=True)
+
+        def model(number: int) -> str:
+            return f"X{number % 700}-{number % 7}"
+
+        # bulk_create doesn't call save(), which copies the organisation of the contact
+        def owned(model_class, contacts: List[Contact], **kwargs):
+            contact = rng.choice(contacts)
+            return model_class(contact=contact, owner_organisation_id=contact.organisation_id, **kwargs)
+
+        offers = Offer.objects.bulk_create(
+            [owned(Offer, donor_contacts, description=f"Offer {number}") for number in range(cls.offers)]
+        )
+        offer_items = OfferItem.objects.bulk_create(
+            [
+                OfferItem(
+                    offer=offers[number % len(offers)],
+                    type=ItemType.HARDWARE,
+                    brand=BRANDS[number % len(BRANDS)],
+                    model=model(number),
+                    amount=rng.randint(1, 20),
+                    notes=f"Notes {number}",
+                )
+                for number in range(cls.offer_items)
+            ]
+        )
+
+        requests = Request.objects.bulk_create(
+            [owned(Request, requester_contacts, goal=f"Goal {number}") for number in range(cls.requests)]
+        )
+        request_items = RequestItem.objects.bulk_create(
+            [
+                RequestItem(
+                    request=requests[number % len(requests)],
+                    type=ItemType.HARDWARE,
+                    brand=BRANDS[number % len(BRANDS)],
+                    model=model(number),
+                    amount=rng.randint(1, 5),
+                )
+                for number in range(cls.request_items)
+            ]
+        )
+
+        location = Location.objects.create(name="Collection point", is_collection_point=True)
+        shipments = Shipment.objects.bulk_create(
+            [Shipment(name=f"Shipment {number}", current_location=location) for number in range(cls.shipments)]
+        )
+        Claim.objects.bulk_create(
+            [
+                Claim(
+                    offered_item=offer_items[number],
+                    requested_item=request_items[number % len(request_items)],
+                    shipment=shipments[number % len(shipments)] if number % 3 else None,
+                    current_location=location,
+                )
+                for number in range(cls.claims)
+            ]
+        )
+        OfferItem.objects.filter(pk__in=[item.pk for item in offer_items[: cls.claims]]).update(claimed_total=1)
+
+        EquipmentData.objects.bulk_create(
+            [
+                EquipmentData(brand=brand, model=model(number), weight=2.5, width=44, height=4, depth=30)
+                for number, brand in enumerate(BRANDS * 50)
+            ],
+            ignore_conflicts=True,
+        )
+
+        # bulk_create doesn't send signals, so the search texts are still missing
+        for index in indexes:
+            index.rebuild()
+        # Checked once per process, not by the first search that happens to be measured
+        has_fts_table()
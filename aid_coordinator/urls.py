@@ -5,7 +5,7 @@ from django.utils.translation import gettext_lazy as _
 from django_registration.backends.activation.views import RegistrationView
 from rest_framework import routers
 
-from aid_coordinator.views import ClaimAutocompleteView
+from aid_coordinator.views import ClaimAutocompleteView, MetricsView, prometheus_metrics
 from contacts.api import DonorOrganisationViewSet, PersonalDonorViewSet
 from contacts.forms import ContactRegistrationForm
 from logistics.views import RequestView
@@ -42,8 +42,10 @@ urlpatterns = [
         PasswordResetView.as_view(),
         name="admin_password_reset",
     ),
+    path("admin/metrics/", admin.site.admin_view(MetricsView.as_view()), name="metrics"),
     path("admin/", admin.site.urls),
     path("api/", include(router.urls)),
     path("i18n/", include("django.conf.urls.i18n")),
+    path("metrics", prometheus_metrics, name="prometheus_metrics"),
     path("__debug__/", include("debug_toolbar.urls")),
 ]
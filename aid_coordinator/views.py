@@ -1,7 +1,13 @@
 from django.contrib import admin
 from django.contrib.admin.views.autocomplete import AutocompleteJsonView
-from django.views.generic import FormView
+from django.core.exceptions import PermissionDenied
+from django.http import HttpRequest, HttpResponse
+from django.utils.decorators import method_decorator
+from django.views.generic import FormView, TemplateView
 
+from aid_coordinator.debug_toolbar import is_internal_ip
+from aid_coordinator.decorators import superuser_required
+from aid_coordinator.metrics import metrics, view_table
 from supply_demand.models import OfferItem
 
 
@@ -13,7 +19,7 @@ class ClaimAutocompleteView(AutocompleteJsonView):
         """
         if isinstance(obj, OfferItem):
             if obj.amount:
-                amount = f"{obj.amount - obj.claimed}x"
+                amount = f"{obj.available}x"
             else:
                 amount = "Multiple"
 
@@ -30,7 +36,7 @@ class ClaimAutocompleteView(AutocompleteJsonView):
             return super().serialize_result(obj, to_field_name)
 
 
-class AdminFormView(FormView):
+class AdminViewMixin:
     admin_model = None
 
     def get_context_data(self, **kwargs):
@@ -40,7 +46,30 @@ class AdminFormView(FormView):
         data.setdefault("site_header", admin.site.site_header)
         data.setdefault("has_permission", admin.site.has_permission(self.request))
 
-        # noinspection PyProtectedMember
-        data.setdefault("opts", self.admin_model._meta)
+        if self.admin_model:
+            # noinspection PyProtectedMember
+            data.setdefault("opts", self.admin_model._meta)
 
         return data
+
+
+class AdminFormView(AdminViewMixin, FormView):
+    pass
+
+
+@method_decorator(superuser_required(), name="dispatch")
+class MetricsView(AdminViewMixin, TemplateView):
+    template_name = "admin/metrics.html"
+
+    def get_context_data(self, **kwargs):
+        data = super().get_context_data(**kwargs)
+        data["views"] = view_table(metrics.snapshot())
+        data["window"] = metrics.window
+        return data
+
+
+def prometheus_metrics(request: HttpRequest):
+    if not (is_internal_ip(request) or request.user.is_superuser):
+        raise PermissionDenied
+
+    return HttpResponse(metrics.prometheus(), content_type="text/plain; version=0.0.4; charset=utf-8")
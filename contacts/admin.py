@@ -1,22 +1,20 @@
 from django import forms
 from django.contrib import admin, messages
 from django.contrib.auth.admin import UserAdmin
-from django.contrib.auth.tokens import default_token_generator
 from django.db import models
 from django.db.models import Case, F, Q, Value as V, When
 from django.db.models.functions import Concat
 from django.http import HttpRequest, HttpResponseRedirect
-from django.template.loader import render_to_string
 from django.urls import path, reverse
-from django.utils.encoding import force_bytes
 from django.utils.html import format_html, format_html_join
-from django.utils.http import urlsafe_base64_encode
-from django.utils.translation import gettext_lazy as _
+from django.utils.timezone import now
+from django.utils.translation import gettext_lazy as _, ngettext
 
 from contacts.filters import RequestedOrganisationFilter
 from contacts.forms import AddContactForm, ContactForm
-from contacts.models import Contact, Organisation
+from contacts.models import Contact, Organisation, OutgoingEmail
 from contacts.views import EmailView
+from contacts.welcome import WelcomeEmails
 
 
 @admin.register(Contact)
@@ -159,55 +157,51 @@ class ContactAdmin(UserAdmin):
 
     @admin.action(description=_("Send welcome email"), permissions=["mail"])
     def send_welcome_email(self, request: HttpRequest, queryset: Contact.objects):
-        queryset = queryset.prefetch_related("groups")
-        queryset = queryset.select_related("organisation")
-        for contact in queryset:
-            if contact.is_superuser:
-                self.message_user(
-                    request,
-                    f"Not sending a message to superuser {contact}",
-                    level=messages.WARNING,
-                )
-                continue
+        welcome_emails = WelcomeEmails(request)
+        count = 0
+        for contacts in Contact.objects.in_chunks(queryset.values_list("pk", flat=True)):
+            welcome = []
+            for contact in contacts:
+                if contact.is_superuser:
+                    self.message_user(
+                        request,
+                        f"Not sending a message to superuser {contact}",
+                        level=messages.WARNING,
+                    )
+                    continue
 
-            if not contact.group_names:
-                self.message_user(
-                    request,
-                    f"{contact} is not in a group, not sending welcome message",
-                    level=messages.ERROR,
-                )
-                continue
-
-            password_reset_url = (
-                "https://"
-                + request.get_host()
-                + reverse(
-                    "password_reset_confirm",
-                    kwargs={
-                        "uidb64": urlsafe_base64_encode(force_bytes(contact.pk)),
-                        "token": default_token_generator.make_token(contact),
-                    },
-                )
-            )
-            message = render_to_string(
-                "email/welcome.txt.j2",
-                {
-                    "request": request,
-                    "contact": contact,
-                    "groups": contact.group_names,
-                    "password_reset_url": password_reset_url,
-                },
+                if not contact.group_names:
+                    self.message_user(
+                        request,
+                        f"{contact} is not in a group, not sending welcome message",
+                        level=messages.ERROR,
+                    )
+                    continue
+
+                welcome.append(contact)
+
+            emails = welcome_emails.emails(welcome)
+            OutgoingEmail.objects.bulk_create(emails)
+            count += len(emails)
+
+        if count:
+            self.message_user(
                 request,
+                ngettext(
+                    "%(count)s welcome message has been queued for sending",
+                    "%(count)s welcome messages have been queued for sending",
+                    count,
+                )
+                % {"count": count},
             )
-            contact.email_user("Your keepukraineconnected.org account", message)
-
-            self.message_user(request, f"Sent welcome message to {contact}")
 
     # noinspection PyUnusedLocal
     @admin.action(description=_("Send custom email"), permissions=["mail"])
     def send_custom_email(self, request: HttpRequest, queryset: Contact.objects):
-        selected = queryset.values_list("pk", flat=True)
-        return HttpResponseRedirect("email/?contacts=%s" % (",".join(str(pk) for pk in selected),))
+        # Kept in the session, a URL can't hold thousands of contacts
+        return HttpResponseRedirect(
+            "email/?" + EmailView.store_selection(request, queryset.values_list("pk", flat=True))
+        )
 
     @admin.display(description=_("groups"))
     def admin_groups(self, contact: Contact):
@@ -317,3 +311,39 @@ class OrganisationAdmin(admin.ModelAdmin):
             return queryset.filter(id=request.user.organisation_id)
 
         return queryset.none()
+
+
+@admin.register(OutgoingEmail)
+class OutgoingEmailAdmin(admin.ModelAdmin):
+    list_display = ("to", "subject", "created_at", "sent_at", "attempts", "last_error")
+    list_filter = (("sent_at", admin.EmptyFieldListFilter), "attempts")
+    search_fields = ("to", "subject")
+    actions = ("retry",)
+
+    def has_module_permission(self, request):
+        return request.user.is_superuser
+
+    def has_view_permission(self, request, obj=None):
+        return request.user.is_superuser
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return request.user.is_superuser
+
+    @admin.action(description=_("Retry sending now"), permissions=["delete"])
+    def retry(self, request: HttpRequest, queryset: OutgoingEmail.objects):
+        count = queryset.filter(sent_at=None).update(attempts=0, next_attempt_at=now())
+        self.message_user(
+            request,
+            ngettext(
+                "%(count)s message will be retried",
+                "%(count)s messages will be retried",
+                count,
+            )
+            % {"count": count},
+        )
@@ -6,3 +6,7 @@ class ContactsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "contacts"
     verbose_name = _("Contacts")
+
+    def ready(self):
+        # Register the checks
+        from contacts import checks  # noqa: F401
@@ -0,0 +1,17 @@
+from django.contrib.auth.backends import ModelBackend
+
+from contacts.models import Contact
+
+
+class ContactBackend(ModelBackend):
+    """
+    Loads the user of a request with its organisation, but without the groups that Contact.objects prefetches:
+    the roles come from the cache, so most requests don't need them.
+    """
+
+    def get_user(self, user_id):
+        try:
+            user = Contact.objects.prefetch_related(None).select_related("organisation").get(pk=user_id)
+        except Contact.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+PER_PROCESS_CACHES = ["django.core.cache.backends.locmem.LocMemCache"]
+
+
+# noinspection PyUnusedLocal
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Changed roles and data are forgotten in the cache, with a cache per process the other workers keep the old ones.
+    """
+    if settings.CACHES["default"]["BACKEND"] not in PER_PROCESS_CACHES:
+        return []
+
+    return [
+        Warning(
+            "The default cache is kept per process.",
+            hint="Use a cache that every worker shares, like the file or redis cache, see the README.",
+            id="contacts.W001",
+        )
+    ]
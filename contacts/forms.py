@@ -4,6 +4,8 @@ from django.contrib.auth.models import Group
 from django.core.mail import mail_admins
 from django.utils.translation import gettext_lazy as _
 from django_registration.forms import RegistrationForm, RegistrationFormCaseInsensitive
+from jinja2 import Template, TemplateError
+from jinja2.sandbox import SandboxedEnvironment
 
 from contacts.models import Contact
 
@@ -66,6 +68,27 @@ class EmailForm(forms.Form):
         widget=forms.Textarea(attrs={"cols": "76", "rows": "30", "style": "font-family: monospace"}),
         initial=email_text,
     )
+    preview_count = forms.IntegerField(
+        label=_("Recipients to preview"),
+        initial=5,
+        min_value=1,
+        max_value=50,
+    )
+
+    # Custom emails are written in the admin, so they can only use what the sandbox considers safe. Methods that
+    # change data, like contact.delete(), are marked with alters_data and can't be called.
+    environment = SandboxedEnvironment()
+
+    template: Template
+
+    def clean_content(self):
+        content = self.cleaned_data["content"]
+        try:
+            # Compiled once for all recipients
+            self.template = self.environment.from_string(content)
+        except TemplateError as e:
+            raise forms.ValidationError(_("Invalid template: %(error)s"), params={"error": e})
+        return content
 
 
 class ContactRegistrationForm(RegistrationFormCaseInsensitive):
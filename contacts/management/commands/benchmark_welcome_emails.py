@@ -0,0 +1,106 @@
+import time
+
+from django.contrib.auth.models import Group
+from django.contrib.auth.tokens import default_token_generator
+from django.core.management import BaseCommand, CommandParser
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.test import RequestFactory
+from django.urls import reverse
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+from django.utils.translation import gettext as _
+
+from contacts.models import Contact, OutgoingEmail
+from contacts.welcome import WelcomeEmails
+
+
+class Command(BaseCommand):
+    help = _(
+        "Measure how many welcome emails per second are queued for temporary contacts. Nothing is kept, everything "
+        "happens in a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser: CommandParser):
+        parser.add_argument(
+            "contacts",
+            nargs="*",
+            default=[1000, 10000],
+            type=int,
+            help=_("numbers of contacts to benchmark with (default: 1000 10000)"),
+        )
+        parser.add_argument(
+            "--per-contact",
+            action="store_true",
+            help=_("also measure rendering one contact at a time, like before the bulk pipeline"),
+        )
+
+    def handle(self, *args, **options):
+        self.verbosity = options["verbosity"]
+        request = RequestFactory().get("/admin/contacts/contact/", SERVER_NAME="keepukraineconnected.org")
+
+        for count in options["contacts"]:
+            with transaction.atomic():
+                pks = self.create_contacts(count)
+
+                start = time.perf_counter()
+                queued = self.queue_emails(request, pks)
+                seconds = time.perf_counter() - start
+                self.stdout.write(f"{count} contacts: {queued} emails in {seconds:.2f}s, {queued / seconds:.0f}/s")
+
+                if options["per_contact"]:
+                    start = time.perf_counter()
+                    self.queue_per_contact(request, pks)
+                    seconds = time.perf_counter() - start
+                    self.stdout.write(f"{count} contacts one at a time: {seconds:.2f}s, {count / seconds:.0f}/s")
+
+                transaction.set_rollback(True)
+
+    def create_contacts(self, count: int):
+        group, created = Group.objects.get_or_create(name="Donors")
+        contacts = Contact.objects.bulk_create(
+            [
+                Contact(username=f"benchmark-{number}", first_name="Bench", email=f"benchmark-{number}@example.com")
+                for number in range(count)
+            ]
+        )
+        Contact.groups.through.objects.bulk_create(
+            [Contact.groups.through(contact_id=contact.pk, group_id=group.pk) for contact in contacts]
+        )
+        return [contact.pk for contact in contacts]
+
+    def queue_emails(self, request, pks) -> int:
+        welcome_emails = WelcomeEmails(request)
+        for contacts in Contact.objects.in_chunks(pks):
+            OutgoingEmail.objects.bulk_create(welcome_emails.emails(contacts))
+        if self.verbosity > 1:
+            self.stderr.write(f"rendering: {welcome_emails.throughput:.0f}/s")
+        return welcome_emails.count
+
+    def queue_per_contact(self, request, pks):
+        for contacts in Contact.objects.in_chunks(pks):
+            emails = []
+            for contact in contacts:
+                password_reset_url = (
+                    "https://"
+                    + request.get_host()
+                    + reverse(
+                        "password_reset_confirm",
+                        kwargs={
+                            "uidb64": urlsafe_base64_encode(force_bytes(contact.pk)),
+                            "token": default_token_generator.make_token(contact),
+                        },
+                    )
+                )
+                message = render_to_string(
+                    "email/welcome.txt.j2",
+                    {
+                        "request": request,
+                        "contact": contact,
+                        "groups": contact.group_names,
+                        "password_reset_url": password_reset_url,
+                    },
+                    request,
+                )
+                emails.append(OutgoingEmail.for_contact(contact, WelcomeEmails.subject, message))
+            OutgoingEmail.objects.bulk_create(emails)
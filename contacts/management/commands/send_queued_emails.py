@@ -0,0 +1,109 @@
+import smtplib
+import time
+from contextlib import suppress
+from datetime import timedelta
+from typing import List
+
+from django.core.mail import get_connection
+from django.core.management import BaseCommand, CommandParser
+from django.db import transaction
+from django.utils.timezone import now
+from django.utils.translation import gettext as _
+
+from contacts.models import OutgoingEmail
+
+# Nobody else picks up a batch while it is being sent, unless the worker died
+LEASE = timedelta(minutes=10)
+
+
+class Command(BaseCommand):
+    help = _("Send the queued emails over a single SMTP connection per batch")
+
+    def add_arguments(self, parser: CommandParser):
+        parser.add_argument(
+            "--batch-size",
+            default=100,
+            type=int,
+            help=_("number of emails to send per connection (default: 100)"),
+        )
+        parser.add_argument(
+            "--max-attempts",
+            default=5,
+            type=int,
+            help=_("give up on an email after this many failed attempts (default: 5)"),
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help=_("keep running and check the queue every --interval seconds"),
+        )
+        parser.add_argument(
+            "--interval",
+            default=10,
+            type=float,
+            help=_("seconds between checks of the queue with --loop (default: 10)"),
+        )
+
+    def handle(self, *args, **options):
+        self.verbosity = options["verbosity"]
+        while True:
+            batch = self.claim_batch(options["batch_size"], options["max_attempts"])
+            if batch:
+                self.send_batch(batch)
+            elif options["loop"]:
+                time.sleep(options["interval"])
+            else:
+                break
+
+    def claim_batch(self, batch_size: int, max_attempts: int) -> List[OutgoingEmail]:
+        with transaction.atomic():
+            batch = list(
+                OutgoingEmail.objects.select_for_update(skip_locked=True)
+                .filter(sent_at=None, attempts__lt=max_attempts, next_attempt_at__lte=now())
+                .order_by("next_attempt_at", "id")[:batch_size]
+            )
+            OutgoingEmail.objects.filter(pk__in=[email.pk for email in batch]).update(next_attempt_at=now() + LEASE)
+        return batch
+
+    def send_batch(self, batch: List[OutgoingEmail]):
+        start = time.monotonic()
+        sent = 0
+
+        connection = get_connection()
+        try:
+            for index, email in enumerate(batch):
+                try:
+                    # Only opens a connection if there isn't one yet
+                    connection.open()
+                except (smtplib.SMTPException, OSError) as e:
+                    # The mail server is unreachable, so don't bother trying the rest of the batch
+                    for unsent in batch[index:]:
+                        self.failed(unsent, e)
+                    break
+
+                try:
+                    connection.send_messages([email.message(connection)])
+                except (smtplib.SMTPException, OSError) as e:
+                    self.failed(email, e)
+
+                    # The next message gets a fresh connection
+                    with suppress(smtplib.SMTPException, OSError):
+                        connection.close()
+                    continue
+
+                email.attempts += 1
+                email.sent_at = now()
+                email.save(update_fields=("attempts", "sent_at"))
+                sent += 1
+        finally:
+            with suppress(smtplib.SMTPException, OSError):
+                connection.close()
+
+        if self.verbosity > 1:
+            self.stderr.write(f"{sent} of {len(batch)} emails sent in {time.monotonic() - start:.3f}s")
+
+    def failed(self, email: OutgoingEmail, error: Exception):
+        email.attempts += 1
+        email.retry_later(error)
+        email.save(update_fields=("attempts", "last_error", "next_attempt_at"))
+        self.stderr.write(f"- {email}: {email.last_error}")
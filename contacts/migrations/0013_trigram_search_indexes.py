@@ -0,0 +1,46 @@
+# Generated by Django 4.0.3 on 2026-10-18 03:30
+
+from django.db import migrations
+
+# The columns in the admin search_fields, icontains on PostgreSQL compares UPPER(column::text)
+SEARCH_COLUMNS = {
+    "contact": ("username", "first_name", "last_name", "requested_organisation"),
+    "organisation": ("name",),
+}
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for model_name, columns in SEARCH_COLUMNS.items():
+        # noinspection PyProtectedMember
+        table = apps.get_model("contacts", model_name)._meta.db_table
+        for column in columns:
+            schema_editor.execute(
+                f"CREATE INDEX IF NOT EXISTS {table}_{column}_trgm "
+                f"ON {table} USING gin ((UPPER({column}::text)) gin_trgm_ops)"
+            )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    for model_name, columns in SEARCH_COLUMNS.items():
+        # noinspection PyProtectedMember
+        table = apps.get_model("contacts", model_name)._meta.db_table
+        for column in columns:
+            schema_editor.execute(f"DROP INDEX IF EXISTS {table}_{column}_trgm")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contacts", "0012_contact_requested_organisation"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
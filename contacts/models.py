@@ -1,8 +1,16 @@
 import warnings
+from datetime import timedelta
 from functools import cached_property
-
-from django.contrib.auth.models import AbstractUser, UserManager
-from django.db import models
+from typing import FrozenSet, Iterable, Iterator, List
+from uuid import uuid4
+
+from django.contrib.auth.models import AbstractUser, Group, UserManager
+from django.core.cache import cache
+from django.core.mail import EmailMessage
+from django.db import models, transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from django.utils.timezone import now
 from django.utils.translation import gettext_lazy as _
 
 
@@ -45,10 +53,34 @@ class Organisation(models.Model):
         return self.name
 
 
+# Contacts' roles are cached under a version that changes with every group membership or group name. The version has
+# to reach every worker, so this needs a shared cache, see settings.CACHES
+ROLES_VERSION_KEY = "contact-roles-version"
+ROLES_TIMEOUT = 24 * 3600
+
+
+def roles_key(contact_id: int) -> str:
+    version = cache.get_or_set(ROLES_VERSION_KEY, lambda: uuid4().hex, None)
+    return f"contact-roles-{version}-{contact_id}"
+
+
+def forget_roles(using=None):
+    transaction.on_commit(lambda: cache.set(ROLES_VERSION_KEY, uuid4().hex, None), using=using)
+
+
 class ContactManager(UserManager):
     def get_queryset(self):
         return super().get_queryset().prefetch_related("groups", "organisation")
 
+    def in_chunks(self, pks: Iterable[int], chunk_size: int = 500) -> Iterator[List["Contact"]]:
+        """
+        Load the contacts with the given primary keys chunk_size at a time, each chunk with its groups and
+        organisation, so going through thousands of contacts doesn't keep them all in memory.
+        """
+        pks = sorted(set(pks))
+        for start in range(0, len(pks), chunk_size):
+            yield list(self.get_queryset().filter(pk__in=pks[start : start + chunk_size]).order_by("pk"))
+
 
 class Contact(AbstractUser):
     is_staff = True
@@ -94,18 +126,100 @@ class Contact(AbstractUser):
         else:
             return self.display_name()
 
+    @cached_property
+    def roles(self) -> FrozenSet[str]:
+        """
+        The lowercase names of the groups, resolved once per instance, so once per request for request.user.
+        """
+        # noinspection PyUnresolvedReferences
+        prefetched = getattr(self, "_prefetched_objects_cache", {})
+        if "groups" in prefetched:
+            return frozenset(str(group.name).lower() for group in prefetched["groups"])
+
+        key = roles_key(self.pk)
+        roles = cache.get(key)
+        if roles is None:
+            roles = frozenset(name.lower() for name in self.groups.values_list("name", flat=True))
+            cache.set(key, roles, ROLES_TIMEOUT)
+        return roles
+
     @property
     def group_names(self):
-        return [str(group.name).lower() for group in self.groups.all()]
+        return sorted(self.roles)
 
     @property
     def is_donor(self):
-        return "donors" in self.group_names
+        return "donors" in self.roles
 
     @property
     def is_requester(self):
-        return "requesters" in self.group_names
+        return "requesters" in self.roles
 
     @property
     def is_viewer(self):
-        return "viewers" in self.group_names
+        return "viewers" in self.roles
+
+
+# noinspection PyUnusedLocal
+@receiver(m2m_changed, sender=Contact.groups.through)
+def contact_groups_changed(sender, instance, action: str, reverse: bool, using=None, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        if not reverse:
+            instance.__dict__.pop("roles", None)
+        forget_roles(using)
+
+
+# noinspection PyUnusedLocal
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, using=None, **kwargs):
+    # A renamed group changes the roles of all its members
+    forget_roles(using)
+
+
+class OutgoingEmail(models.Model):
+    """
+    An email waiting to be sent by the send_queued_emails command, so admin actions don't wait for the mail server.
+    """
+
+    contact = models.ForeignKey(
+        verbose_name=_("contact"),
+        to=Contact,
+        blank=True,
+        null=True,
+        related_name="outgoing_emails",
+        on_delete=models.SET_NULL,
+    )
+    from_email = models.CharField(
+        verbose_name=_("from"), max_length=254, blank=True, help_text=_("Empty for the default sender")
+    )
+    to = models.EmailField(verbose_name=_("to"))
+    subject = models.CharField(verbose_name=_("subject"), max_length=255)
+    body = models.TextField(verbose_name=_("body"))
+
+    created_at = models.DateTimeField(verbose_name=_("created at"), auto_now_add=True)
+    next_attempt_at = models.DateTimeField(verbose_name=_("next attempt at"), default=now)
+    attempts = models.PositiveIntegerField(verbose_name=_("attempts"), default=0)
+    last_error = models.TextField(verbose_name=_("last error"), blank=True)
+    sent_at = models.DateTimeField(verbose_name=_("sent at"), blank=True, null=True)
+
+    class Meta:
+        ordering = ("-created_at",)
+        indexes = (models.Index(fields=("sent_at", "next_attempt_at")),)
+        verbose_name = _("outgoing email")
+        verbose_name_plural = _("outgoing emails")
+
+    def __str__(self):
+        return f"{self.to}: {self.subject}"
+
+    @classmethod
+    def for_contact(cls, contact: Contact, subject: str, body: str, from_email: str = "") -> "OutgoingEmail":
+        return cls(contact=contact, from_email=from_email, to=contact.email, subject=subject, body=body)
+
+    def message(self, connection=None) -> EmailMessage:
+        return EmailMessage(self.subject, self.body, self.from_email or None, [self.to], connection=connection)
+
+    def retry_later(self, error: Exception):
+        # Wait 2, 4, 8... minutes, but at most a day
+        self.last_error = str(error) or error.__class__.__name__
+        self.next_attempt_at = now() + timedelta(minutes=min(2**self.attempts, 24 * 60))
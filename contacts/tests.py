@@ -0,0 +1,35 @@
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+
+from aid_coordinator.testing import QueryBudgetTestCase
+from contacts.checks import check_shared_cache
+from contacts.models import Contact
+
+
+class AdminQueryBudgetTests(QueryBudgetTestCase):
+    def test_contact_changelist(self):
+        self.assertGetWithinBudget(reverse("admin:contacts_contact_changelist"), 8)
+
+    def test_contact_change_form(self):
+        contact = Contact.objects.filter(organisation__isnull=False).order_by("pk").first()
+        self.assertGetWithinBudget(reverse("admin:contacts_contact_change", args=(contact.pk,)), 10)
+
+    def test_organisation_changelist(self):
+        self.assertGetWithinBudget(reverse("admin:contacts_organisation_changelist"), 5)
+
+
+class APIQueryBudgetTests(QueryBudgetTestCase):
+    def test_personal_donors(self):
+        self.assertGetWithinBudget(reverse("contact-list"), 5)
+
+    def test_donor_organisations(self):
+        self.assertGetWithinBudget(reverse("organisation-list"), 3)
+
+
+class SharedCacheCheckTests(SimpleTestCase):
+    def test_shared_cache(self):
+        self.assertEqual(check_shared_cache(None), [])
+
+    @override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+    def test_per_process_cache(self):
+        self.assertEqual([warning.id for warning in check_shared_cache(None)], ["contacts.W001"])
@@ -1,43 +1,109 @@
+from typing import Iterable, List, Tuple
+
 from django.contrib import messages
-from django.http import HttpResponseRedirect
-from django.template import Template
+from django.db import transaction
+from django.http import HttpRequest, HttpResponseRedirect
+from django.utils.crypto import get_random_string
 from django.utils.decorators import method_decorator
+from django.utils.translation import gettext as _
 from django.utils.translation import ngettext
-from jinja2 import Template
+from jinja2 import TemplateError
 
 from aid_coordinator.decorators import superuser_required
 from aid_coordinator.views import AdminFormView
 from contacts.forms import EmailForm
-from contacts.models import Contact
+from contacts.models import Contact, OutgoingEmail
+
+
+class RenderError(Exception):
+    pass
 
 
 @method_decorator(superuser_required(), name="dispatch")
 class EmailView(AdminFormView):
+    """
+    Send a custom email to a selection of contacts. The selection is kept in the session, see store_selection().
+    """
+
     template_name = "admin/email.html"
     form_class = EmailForm
     admin_model = Contact
+    chunk_size = 500
+
+    selection: List[int]
+
+    @staticmethod
+    def selection_key(token: str) -> str:
+        return f"email-selection-{token}"
+
+    @classmethod
+    def store_selection(cls, request: HttpRequest, pks: Iterable[int]) -> str:
+        """
+        Store the selected contacts in the session and return the query string for the view.
+        """
+        token = get_random_string(16)
+        request.session[cls.selection_key(token)] = list(pks)
+        return f"selection={token}"
+
+    def dispatch(self, request, *args, **kwargs):
+        self.selection = request.session.get(self.selection_key(request.GET.get("selection", "")))
+        if self.selection is None:
+            messages.error(request, _("This selection of contacts has expired, please select the contacts again"))
+            return HttpResponseRedirect("..")
+        return super().dispatch(request, *args, **kwargs)
+
+    def get_context_data(self, **kwargs):
+        kwargs.setdefault("recipient_count", len(self.selection))
+        return super().get_context_data(**kwargs)
+
+    def render_emails(self, form: EmailForm, contacts: Iterable[Contact]) -> List[Tuple[Contact, str]]:
+        try:
+            return [(contact, form.template.render(contact=contact)) for contact in contacts]
+        except TemplateError as e:
+            # Errors like a forbidden attribute only show up while rendering
+            raise RenderError(_("Rendering failed: %(error)s") % {"error": e})
 
     def form_valid(self, form: EmailForm):
-        count = 0
-        for contact in Contact.objects.filter(pk__in=self.request.GET["contacts"].split(",")):
-            context = {"contact": contact}
-            text = Template(form.cleaned_data["content"]).render(context)
-            contact.email_user(
-                from_email=form.cleaned_data["sender"],
-                subject=form.cleaned_data["subject"],
-                message=text,
-            )
-            count += 1
+        try:
+            if "preview" in self.request.POST:
+                preview = self.selection[: form.cleaned_data["preview_count"]]
+                previews = self.render_emails(form, next(Contact.objects.in_chunks(preview), []))
+                return self.render_to_response(self.get_context_data(form=form, previews=previews))
+
+            count = self.queue_emails(form)
+        except RenderError as e:
+            form.add_error("content", str(e))
+            return self.form_invalid(form)
+
+        del self.request.session[self.selection_key(self.request.GET["selection"])]
 
         messages.add_message(
             request=self.request,
             level=messages.INFO,
             message=ngettext(
-                "%(count)s message has been sent",
-                "%(count)s messages have been sent",
+                "%(count)s message has been queued for sending",
+                "%(count)s messages have been queued for sending",
                 count,
             )
             % {"count": count},
         )
 
         return HttpResponseRedirect("..")
+
+    @transaction.atomic
+    def queue_emails(self, form: EmailForm) -> int:
+        # All or nothing, a template that fails halfway doesn't leave half of the emails queued
+        count = 0
+        for contacts in Contact.objects.in_chunks(self.selection, self.chunk_size):
+            emails = [
+                OutgoingEmail.for_contact(
+                    contact,
+                    from_email=form.cleaned_data["sender"],
+                    subject=form.cleaned_data["subject"],
+                    body=text,
+                )
+                for contact, text in self.render_emails(form, contacts)
+            ]
+            OutgoingEmail.objects.bulk_create(emails)
+            count += len(emails)
+        return count
@@ -1,20 +1,33 @@
+import csv
+
 from admin_wizard.admin import UpdateAction
 from django.contrib import admin
-from django.http import HttpRequest
+from django.db.models import QuerySet
+from django.http import HttpRequest, StreamingHttpResponse
 from django.templatetags.static import static
+from django.urls import path
 from django.utils.html import format_html
 from django.utils.safestring import mark_safe
+from django.utils.timezone import now
 from django.utils.translation import gettext_lazy as _
 from import_export.admin import ExportActionModelAdmin, ImportExportActionModelAdmin
 
+from aid_coordinator.export import Echo, StreamingExportMixin
+from aid_coordinator.filters import CachedRelatedOnlyFieldListFilter, watch_facets
 from logistics.filters import UsedChoicesFieldListFilter
 from logistics.forms import AssignToShipmentForm
+from logistics.manifest import MANIFEST_COLUMNS, Manifest
 from logistics.models import Claim, EquipmentData, Location, Shipment
 from logistics.resources import ClaimExportResource, EquipmentDataResource
+from logistics.views import PlanShipmentsView
+from supply_demand.search import IndexedSearchMixin
 
 static_import_icon = static("img/import.png")
 static_export_icon = static("img/export.png")
 
+# Forget the cached values of the list filters when the locations or claims change
+watch_facets(Location, Claim)
+
 
 @admin.register(EquipmentData)
 class EquipmentDataAdmin(ImportExportActionModelAdmin):
@@ -93,6 +106,7 @@ class LocationAdmin(admin.ModelAdmin):
 @admin.register(Shipment)
 class ShipmentAdmin(admin.ModelAdmin):
     list_display = ("name", "when", "current_location", "is_delivered")
+    list_select_related = ("current_location",)
     list_filter = ("is_delivered",)
     date_hierarchy = "when"
     ordering = ("when",)
@@ -102,10 +116,25 @@ class ShipmentAdmin(admin.ModelAdmin):
         "current_location__city",
         "current_location__country",
     )
+    actions = ("export_manifest",)
+
+    @admin.action(description=_("Export pallet manifest"))
+    def export_manifest(self, request: HttpRequest, queryset: QuerySet):
+        manifests = Manifest.for_shipments(queryset.order_by("when", "name"))
+
+        def rows():
+            yield MANIFEST_COLUMNS
+            for manifest in manifests:
+                yield from manifest.rows()
+
+        writer = csv.writer(Echo())
+        response = StreamingHttpResponse((writer.writerow(row) for row in rows()), content_type="text/csv")
+        response["Content-Disposition"] = f'attachment; filename="manifest-{now():%Y-%m-%d}.csv"'
+        return response
 
 
 @admin.register(Claim)
-class ClaimAdmin(ExportActionModelAdmin):
+class ClaimAdmin(IndexedSearchMixin, StreamingExportMixin, ExportActionModelAdmin):
     list_display = (
         "amount",
         "admin_offered_item",
@@ -118,11 +147,11 @@ class ClaimAdmin(ExportActionModelAdmin):
         "shipment__is_delivered",
         (
             "offered_item__offer__contact__organisation",
-            admin.RelatedOnlyFieldListFilter,
+            CachedRelatedOnlyFieldListFilter,
         ),
         (
             "requested_item__request__contact__organisation",
-            admin.RelatedOnlyFieldListFilter,
+            CachedRelatedOnlyFieldListFilter,
         ),
     )
     search_fields = (
@@ -134,15 +163,29 @@ class ClaimAdmin(ExportActionModelAdmin):
         "requested_item__request__contact__organisation__name",
     )
     ordering = ("shipment",)
-    actions = (UpdateAction(form_class=AssignToShipmentForm, title=_("Assign to shipment")),)
+    actions = (
+        UpdateAction(form_class=AssignToShipmentForm, title=_("Assign to shipment")),
+        "export_csv",
+        "export_xlsx",
+    )
     resource_class = ClaimExportResource
 
+    def get_urls(self):
+        return [
+            path(
+                "plan/",
+                self.admin_site.admin_view(PlanShipmentsView.as_view()),
+                name="logistics_claim_plan",
+            )
+        ] + super().get_urls()
+
     def get_queryset(self, request: HttpRequest):
         qs = super().get_queryset(request)
         qs = qs.prefetch_related(
             "offered_item__offer__contact__organisation",
             "requested_item__request__contact__organisation",
             "shipment",
+            "current_location",
         )
         return qs
 
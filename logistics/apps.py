@@ -6,3 +6,7 @@ class LogisticsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "logistics"
     verbose_name = _("Logistics")
+
+    def ready(self):
+        # Register the signal handlers
+        from logistics import equipment  # noqa: F401
@@ -0,0 +1,211 @@
+"""
+Resolves free-text brands and models, like those of offered items, to EquipmentData.
+
+Every record is indexed by its normalized brand and model, by its model without spaces and punctuation, and by the
+trigrams of that compact model for the near misses. A near miss has the same numbers and one model contains the
+other, like a part number with a prefix or suffix: C9300-48P-E is a C9300-48P, but C9300-48T is another model. Those
+resolutions are marked as approximate. The index is built once per process and rebuilt when the
+version in the cache changes, which happens after every commit that saves or deletes EquipmentData. Resolutions are
+kept in an LRU cache, so the same item on every changelist page or import row costs a dictionary lookup.
+"""
+
+import re
+import time
+from collections import Counter, defaultdict
+from functools import lru_cache
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from logistics.models import EquipmentData
+from supply_demand.matching import normalize
+
+EQUIPMENT_VERSION_KEY = "equipment-data-version"
+
+# Words that only say what kind of company a brand is, "Cisco Systems, Inc." is just Cisco
+BRAND_SUFFIXES = {
+    "ag",
+    "bv",
+    "co",
+    "company",
+    "corp",
+    "corporation",
+    "gmbh",
+    "inc",
+    "international",
+    "llc",
+    "ltd",
+    "networks",
+    "systems",
+    "technologies",
+}
+
+# A trailing "=" is how Cisco marks a spare part, it's the same hardware
+MODEL_SUFFIX_RE = re.compile(r"=+$")
+
+
+class Equipment(NamedTuple):
+    pk: int
+    brand: str
+    model: str
+    weight: Optional[float]
+    width: Optional[int]
+    height: Optional[int]
+    depth: Optional[int]
+    # Resolved from a near miss instead of the same model
+    approximate: bool = False
+
+    def __str__(self):
+        return f"{self.brand} {self.model}"
+
+    @property
+    def volume(self) -> Optional[float]:
+        """
+        In m³, if all dimensions are known.
+        """
+        if self.width and self.height and self.depth:
+            return self.width * self.height * self.depth / 1_000_000
+        return None
+
+
+def brand_key(brand: str) -> str:
+    words = normalize(brand).split()
+    while len(words) > 1 and words[-1] in BRAND_SUFFIXES:
+        words.pop()
+    return " ".join(words)
+
+
+def model_key(model: str) -> str:
+    return normalize(MODEL_SUFFIX_RE.sub("", (model or "").strip()))
+
+
+def compact(text: str) -> str:
+    return text.replace(" ", "")
+
+
+def numbers(text: str) -> List[str]:
+    return re.findall(r"\d+", text)
+
+
+def variant(model: str, other: str) -> bool:
+    """
+    Whether one compact model is the other with a prefix or suffix, and they have the same numbers.
+    """
+    return (model in other or other in model) and numbers(model) == numbers(other)
+
+
+def trigrams(text: str) -> Set[str]:
+    padded = f"^{text}$"
+    return {padded[index : index + 3] for index in range(len(padded) - 2)}
+
+
+class EquipmentResolver:
+    def __init__(self, records: Iterable[Equipment], min_score: float = 0.75, cache_size: int = 10000):
+        self.min_score = min_score
+        self.records: List[Equipment] = []
+        self.brands: List[str] = []
+        self.compact_models: List[str] = []
+        self.trigrams: List[Set[str]] = []
+        self.exact: Dict[Tuple[str, str], Equipment] = {}
+        self.compact: Dict[Tuple[str, str], Equipment] = {}
+        self.models: Dict[str, List[int]] = defaultdict(list)
+        self.postings: Dict[str, List[int]] = defaultdict(list)
+
+        # Records that only differ in case or spacing: the oldest one wins
+        for record in sorted(records, key=lambda record: record.pk):
+            brand, model = brand_key(record.brand), model_key(record.model)
+            index = len(self.records)
+            self.records.append(record)
+            self.brands.append(brand)
+            self.compact_models.append(compact(model))
+            self.trigrams.append(trigrams(compact(model)))
+            self.exact.setdefault((brand, model), record)
+            self.compact.setdefault((brand, compact(model)), record)
+            self.models[compact(model)].append(index)
+            for trigram in self.trigrams[index]:
+                self.postings[trigram].append(index)
+
+        self.resolve = lru_cache(maxsize=cache_size)(self._resolve)
+
+    def _resolve(self, brand: str, model: str) -> Optional[Equipment]:
+        brand, model = brand_key(brand), model_key(model)
+        if not model:
+            return None
+
+        record = self.exact.get((brand, model)) or self.compact.get((brand, compact(model)))
+        if record:
+            return record
+
+        # Different brands never match, but an item without a brand matches a record of any brand
+        def same_brand(index: int) -> bool:
+            return not brand or self.brands[index] == brand
+
+        indexes = [index for index in self.models.get(compact(model), ()) if same_brand(index)]
+        if indexes:
+            return self.records[indexes[0]]
+
+        query = trigrams(compact(model))
+        shared = Counter()
+        for trigram in query:
+            shared.update(self.postings.get(trigram, ()))
+
+        best = None
+        for index, count in shared.items():
+            # Dice coefficient of the trigrams, ties go to the oldest record
+            score = 2 * count / (len(query) + len(self.trigrams[index]))
+            if (
+                score >= self.min_score
+                and (best is None or (score, -index) > best)
+                and same_brand(index)
+                and variant(compact(model), self.compact_models[index])
+            ):
+                best = (score, -index)
+
+        return self.records[-best[1]]._replace(approximate=True) if best else None
+
+
+class ProcessResolver:
+    """
+    The resolver of this process, rebuilt when the version in the cache has changed. The version is checked at most
+    once per check_interval seconds, so resolving every row of a page doesn't mean a trip to the cache per row.
+    """
+
+    def __init__(self, check_interval: float = 1.0):
+        self.check_interval = check_interval
+        self.checked = 0.0
+        self.version = None
+        self.resolver = None
+
+    def get(self) -> EquipmentResolver:
+        if time.monotonic() >= self.checked + self.check_interval:
+            version = cache.get_or_set(EQUIPMENT_VERSION_KEY, lambda: uuid4().hex, None)
+            if self.version != version:
+                rows = EquipmentData.objects.values_list("pk", "brand", "model", "weight", "width", "height", "depth")
+                self.resolver = EquipmentResolver(Equipment(*row) for row in rows)
+                self.version = version
+            self.checked = time.monotonic()
+        return self.resolver
+
+    def forget(self):
+        # Other processes notice the new version in the cache, this one shouldn't wait for its next check
+        cache.set(EQUIPMENT_VERSION_KEY, uuid4().hex, None)
+        self.checked = 0.0
+
+
+equipment_resolver = ProcessResolver()
+
+
+def resolve_equipment(brand: str, model: str) -> Optional[Equipment]:
+    return equipment_resolver.get().resolve(brand, model)
+
+
+# noinspection PyUnusedLocal
+@receiver(post_save, sender=EquipmentData)
+@receiver(post_delete, sender=EquipmentData)
+def equipment_data_changed(sender, using=None, **kwargs):
+    # A new random version instead of incrementing, so an evicted version can't bring back an old index
+    transaction.on_commit(equipment_resolver.forget, using=using)
@@ -2,10 +2,13 @@ from urllib.parse import parse_qs
 
 from django.contrib import admin
 
+from aid_coordinator.filters import cached_facets
+
 
 class UsedChoicesFieldListFilter(admin.ChoicesFieldListFilter):
     def choices(self, changelist):
-        used_values = set(self.field.model.objects.all().values_list(self.field.attname, flat=True).distinct())
+        values = self.field.model.objects.all().values_list(self.field.attname, flat=True).distinct()
+        used_values = set(cached_facets(values, lambda: list(values)))
         for option in super().choices(changelist):
             query = parse_qs(option["query_string"].lstrip("?"))
             if self.lookup_kwarg in query:
@@ -1,6 +1,7 @@
 from django import forms
+from django.utils.translation import gettext_lazy as _
 
-from logistics.models import Claim
+from logistics.models import Claim, Location
 
 
 class AssignToShipmentForm(forms.ModelForm):
@@ -11,3 +12,17 @@ class AssignToShipmentForm(forms.ModelForm):
 
 class RequestForm(forms.Form):
     pass
+
+
+class PlanShipmentsForm(forms.Form):
+    location = forms.ModelChoiceField(label=_("Location"), queryset=Location.objects.order_by("name"))
+    max_weight = forms.FloatField(label=_("Capacity per shipment (kg)"), min_value=0.1, initial=1000)
+    max_volume = forms.FloatField(
+        label=_("Capacity per shipment (m³)"),
+        min_value=0.001,
+        initial=1.6,
+        help_text=_("A euro pallet of 120 x 80 cm, loaded up to 1.8 m including the pallet, holds about 1.6 m³"),
+    )
+    use_open_shipments = forms.BooleanField(
+        label=_("Fill up open shipments at this location first"), initial=True, required=False
+    )
@@ -0,0 +1,64 @@
+import math
+import random
+import time
+
+from django.core.management import BaseCommand, CommandParser
+from django.utils.translation import gettext as _
+
+from logistics.planning import Load, pack
+
+
+class Command(BaseCommand):
+    help = _("Measure how fast claims of random sizes are packed into shipments, and how close to optimal that is")
+
+    def add_arguments(self, parser: CommandParser):
+        parser.add_argument(
+            "claims",
+            nargs="*",
+            default=[1000, 10000],
+            type=int,
+            help=_("numbers of claims to benchmark with (default: 1000 10000)"),
+        )
+        parser.add_argument(
+            "--max-weight",
+            default=1000,
+            type=float,
+            help=_("capacity per shipment in kg (default: 1000)"),
+        )
+        parser.add_argument(
+            "--max-volume",
+            default=1.6,
+            type=float,
+            help=_("capacity per shipment in m³ (default: 1.6)"),
+        )
+        parser.add_argument("--seed", default=0, type=int, help=_("seed for the random sizes (default: 0)"))
+
+    def handle(self, *args, **options):
+        max_weight, max_volume = options["max_weight"], options["max_volume"]
+
+        for count in options["claims"]:
+            rng = random.Random(options["seed"])
+
+            # Mostly small network gear, some heavy or bulky items, like the claims at a collection point
+            loads = []
+            for claim_id in range(count):
+                amount = rng.choice((1, 1, 1, 2, 4, 10))
+                weight = rng.lognormvariate(1.0, 1.0)
+                volume = rng.uniform(0.2, 1.5) * weight / 250
+                loads.append(Load(claim_id, min(weight * amount, max_weight), min(volume * amount, max_volume)))
+
+            start = time.perf_counter()
+            plan = pack(loads, max_weight, max_volume)
+            seconds = time.perf_counter() - start
+
+            # No packing can use fewer shipments than the total weight or volume needs
+            lower_bound = math.ceil(
+                max(
+                    sum(load.weight for load in loads) / max_weight,
+                    sum(load.volume for load in loads) / max_volume,
+                )
+            )
+            self.stdout.write(
+                f"{count} claims: {len(plan.shipments)} shipments (at least {lower_bound} needed) "
+                f"in {seconds:.3f}s, {count / seconds:.0f} claims/s"
+            )
@@ -0,0 +1,159 @@
+"""
+Shipment manifests: what is on a shipment, how much it weighs and how much space it takes.
+
+The claims of the shipments are loaded with a single query, and their offered items are resolved to EquipmentData
+by the resolver of logistics.equipment, which doesn't need any queries once its index is built.
+"""
+
+from collections import defaultdict
+from typing import Iterable, List, NamedTuple, Optional
+
+from logistics.equipment import Equipment, equipment_resolver
+from logistics.models import Claim, Shipment
+from supply_demand.models import ItemType
+
+
+class ManifestLine(NamedTuple):
+    claim_id: int
+    amount: int
+    type: int
+    brand: str
+    model: str
+    donor: str
+    requester: str
+    equipment: Optional[Equipment]
+
+    @property
+    def weight(self) -> Optional[float]:
+        if self.equipment and self.equipment.weight is not None:
+            return self.equipment.weight * self.amount
+        return None
+
+    @property
+    def volume(self) -> Optional[float]:
+        if self.equipment and self.equipment.volume is not None:
+            return self.equipment.volume * self.amount
+        return None
+
+    @property
+    def problem(self) -> str:
+        if not self.equipment:
+            return "unknown"
+        if self.weight is None or self.volume is None:
+            return "incomplete"
+        if self.equipment.approximate:
+            # The weight and size of a variant, worth checking
+            return "approximate"
+        return ""
+
+
+class Manifest:
+    def __init__(self, shipment: Shipment, lines: List[ManifestLine]):
+        self.shipment = shipment
+        self.lines = lines
+
+    @property
+    def total_weight(self) -> float:
+        """
+        In kg, only counting the items with a known weight.
+        """
+        return sum(line.weight for line in self.lines if line.weight is not None)
+
+    @property
+    def total_volume(self) -> float:
+        """
+        In m³, only counting the items with known dimensions.
+        """
+        return sum(line.volume for line in self.lines if line.volume is not None)
+
+    @property
+    def problems(self) -> List[ManifestLine]:
+        return [line for line in self.lines if line.problem]
+
+    @classmethod
+    def for_shipments(cls, shipments: Iterable[Shipment]) -> List["Manifest"]:
+        shipments = list(shipments)
+        resolver = equipment_resolver.get()
+
+        claims = (
+            Claim.objects.filter(shipment__in=shipments)
+            .order_by("offered_item__type", "offered_item__brand", "offered_item__model", "pk")
+            .values_list(
+                "shipment_id",
+                "pk",
+                "amount",
+                "offered_item__type",
+                "offered_item__brand",
+                "offered_item__model",
+                "offered_item__offer__contact__organisation__name",
+                "requested_item__request__contact__organisation__name",
+            )
+        )
+
+        lines = defaultdict(list)
+        for shipment_id, pk, amount, item_type, brand, model, donor, requester in claims:
+            lines[shipment_id].append(
+                ManifestLine(
+                    claim_id=pk,
+                    amount=amount,
+                    type=item_type,
+                    brand=brand,
+                    model=model,
+                    donor=donor or "",
+                    requester=requester or "",
+                    equipment=resolver.resolve(brand, model),
+                )
+            )
+
+        return [cls(shipment, lines[shipment.pk]) for shipment in shipments]
+
+    def rows(self) -> Iterable[list]:
+        """
+        The lines and totals for a pallet manifest, see MANIFEST_COLUMNS.
+        """
+        for line in self.lines:
+            yield [
+                self.shipment.name,
+                line.claim_id,
+                line.amount,
+                ItemType(line.type).label if line.type in ItemType.values else line.type,
+                line.brand,
+                line.model,
+                line.donor,
+                line.requester,
+                line.equipment.weight if line.equipment and line.equipment.weight is not None else "",
+                round(line.weight, 2) if line.weight is not None else "",
+                round(line.volume, 3) if line.volume is not None else "",
+                line.problem,
+            ]
+
+        yield [
+            self.shipment.name,
+            "",
+            sum(line.amount for line in self.lines),
+            "",
+            "",
+            "",
+            "",
+            "",
+            "",
+            round(self.total_weight, 2),
+            round(self.total_volume, 3),
+            f"{len(self.problems)} unknown, incomplete or approximate" if self.problems else "",
+        ]
+
+
+MANIFEST_COLUMNS = (
+    "shipment",
+    "claim",
+    "amount",
+    "type",
+    "brand",
+    "model",
+    "donor_organisation",
+    "requester_organisation",
+    "unit_weight_kg",
+    "weight_kg",
+    "volume_m3",
+    "problem",
+)
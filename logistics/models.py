@@ -1,4 +1,8 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
 from django.utils.translation import gettext_lazy as _
 from django_countries.fields import CountryField
 from phonenumber_field.modelfields import PhoneNumberField
@@ -111,6 +115,11 @@ class Claim(models.Model):
         on_delete=models.SET_NULL,
     )
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.counted = (self.offered_item_id, self.amount) if self.pk else (None, 0)
+        self.original_requested_item_id = self.requested_item_id
+
     class Meta:
         verbose_name = _("claim")
         verbose_name_plural = _("claims")
@@ -118,10 +127,40 @@ class Claim(models.Model):
     def __str__(self):
         return f"{self.amount}x {self.offered_item} for request {self.requested_item}"
 
+    def update_claimed_total(self, offered_item_id: int, delta: int, using=None):
+        if not offered_item_id or not delta:
+            return
+
+        OfferItem.objects.using(using).filter(pk=offered_item_id).update(
+            claimed_total=Greatest(F("claimed_total") + delta, Value(0))
+        )
+
+        # Keep an already loaded offered item in sync with the database
+        if offered_item_id == self.offered_item_id and Claim.offered_item.is_cached(self):
+            self.offered_item.claimed_total = max(self.offered_item.claimed_total + delta, 0)
+
     def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
-        super().save(force_insert, force_update, using, update_fields)
+        with transaction.atomic(using=using):
+            super().save(force_insert, force_update, using, update_fields)
+
+            # Relative updates, so concurrent claims on the same item can't overwrite each other's totals
+            old_offered_item_id, old_amount = self.counted
+            if old_offered_item_id != self.offered_item_id:
+                self.update_claimed_total(old_offered_item_id, -old_amount, using)
+                self.update_claimed_total(self.offered_item_id, self.amount, using)
+            else:
+                self.update_claimed_total(self.offered_item_id, self.amount - old_amount, using)
+            self.counted = (self.offered_item_id, self.amount)
 
         # If someone claims this, we don't need to reject it anymore
         if self.offered_item.rejected:
             self.offered_item.rejected = False
-            self.offered_item.save()
+            self.offered_item.save(update_fields=("rejected", "updated_at"))
+
+
+# noinspection PyUnusedLocal
+@receiver(post_delete, sender=Claim)
+def claim_deleted(sender, instance: Claim, using=None, **kwargs):
+    # Also called for bulk deletes, unlike Claim.delete()
+    old_offered_item_id, old_amount = instance.counted
+    instance.update_claimed_total(old_offered_item_id, -old_amount, using)
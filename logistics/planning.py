@@ -0,0 +1,200 @@
+"""
+Plans which unassigned claims at a location go on which shipment, within a weight and volume capacity per shipment.
+
+Claims are packed with first-fit decreasing: the biggest claims first, each into the first shipment that still has room
+for both its weight and volume. Open shipments at the location are filled up before new ones are proposed. Claims
+without complete equipment data can't be planned and are reported instead.
+"""
+
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+from django.db import transaction
+from django.db.models import QuerySet
+from django.utils.timezone import now
+
+from logistics.equipment import equipment_resolver
+from logistics.manifest import Manifest
+from logistics.models import Claim, Location, Shipment
+
+
+class Load(NamedTuple):
+    claim_id: int
+    weight: float
+    volume: float
+
+
+class PlannedShipment:
+    def __init__(self, max_weight: float, max_volume: float, shipment: Optional[Shipment] = None):
+        self.shipment = shipment
+        self.max_weight = max_weight
+        self.max_volume = max_volume
+        self.remaining_weight = max_weight
+        self.remaining_volume = max_volume
+        self.loads: List[Load] = []
+
+    @property
+    def weight(self) -> float:
+        """
+        The total weight, including what was already on an existing shipment.
+        """
+        return self.max_weight - self.remaining_weight
+
+    @property
+    def volume(self) -> float:
+        """
+        The total volume, including what was already on an existing shipment.
+        """
+        return self.max_volume - self.remaining_volume
+
+    def add(self, load: Load):
+        self.loads.append(load)
+        self.remaining_weight -= load.weight
+        self.remaining_volume -= load.volume
+
+
+class Plan(NamedTuple):
+    shipments: List[PlannedShipment]
+    unplanned: List[Tuple[int, str]]
+
+    @property
+    def new_shipments(self) -> List[PlannedShipment]:
+        return [planned for planned in self.shipments if planned.shipment is None]
+
+
+class FirstFitTree:
+    """
+    The largest remaining weight and volume of every range of shipments, so the first shipment with room for a load
+    is found without trying all shipments before it.
+    """
+
+    def __init__(self, size: int):
+        self.size = 1
+        while self.size < size:
+            self.size *= 2
+        self.weights = [-1.0] * (2 * self.size)
+        self.volumes = [-1.0] * (2 * self.size)
+
+    def update(self, index: int, weight: float, volume: float):
+        node = index + self.size
+        self.weights[node], self.volumes[node] = weight, volume
+        while node > 1:
+            node //= 2
+            self.weights[node] = max(self.weights[2 * node], self.weights[2 * node + 1])
+            self.volumes[node] = max(self.volumes[2 * node], self.volumes[2 * node + 1])
+
+    def first_fit(self, weight: float, volume: float) -> Optional[int]:
+        # Depth first, left to right. A range can have room for the weight in one shipment and for the volume in
+        # another, then the search backtracks.
+        stack = [1]
+        while stack:
+            node = stack.pop()
+            if self.weights[node] < weight or self.volumes[node] < volume:
+                continue
+            if node >= self.size:
+                return node - self.size
+            stack.append(2 * node + 1)
+            stack.append(2 * node)
+        return None
+
+
+def pack(
+    loads: Iterable[Load],
+    max_weight: float,
+    max_volume: float,
+    shipments: Iterable[PlannedShipment] = (),
+) -> Plan:
+    """
+    First-fit decreasing over two dimensions. The size of a load is its largest share of the capacity, so a heavy
+    but small load is placed as early as a light but bulky one.
+    """
+    shipments = list(shipments)
+    unplanned = []
+
+    ordered = []
+    for load in loads:
+        if load.weight > max_weight or load.volume > max_volume:
+            unplanned.append((load.claim_id, "too big"))
+        else:
+            ordered.append(load)
+    ordered.sort(key=lambda load: (-max(load.weight / max_weight, load.volume / max_volume), load.claim_id))
+
+    # Every load gets at most one new shipment
+    tree = FirstFitTree(len(shipments) + len(ordered))
+    for index, planned in enumerate(shipments):
+        tree.update(index, planned.remaining_weight, planned.remaining_volume)
+
+    for load in ordered:
+        index = tree.first_fit(load.weight, load.volume)
+        if index is None:
+            index = len(shipments)
+            shipments.append(PlannedShipment(max_weight, max_volume))
+
+        planned = shipments[index]
+        planned.add(load)
+        tree.update(index, planned.remaining_weight, planned.remaining_volume)
+
+    return Plan([planned for planned in shipments if planned.loads], unplanned)
+
+
+def unassigned_claims(location: Location) -> QuerySet:
+    return Claim.objects.filter(current_location=location, shipment=None)
+
+
+def open_shipments(location: Location) -> QuerySet:
+    return Shipment.objects.filter(current_location=location, is_delivered=False).order_by("when", "pk")
+
+
+def plan_shipments(location: Location, max_weight: float, max_volume: float, use_open_shipments: bool = True) -> Plan:
+    resolver = equipment_resolver.get()
+
+    loads = []
+    unplanned = []
+    claims = unassigned_claims(location).values_list("pk", "amount", "offered_item__brand", "offered_item__model")
+    for pk, amount, brand, model in claims.order_by("pk"):
+        equipment = resolver.resolve(brand, model)
+        if not equipment:
+            unplanned.append((pk, "unknown"))
+        elif equipment.weight is None or equipment.volume is None:
+            unplanned.append((pk, "incomplete"))
+        else:
+            loads.append(Load(pk, equipment.weight * amount, equipment.volume * amount))
+
+    shipments = []
+    if use_open_shipments:
+        for manifest in Manifest.for_shipments(open_shipments(location)):
+            planned = PlannedShipment(max_weight, max_volume, manifest.shipment)
+            planned.remaining_weight -= manifest.total_weight
+            planned.remaining_volume -= manifest.total_volume
+            shipments.append(planned)
+
+    plan = pack(loads, max_weight, max_volume, shipments)
+    return Plan(plan.shipments, unplanned + plan.unplanned)
+
+
+@transaction.atomic
+def apply_plan(plan: Plan, location: Location) -> int:
+    """
+    Create the new shipments and assign the claims, returns the number of claims assigned. Claims that got a
+    shipment in the meantime are left alone.
+    """
+    today = now().date()
+    prefix = f"{location.name[:80]} {today}"
+    taken = set(Shipment.objects.filter(name__startswith=prefix).values_list("name", flat=True))
+
+    count = 0
+    number = 0
+    for planned in plan.shipments:
+        shipment = planned.shipment
+        if shipment is None:
+            number += 1
+            while f"{prefix} #{number}" in taken:
+                number += 1
+            shipment = Shipment.objects.create(name=f"{prefix} #{number}", when=today, current_location=location)
+
+        count += (
+            unassigned_claims(location)
+            .filter(pk__in=[load.claim_id for load in planned.loads])
+            .update(shipment=shipment)
+        )
+
+    return count
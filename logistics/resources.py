@@ -17,7 +17,7 @@ class ClaimExportResource(resources.ModelResource):
     brand = fields.Field(attribute="offered_item__brand")
     model = fields.Field(attribute="offered_item__model")
 
-    shipment = fields.Field(attribute="shipment")
+    shipment = fields.Field(attribute="shipment__name")
 
     donor_first_name = fields.Field(attribute="offered_item__offer__contact__first_name")
     donor_last_name = fields.Field(attribute="offered_item__offer__contact__last_name")
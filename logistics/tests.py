@@ -1,3 +1,270 @@
-from django.test import TestCase
+from random import Random
 
-# Create your tests here.
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from aid_coordinator.testing import QueryBudgetTestCase
+from contacts.models import Contact, Organisation
+from logistics.equipment import Equipment, EquipmentResolver, equipment_resolver
+from logistics.manifest import Manifest
+from logistics.models import Claim, EquipmentData, Shipment
+from logistics.planning import Load, PlannedShipment, pack
+from supply_demand.models import Offer, OfferItem, Request, RequestItem
+
+
+class AdminQueryBudgetTests(QueryBudgetTestCase):
+    def test_claim_changelist(self):
+        self.assertGetWithinBudget(reverse("admin:logistics_claim_changelist"), 14)
+
+    def test_claim_changelist_search(self):
+        self.assertGetWithinBudget(reverse("admin:logistics_claim_changelist"), 14, data={"q": "organisation 2"})
+
+    def test_claim_changelist_cached_facets(self):
+        url = reverse("admin:logistics_claim_changelist")
+        self.client.get(url)
+        # The organisation filters come from the cache
+        self.assertGetWithinBudget(url, 12)
+
+    def test_claim_change_form(self):
+        claim = Claim.objects.filter(shipment__isnull=False).order_by("pk").first()
+        self.assertGetWithinBudget(reverse("admin:logistics_claim_change", args=(claim.pk,)), 26)
+
+    def test_shipment_changelist(self):
+        self.assertGetWithinBudget(reverse("admin:logistics_shipment_changelist"), 7)
+
+    def test_shipment_change_form(self):
+        shipment = Shipment.objects.order_by("pk").first()
+        self.assertGetWithinBudget(reverse("admin:logistics_shipment_change", args=(shipment.pk,)), 7)
+
+
+class ExportQueryBudgetTests(QueryBudgetTestCase):
+    def test_claim_csv(self):
+        response = self.export(Claim, "export_csv", 11)
+        self.assertEqual(response["Content-Type"], "text/csv")
+
+    def test_claim_xlsx(self):
+        self.export(Claim, "export_xlsx", 11)
+
+    def test_claim_columns(self):
+        # With and without a shipment
+        claims = Claim.objects.order_by("pk").values_list("pk", flat=True)
+        pks = {*claims.filter(shipment__isnull=True)[:10], *claims.filter(shipment__isnull=False)[:10]}
+        self.assertSameExport(Claim, sorted(pks))
+
+    def test_shipment_manifest(self):
+        response = self.export(Shipment, "export_manifest", 7)
+        self.assertEqual(response["Content-Type"], "text/csv")
+
+
+class ClaimedTotalTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        contact = Contact.objects.create(username="donor")
+        offer = Offer.objects.create(contact=contact, description="Switches")
+        cls.first = OfferItem.objects.create(offer=offer, brand="Cisco", model="C9300-48P", amount=5)
+        cls.second = OfferItem.objects.create(offer=offer, brand="Cisco", model="C9300-48T", amount=5)
+        request = Request.objects.create(contact=contact, goal="Network")
+        cls.requested_item = RequestItem.objects.create(request=request, brand="Cisco", model="C9300", amount=3)
+
+    def claimed(self):
+        return dict(OfferItem.objects.filter(pk__in=[self.first.pk, self.second.pk]).values_list("pk", "claimed_total"))
+
+    def test_create(self):
+        Claim.objects.create(offered_item=self.first, requested_item=self.requested_item, amount=2)
+        Claim.objects.create(offered_item=self.first, amount=1)
+        self.assertEqual(self.claimed(), {self.first.pk: 3, self.second.pk: 0})
+
+    def test_edit(self):
+        claim = Claim.objects.create(offered_item=self.first, amount=2)
+        claim.amount = 4
+        claim.save()
+        self.assertEqual(self.claimed(), {self.first.pk: 4, self.second.pk: 0})
+
+        # A claim loaded again counts from what it was saved with
+        claim = Claim.objects.get(pk=claim.pk)
+        claim.offered_item = self.second
+        claim.amount = 1
+        claim.save()
+        self.assertEqual(self.claimed(), {self.first.pk: 0, self.second.pk: 1})
+
+    def test_delete(self):
+        claim = Claim.objects.create(offered_item=self.first, amount=2)
+        Claim.objects.create(offered_item=self.first, amount=1)
+        Claim.objects.create(offered_item=self.second, amount=1)
+        claim.delete()
+        self.assertEqual(self.claimed(), {self.first.pk: 1, self.second.pk: 1})
+
+        # Bulk deletes go through the signal as well
+        Claim.objects.all().delete()
+        self.assertEqual(self.claimed(), {self.first.pk: 0, self.second.pk: 0})
+
+    def test_loaded_offered_item(self):
+        offered_item = OfferItem.objects.get(pk=self.first.pk)
+        claim = Claim.objects.create(offered_item=offered_item, amount=2)
+        self.assertEqual(claim.offered_item.available, 3)
+
+        # Saving the loaded offered item doesn't write back its total
+        Claim.objects.create(offered_item=OfferItem.objects.get(pk=self.first.pk), amount=1)
+        offered_item.notes = "Spare"
+        offered_item.save()
+        self.assertEqual(self.claimed(), {self.first.pk: 3, self.second.pk: 0})
+
+
+class ManifestTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        donor = Contact.objects.create(username="donor", organisation=Organisation.objects.create(name="Donor"))
+        requester = Contact.objects.create(username="requester", organisation=Organisation.objects.create(name="NOC"))
+        offer = Offer.objects.create(contact=donor, description="Switches")
+        request = Request.objects.create(contact=requester, goal="Network")
+        requested_item = RequestItem.objects.create(request=request, brand="Cisco", model="C9300", amount=10)
+
+        EquipmentData.objects.create(brand="Cisco", model="C9300-48P", weight=7.5, width=44, height=4, depth=45)
+        EquipmentData.objects.create(brand="Juniper", model="EX2300-24T", weight=3.5)
+
+        cls.shipment = Shipment.objects.create(name="Pallet 1")
+        cls.empty = Shipment.objects.create(name="Pallet 2")
+        cls.claims = [
+            Claim.objects.create(
+                offered_item=OfferItem.objects.create(offer=offer, brand=brand, model=model, amount=amount),
+                requested_item=requested_item if brand == "Cisco" else None,
+                amount=amount,
+                shipment=cls.shipment,
+            )
+            for brand, model, amount in [
+                ("Juniper", "EX2300-24T", 1),
+                ("Cisco", "C9300-48P", 2),
+                ("Cisco", "C9300-48P-E", 1),
+                ("Acme", "Switch", 3),
+            ]
+        ]
+
+    def setUp(self):
+        # The equipment data of this test instead of the resolver of an earlier one
+        equipment_resolver.forget()
+        self.addCleanup(equipment_resolver.forget)
+
+    def test_rows(self):
+        manifest, empty = Manifest.for_shipments([self.shipment, self.empty])
+        juniper, cisco, variant, unknown = (claim.pk for claim in self.claims)
+        self.assertEqual(
+            list(manifest.rows()),
+            [
+                ["Pallet 1", unknown, 3, "Hardware", "Acme", "Switch", "Donor", "", "", "", "", "unknown"],
+                ["Pallet 1", cisco, 2, "Hardware", "Cisco", "C9300-48P", "Donor", "NOC", 7.5, 15.0, 0.016, ""],
+                [
+                    "Pallet 1",
+                    variant,
+                    1,
+                    "Hardware",
+                    "Cisco",
+                    "C9300-48P-E",
+                    "Donor",
+                    "NOC",
+                    7.5,
+                    7.5,
+                    0.008,
+                    "approximate",
+                ],
+                ["Pallet 1", juniper, 1, "Hardware", "Juniper", "EX2300-24T", "Donor", "", 3.5, 3.5, "", "incomplete"],
+                ["Pallet 1", "", 7, "", "", "", "", "", "", 26.0, 0.024, "3 unknown, incomplete or approximate"],
+            ],
+        )
+        self.assertEqual(list(empty.rows()), [["Pallet 2", "", 0, "", "", "", "", "", "", 0, 0, ""]])
+
+    def test_queries(self):
+        equipment_resolver.get()
+        # The shipments and their claims, the resolver has the equipment data already
+        with self.assertNumQueries(2):
+            manifests = Manifest.for_shipments(Shipment.objects.order_by("pk"))
+        self.assertEqual([len(manifest.lines) for manifest in manifests], [4, 0])
+
+
+class PackTests(SimpleTestCase):
+    def assertWithinCapacity(self, plan, max_weight: float, max_volume: float):
+        for planned in plan.shipments:
+            self.assertLessEqual(planned.weight, max_weight + 1e-9)
+            self.assertLessEqual(planned.volume, max_volume + 1e-9)
+
+    def claims(self, plan):
+        return [[load.claim_id for load in planned.loads] for planned in plan.shipments]
+
+    def test_first_fit_decreasing(self):
+        loads = [Load(pk, weight, 0.1) for pk, weight in enumerate([2, 6, 3, 5, 4], 1)]
+        plan = pack(loads, max_weight=10, max_volume=10)
+        self.assertEqual(self.claims(plan), [[2, 5], [4, 3, 1]])
+        self.assertEqual([planned.weight for planned in plan.shipments], [10, 10])
+        self.assertEqual(plan.unplanned, [])
+
+    def test_weight_and_volume(self):
+        # The heavy and the bulky claim share a shipment, two heavy or two bulky ones don't
+        loads = [Load(1, 8, 0.5), Load(2, 1, 1.75), Load(3, 7, 0.25), Load(4, 2, 1.5)]
+        plan = pack(loads, max_weight=10, max_volume=2)
+        self.assertEqual(self.claims(plan), [[2, 3], [1, 4]])
+        self.assertWithinCapacity(plan, 10, 2)
+
+    def test_too_big(self):
+        plan = pack([Load(1, 11, 1), Load(2, 1, 3), Load(3, 10, 2)], max_weight=10, max_volume=2)
+        self.assertEqual(self.claims(plan), [[3]])
+        self.assertEqual(plan.unplanned, [(1, "too big"), (2, "too big")])
+
+    def test_open_shipments(self):
+        full = PlannedShipment(10, 2, Shipment(name="Full"))
+        full.remaining_weight = 1
+        open_shipment = PlannedShipment(10, 2, Shipment(name="Open"))
+        open_shipment.remaining_volume = 1
+
+        plan = pack([Load(1, 5, 0.5), Load(2, 4, 0.75), Load(3, 2, 0.125)], 10, 2, [full, open_shipment])
+        self.assertEqual(self.claims(plan), [[1, 3], [2]])
+        self.assertIs(plan.shipments[0], open_shipment)
+        self.assertEqual(plan.new_shipments, plan.shipments[1:])
+        self.assertWithinCapacity(plan, 10, 2)
+
+    def test_random(self):
+        # The same shipments as trying every shipment in order
+        rng = Random(17)
+        for _ in range(20):
+            loads = [Load(pk, rng.uniform(1, 600), rng.uniform(0.01, 1.5)) for pk in range(rng.randint(1, 200))]
+            plan = pack(loads, max_weight=1000, max_volume=2)
+            self.assertWithinCapacity(plan, 1000, 2)
+            self.assertEqual(sorted(pk for pks in self.claims(plan) for pk in pks), [load.claim_id for load in loads])
+
+            expected = []
+            for load in sorted(loads, key=lambda load: (-max(load.weight / 1000, load.volume / 2), load.claim_id)):
+                for planned in expected:
+                    if planned.remaining_weight >= load.weight and planned.remaining_volume >= load.volume:
+                        break
+                else:
+                    planned = PlannedShipment(1000, 2)
+                    expected.append(planned)
+                planned.add(load)
+            self.assertEqual(self.claims(plan), [[load.claim_id for load in planned.loads] for planned in expected])
+
+
+class EquipmentResolverTests(SimpleTestCase):
+    resolver = EquipmentResolver(
+        [
+            Equipment(1, "Cisco", "C9300-48T", 7.2, 44, 4, 45),
+            Equipment(2, "Juniper", "EX2300-48P", 4.1, 44, 4, 30),
+            Equipment(3, "Cisco", "WS-C2960X-48FPD-L", 8.0, 44, 4, 37),
+        ]
+    )
+
+    def resolve(self, brand: str, model: str):
+        equipment = self.resolver.resolve(brand, model)
+        return equipment and (equipment.pk, equipment.approximate)
+
+    def test_same_model(self):
+        self.assertEqual(self.resolve("Cisco Systems, Inc.", "c9300 48t"), (1, False))
+        self.assertEqual(self.resolve("Cisco", "C9300-48T="), (1, False))
+        self.assertEqual(self.resolve("", "EX2300 48P"), (2, False))
+
+    def test_variant(self):
+        self.assertEqual(self.resolve("Cisco", "C9300-48T-E"), (1, True))
+        self.assertEqual(self.resolve("Cisco", "C2960X-48FPD-L"), (3, True))
+
+    def test_other_model(self):
+        # Siblings share most of their trigrams, but they weigh and measure differently
+        self.assertIsNone(self.resolve("Cisco", "C9300-48P"))
+        self.assertIsNone(self.resolve("Cisco", "C2960X-24FPD-L"))
+        self.assertIsNone(self.resolve("Juniper", "C9300-48T"))
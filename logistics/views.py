@@ -1,13 +1,18 @@
 from django import forms
 from django.contrib import messages
+from django.http import HttpResponseRedirect
 from django.shortcuts import get_object_or_404
 from django.urls import reverse
 from django.utils import timezone
+from django.utils.decorators import method_decorator
 from django.utils.translation import gettext_lazy as _
+from django.utils.translation import ngettext
 
+from aid_coordinator.decorators import superuser_required
 from aid_coordinator.views import AdminFormView
-from logistics.forms import RequestForm
+from logistics.forms import PlanShipmentsForm, RequestForm
 from logistics.models import Claim
+from logistics.planning import apply_plan, plan_shipments
 from supply_demand.models import OfferItem, Request, RequestItem
 
 
@@ -70,3 +75,48 @@ class RequestView(AdminFormView):
 
     def get_success_url(self):
         return reverse("admin:supply_demand_offeritem_changelist")
+
+
+@method_decorator(superuser_required(), name="dispatch")
+class PlanShipmentsView(AdminFormView):
+    template_name = "admin/plan_shipments.html"
+    form_class = PlanShipmentsForm
+    admin_model = Claim
+    max_unplanned = 100
+
+    def form_valid(self, form: PlanShipmentsForm):
+        location = form.cleaned_data["location"]
+        plan = plan_shipments(
+            location,
+            max_weight=form.cleaned_data["max_weight"],
+            max_volume=form.cleaned_data["max_volume"],
+            use_open_shipments=form.cleaned_data["use_open_shipments"],
+        )
+
+        if "apply" not in self.request.POST:
+            # Show the plan, applying it plans again with the same settings
+            claim_ids = [load.claim_id for planned in plan.shipments for load in planned.loads]
+            claim_ids += [claim_id for claim_id, reason in plan.unplanned[: self.max_unplanned]]
+            claims = Claim.objects.select_related("offered_item", "requested_item").in_bulk(claim_ids)
+            return self.render_to_response(
+                self.get_context_data(
+                    form=form,
+                    plan=plan,
+                    shipments=[
+                        (planned, [claims[load.claim_id] for load in planned.loads]) for planned in plan.shipments
+                    ],
+                    unplanned=[(claims[claim_id], reason) for claim_id, reason in plan.unplanned[: self.max_unplanned]],
+                )
+            )
+
+        count = apply_plan(plan, location)
+        messages.info(
+            self.request,
+            ngettext(
+                "%(count)s claim has been assigned to a shipment",
+                "%(count)s claims have been assigned to shipments",
+                count,
+            )
+            % {"count": count},
+        )
+        return HttpResponseRedirect(reverse("admin:logistics_shipment_changelist"))
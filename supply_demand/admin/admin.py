@@ -1,19 +1,33 @@
-from typing import Iterable
-
-from admin_wizard.admin import UpdateAction
-from django.contrib import admin
-from django.db.models import Exists, OuterRef, Sum
-from django.http import HttpRequest
-from django.urls import reverse
+from uuid import uuid4
+
+from django.contrib import admin, messages
+from django.core.cache import cache
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.db import DatabaseError
+from django.db.models import Exists, OuterRef, Prefetch
+from django.http import HttpRequest, HttpResponseRedirect
+from django.urls import path, reverse
+from django.utils.decorators import method_decorator
 from django.utils.html import format_html, format_html_join
 from django.utils.safestring import mark_safe
 from django.utils.translation import gettext_lazy as _, ngettext
+from django.views.decorators.http import require_POST
 from import_export.admin import ExportActionModelAdmin, ImportExportActionModelAdmin
 
+from aid_coordinator.export import StreamingExportMixin
+from aid_coordinator.filters import CachedAllValuesFieldListFilter, CachedRelatedOnlyFieldListFilter, watch_facets
 from aid_coordinator.widgets import ClaimAutocompleteSelect
+from logistics.equipment import resolve_equipment
 from logistics.models import Claim
-from supply_demand.admin.base import CompactInline, ContactOnlyAdmin, ReadOnlyMixin
-from supply_demand.admin.filters import LocationFilter, OverclaimedListFilter
+from supply_demand.admin.base import (
+    ChangeLogMixin,
+    CompactInline,
+    ContactOnlyAdmin,
+    ItemsSummaryMixin,
+    MoveItemsAction,
+    ReadOnlyMixin,
+)
+from supply_demand.admin.filters import GroupAssignedListFilter, LocationFilter, OverclaimedListFilter
 from supply_demand.admin.forms import MoveToOfferForm, MoveToRequestForm
 from supply_demand.admin.resources import (
     CustomConfirmImportForm,
@@ -21,17 +35,26 @@ from supply_demand.admin.resources import (
     OfferItemExportResource,
     OfferItemImportResource,
     RequestItemResource,
+    import_cache_key,
 )
 from supply_demand.models import (
+    ArchivedChange,
     Change,
-    ChangeAction,
     ChangeType,
     ItemType,
     Offer,
     OfferItem,
     Request,
     RequestItem,
+    group_assigned,
 )
+from supply_demand.permissions import can_change, with_change_permission
+from supply_demand.search import IndexedSearchMixin
+from supply_demand.summaries import forget_summaries, offer_summaries, request_summaries
+from supply_demand.views import MatchView
+
+# Forget the cached values of the list filters when the items or changes change
+watch_facets(RequestItem, OfferItem, Change)
 
 
 class RequestItemInline(CompactInline):
@@ -50,6 +73,11 @@ class RequestItemInline(CompactInline):
     )
     readonly_fields = ("assigned",)
 
+    def get_queryset(self, request):
+        qs = super().get_queryset(request)
+        qs = qs.prefetch_related(Prefetch("claim_set", Claim.objects.select_related("offered_item")))
+        return qs
+
     @admin.display(description=_("assigned"))
     def assigned(self, item: RequestItem):
         if not item.pk:
@@ -72,6 +100,8 @@ class RequestItemInline(CompactInline):
             if parent_obj is not None:
                 field.queryset = field.queryset.filter(request=parent_obj)
                 field.limit_choices_to = {"request_id": parent_obj.id}
+                # Every form of the formset shares the choices, instead of querying them again per form
+                field.choices = list(field.choices)
             else:
                 field.queryset = field.queryset.none()
 
@@ -79,11 +109,15 @@ class RequestItemInline(CompactInline):
 
 
 @admin.register(Request)
-class RequestAdmin(ContactOnlyAdmin):
+class RequestAdmin(IndexedSearchMixin, ItemsSummaryMixin, ChangeLogMixin, ContactOnlyAdmin):
     list_display = ("contact", "goal", "admin_items")
     list_filter = ("contact__organisation",)
     autocomplete_fields = ("contact",)
     inlines = (RequestItemInline,)
+    change_type = ChangeType.REQUEST
+    item_model = RequestItem
+    item_parent_field = "request"
+    changelist_prefetch = ("contact__organisation",)
     search_fields = (
         "goal",
         "description",
@@ -95,37 +129,8 @@ class RequestAdmin(ContactOnlyAdmin):
         "items__notes",
     )
 
-    def get_queryset(self, request):
-        qs = super().get_queryset(request)
-        qs = qs.prefetch_related("items__claim_set")
-        return qs
-
-    @admin.display(description=_("items"))
-    def admin_items(self, request: Request):
-        def prefix(my_item: RequestItem) -> str:
-            if my_item.assigned:
-                return "✅ "
-            else:
-                return ""
-
-        def alts(alt_items: Iterable[RequestItem]) -> str:
-            alt_out = " or ".join(
-                [prefix(alt_item) + alt_item.counted_name + alts(alt_item.alternatives.all()) for alt_item in alt_items]
-            )
-            if not alt_out:
-                return ""
-            return " or " + alt_out
-
-        items = []
-        for item in request.items.all():
-            # Don't filter the query, it will ruin the prefetch_related we already did, this is much faster
-            if item.alternative_for_id:
-                continue
-
-            out = prefix(item) + item.counted_name + alts(item.alternatives.all())
-            items.append((out,))
-
-        return format_html_join(mark_safe("<br>"), "{}", items)
+    def items_summaries(self, request_ids):
+        return request_summaries(request_ids)
 
     def get_fields(self, request, obj=None):
         fields = super().get_fields(request, obj)
@@ -151,40 +156,6 @@ class RequestAdmin(ContactOnlyAdmin):
         request.parent_obj = obj
         return super().get_form(request, obj, **kwargs)
 
-    # noinspection DuplicatedCode
-    def save_related(self, request, form, *args, **kwargs):
-        super().save_related(request, form, *args, **kwargs)
-
-        # Now everything is saved, so we can add the change entry
-        before = form.instance.change_before
-        after = form.instance.change_log_entry()
-        if before != after:
-            Change(
-                who=request.user,
-                action=ChangeAction.CHANGE if form.instance.change_id else ChangeAction.ADD,
-                type=ChangeType.REQUEST,
-                what=str(form.instance),
-                before=before,
-                after=after,
-            ).save()
-
-    def delete_queryset(self, request, queryset):
-        for obj in queryset:
-            self.delete_model(request, obj)
-
-    def delete_model(self, request, obj):
-        before = obj.change_log_entry()
-        after = ""
-        Change(
-            who=request.user,
-            action=ChangeAction.DELETE,
-            type=ChangeType.REQUEST,
-            what=str(obj),
-            before=before,
-            after=after,
-        ).save()
-        super().delete_model(request, obj)
-
 
 class ClaimInlineAdmin(CompactInline):
     model = Claim
@@ -200,7 +171,7 @@ class ClaimInlineAdmin(CompactInline):
 
 
 @admin.register(RequestItem)
-class RequestItemAdmin(ExportActionModelAdmin):
+class RequestItemAdmin(IndexedSearchMixin, StreamingExportMixin, ExportActionModelAdmin):
     list_display = (
         "type",
         "brand",
@@ -208,11 +179,17 @@ class RequestItemAdmin(ExportActionModelAdmin):
         "amount",
         "up_to",
         "assigned",
+        "group_assigned",
         "delivered",
         "created_at",
         "item_of",
     )
-    list_filter = ("type", "brand", "request__contact__organisation")
+    list_filter = (
+        "type",
+        GroupAssignedListFilter,
+        ("brand", CachedAllValuesFieldListFilter),
+        "request__contact__organisation",
+    )
     autocomplete_fields = ("request",)
     ordering = ("brand", "model")
     resource_class = RequestItemResource
@@ -225,17 +202,31 @@ class RequestItemAdmin(ExportActionModelAdmin):
         "request__contact__last_name",
     )
     actions = (
-        UpdateAction(form_class=MoveToRequestForm, title=_("Move to other request")),
+        MoveItemsAction("request", form_class=MoveToRequestForm, title=_("Move to other request")),
+        "export_csv",
+        "export_xlsx",
         "set_type_hardware",
         "set_type_software",
         "set_type_service",
         "set_type_other",
     )
     inlines = (ClaimInlineAdmin,)
+    viewer_actions = ("export_admin_action", "export_csv", "export_xlsx")
+
+    def get_urls(self):
+        return [
+            path(
+                "matches/",
+                self.admin_site.admin_view(MatchView.as_view()),
+                name="supply_demand_requestitem_matches",
+            )
+        ] + super().get_urls()
 
     def get_queryset(self, request):
         qs = super().get_queryset(request)
+        qs = with_change_permission(qs, request.user, "request__")
         qs = qs.annotate(assigned=Exists(Claim.objects.filter(requested_item=OuterRef("pk"))))
+        qs = qs.annotate(group_assigned=group_assigned())
         qs = qs.annotate(
             delivered=Exists(Claim.objects.filter(requested_item=OuterRef("pk"), shipment__is_delivered=True))
         )
@@ -250,6 +241,10 @@ class RequestItemAdmin(ExportActionModelAdmin):
     def assigned(self, item: RequestItem):
         return item.assigned
 
+    @admin.display(description=_("group assigned"), boolean=True, ordering="group_assigned")
+    def group_assigned(self, item: RequestItem):
+        return item.group_assigned
+
     @admin.display(description=_("delivered"), boolean=True, ordering="delivered")
     def delivered(self, item: RequestItem):
         return item.delivered
@@ -304,50 +299,27 @@ class RequestItemAdmin(ExportActionModelAdmin):
 
     def has_view_permission(self, request, obj=None):
         user = request.user
-        if not obj:
-            return user.is_superuser or user.is_donor or user.is_viewer
-
-        return (
-            user.is_superuser
-            or user.is_donor
-            or user.is_viewer
-            or obj.request.contact == user
-            or (
-                obj.request.contact.organisation_id is not None
-                and obj.request.contact.organisation_id == user.organisation_id
-            )
-        )
+        if user.is_superuser or user.is_donor or user.is_viewer:
+            return True
+
+        return obj is not None and can_change(user, obj, "request__")
 
     def has_change_permission(self, request, obj=None):
         if not obj:
             return request.user.is_superuser
 
-        return (
-            request.user.is_superuser
-            or obj.request.contact == request.user
-            or (
-                obj.request.contact.organisation_id is not None
-                and obj.request.contact.organisation_id == request.user.organisation_id
-            )
-        )
+        return can_change(request.user, obj, "request__")
 
     def has_delete_permission(self, request, obj=None):
         if not obj:
             return request.user.is_superuser
 
-        return (
-            request.user.is_superuser
-            or obj.request.contact == request.user
-            or (
-                obj.request.contact.organisation_id is not None
-                and obj.request.contact.organisation_id == request.user.organisation_id
-            )
-        )
+        return can_change(request.user, obj, "request__")
 
     def get_actions(self, request):
         super_actions = super().get_actions(request)
         if request.user.is_viewer:
-            return {key: value for key, value in super_actions.items() if key == "export_admin_action"}
+            return {key: value for key, value in super_actions.items() if key in self.viewer_actions}
 
         if not request.user.is_superuser:
             return {}
@@ -366,7 +338,9 @@ class RequestItemAdmin(ExportActionModelAdmin):
         user = request.user
         if not user.is_superuser and not user.is_viewer:
             fields = [
-                field for field in fields if field not in ("request", "created_at", "assigned", "delivered", "item_of")
+                field
+                for field in fields
+                if field not in ("request", "created_at", "assigned", "group_assigned", "delivered", "item_of")
             ]
 
         return fields
@@ -423,11 +397,15 @@ class OfferItemInline(CompactInline):
 
 
 @admin.register(Offer)
-class OfferAdmin(ContactOnlyAdmin):
+class OfferAdmin(IndexedSearchMixin, ItemsSummaryMixin, ChangeLogMixin, ContactOnlyAdmin):
     list_display = ("description", "admin_organisation", "admin_contact", "admin_items")
     list_filter = (LocationFilter, "contact__organisation")
     autocomplete_fields = ("contact",)
     inlines = (OfferItemInline,)
+    change_type = ChangeType.OFFER
+    item_model = OfferItem
+    item_parent_field = "offer"
+    changelist_prefetch = ("contact__organisation",)
     search_fields = (
         "description",
         "contact__first_name",
@@ -447,23 +425,8 @@ class OfferAdmin(ContactOnlyAdmin):
     def admin_contact(self, offer: Offer):
         return offer.contact.display_name()
 
-    @admin.display(description=_("items"))
-    def admin_items(self, offer: Offer):
-        lines = []
-        for item in offer.items.all():
-            if item.rejected:
-                prefix = "⛔️ "
-            else:
-                prefix = ""
-
-            lines.append(
-                (
-                    prefix,
-                    item.counted_name,
-                )
-            )
-
-        return format_html_join(mark_safe("<br>"), "{}{}", lines)
+    def items_summaries(self, offer_ids):
+        return offer_summaries(offer_ids)
 
     def get_list_filter(self, request: HttpRequest):
         if not request.user.is_superuser:
@@ -506,43 +469,9 @@ class OfferAdmin(ContactOnlyAdmin):
 
         return fields
 
-    # noinspection DuplicatedCode
-    def save_related(self, request, form, *args, **kwargs):
-        super().save_related(request, form, *args, **kwargs)
-
-        # Now everything is saved, so we can add the change entry
-        before = form.instance.change_before
-        after = form.instance.change_log_entry()
-        if before != after:
-            Change(
-                who=request.user,
-                action=ChangeAction.CHANGE if form.instance.change_id else ChangeAction.ADD,
-                type=ChangeType.OFFER,
-                what=str(form.instance),
-                before=before,
-                after=after,
-            ).save()
-
-    def delete_queryset(self, request, queryset):
-        for obj in queryset:
-            self.delete_model(request, obj)
-
-    def delete_model(self, request, obj):
-        before = obj.change_log_entry()
-        after = ""
-        Change(
-            who=request.user,
-            action=ChangeAction.DELETE,
-            type=ChangeType.OFFER,
-            what=str(obj),
-            before=before,
-            after=after,
-        ).save()
-        super().delete_model(request, obj)
-
 
 @admin.register(OfferItem)
-class OfferItemAdmin(ImportExportActionModelAdmin):
+class OfferItemAdmin(IndexedSearchMixin, StreamingExportMixin, ImportExportActionModelAdmin):
     list_display = (
         "type",
         "brand",
@@ -553,6 +482,7 @@ class OfferItemAdmin(ImportExportActionModelAdmin):
         "available",
         "rejected",
         "received",
+        "equipment",
         "item_of",
     )
     list_filter = (
@@ -560,8 +490,8 @@ class OfferItemAdmin(ImportExportActionModelAdmin):
         "rejected",
         "received",
         OverclaimedListFilter,
-        "brand",
-        ("offer__contact__organisation", admin.RelatedOnlyFieldListFilter),
+        ("brand", CachedAllValuesFieldListFilter),
+        ("offer__contact__organisation", CachedRelatedOnlyFieldListFilter),
         "offer",
     )
     autocomplete_fields = ("offer",)
@@ -575,7 +505,9 @@ class OfferItemAdmin(ImportExportActionModelAdmin):
         "offer__contact__last_name",
     )
     actions = (
-        UpdateAction(form_class=MoveToOfferForm, title=_("Move to other offer")),
+        MoveItemsAction("offer", form_class=MoveToOfferForm, title=_("Move to other offer")),
+        "export_csv",
+        "export_xlsx",
         "set_type_hardware",
         "set_type_software",
         "set_type_service",
@@ -586,11 +518,7 @@ class OfferItemAdmin(ImportExportActionModelAdmin):
         "set_not_received",
     )
     inlines = (ClaimInlineAdmin,)
-
-    def get_queryset(self, request):
-        qs = super().get_queryset(request)
-        qs = qs.annotate(claimed=Sum("claim__amount"))
-        return qs
+    viewer_actions = ("export_admin_action", "export_csv", "export_xlsx")
 
     def set_type_action(self, request: HttpRequest, queryset: RequestItem.objects, item_type: ItemType):
         count = 0
@@ -629,13 +557,19 @@ class OfferItemAdmin(ImportExportActionModelAdmin):
     def set_type_service(self, request: HttpRequest, queryset: RequestItem.objects):
         self.set_type_action(request, queryset, ItemType.SERVICE)
 
+    def set_rejected_action(self, queryset: OfferItem.objects, rejected: bool):
+        # Rejected items are marked in the offer summaries
+        offer_ids = list(queryset.prefetch_related(None).values_list("offer", flat=True))
+        queryset.update(rejected=rejected)
+        forget_summaries(Offer, offer_ids)
+
     @admin.action(description=_("Set to rejected"))
     def set_rejected(self, _request: HttpRequest, queryset: RequestItem.objects):
-        queryset.update(rejected=True)
+        self.set_rejected_action(queryset, True)
 
     @admin.action(description=_("Set to NOT rejected"))
     def set_not_rejected(self, _request: HttpRequest, queryset: RequestItem.objects):
-        queryset.update(rejected=False)
+        self.set_rejected_action(queryset, False)
 
     @admin.action(description=_("Set to received"))
     def set_received(self, _request: HttpRequest, queryset: RequestItem.objects):
@@ -672,58 +606,81 @@ class OfferItemAdmin(ImportExportActionModelAdmin):
         initial = super().get_form_kwargs(form, *args, **kwargs)
         if hasattr(form, "cleaned_data") and "offer" in form.cleaned_data:
             initial["offer"] = form.cleaned_data["offer"].id
+        if hasattr(form, "import_token"):
+            initial["import_token"] = form.import_token
         return initial
 
     def get_import_data_kwargs(self, request, *args, **kwargs):
         """
         Prepare kwargs for import_data.
         """
+        form = kwargs.get("form")
+        if isinstance(form, CustomImportForm):
+            # Identifies the validated dataset in the cache, so the confirmation can skip parsing the file again
+            form.import_token = uuid4().hex
+            kwargs["import_token"] = form.import_token
         return kwargs
 
+    @method_decorator(require_POST)
+    def process_import(self, request, *args, **kwargs):
+        if not self.has_import_permission(request):
+            raise PermissionDenied
+
+        try:
+            return self.import_confirmed(request, *args, **kwargs)
+        except DatabaseError as e:
+            # The transaction of the import is rolled back, so none of the rows are written
+            self.message_user(
+                request,
+                _("Nothing was imported: %(error)s") % {"error": e},
+                level=messages.ERROR,
+            )
+            return HttpResponseRedirect(reverse("admin:supply_demand_offeritem_import"))
+
+    def import_confirmed(self, request, *args, **kwargs):
+        confirm_form = self.get_confirm_import_form()(request.POST)
+        if not confirm_form.is_valid() or not confirm_form.cleaned_data["import_token"]:
+            return super().process_import(request, *args, **kwargs)
+
+        key = import_cache_key(request, confirm_form.cleaned_data["import_token"])
+        dataset = cache.get(key)
+        if dataset is None:
+            # Expired, or validated by another process
+            return super().process_import(request, *args, **kwargs)
+
+        result = self.process_dataset(dataset, confirm_form, request, *args, **kwargs)
+
+        cache.delete(key)
+        self.get_tmp_storage_class()(name=confirm_form.cleaned_data["import_file_name"]).remove()
+
+        return self.process_result(result, request)
+
+    def get_queryset(self, request):
+        qs = super().get_queryset(request)
+        qs = with_change_permission(qs, request.user, "offer__")
+        return qs
+
     def has_add_permission(self, request):
         return request.user.is_superuser
 
     def has_view_permission(self, request, obj=None):
         user = request.user
-        if not obj:
-            return user.is_superuser or user.is_requester or user.is_viewer
-
-        return (
-            user.is_superuser
-            or user.is_requester
-            or user.is_viewer
-            or obj.offer.contact == user
-            or (
-                obj.offer.contact.organisation_id is not None
-                and obj.offer.contact.organisation_id == user.organisation_id
-            )
-        )
+        if user.is_superuser or user.is_requester or user.is_viewer:
+            return True
+
+        return obj is not None and can_change(user, obj, "offer__")
 
     def has_change_permission(self, request, obj=None):
         if not obj:
             return request.user.is_superuser
 
-        return (
-            request.user.is_superuser
-            or obj.offer.contact == request.user
-            or (
-                obj.offer.contact.organisation_id is not None
-                and obj.offer.contact.organisation_id == request.user.organisation_id
-            )
-        )
+        return can_change(request.user, obj, "offer__")
 
     def has_delete_permission(self, request, obj=None):
         if not obj:
             return request.user.is_superuser
 
-        return (
-            request.user.is_superuser
-            or obj.offer.contact == request.user
-            or (
-                obj.offer.contact.organisation_id is not None
-                and obj.offer.contact.organisation_id == request.user.organisation_id
-            )
-        )
+        return can_change(request.user, obj, "offer__")
 
     def get_inlines(self, request, obj):
         if not request.user.is_superuser:
@@ -734,7 +691,7 @@ class OfferItemAdmin(ImportExportActionModelAdmin):
     def get_actions(self, request):
         super_actions = super().get_actions(request)
         if request.user.is_viewer:
-            return {key: value for key, value in super_actions.items() if key == "export_admin_action"}
+            return {key: value for key, value in super_actions.items() if key in self.viewer_actions}
 
         if not request.user.is_superuser:
             return {}
@@ -780,7 +737,7 @@ class OfferItemAdmin(ImportExportActionModelAdmin):
 
     def get_list_filter(self, request):
         if not request.user.is_superuser:
-            return ["type", "brand"]
+            return ["type", ("brand", CachedAllValuesFieldListFilter)]
 
         return super().get_list_filter(request)
 
@@ -792,7 +749,22 @@ class OfferItemAdmin(ImportExportActionModelAdmin):
             name=item.offer,
         )
 
-    @admin.display(description=_("claimed"))
+    @admin.display(description=_("equipment data"))
+    def equipment(self, item: OfferItem):
+        equipment = resolve_equipment(item.brand, item.model)
+        if not equipment:
+            return None
+
+        size = "x".join(str(dimension or "?") for dimension in (equipment.width, equipment.height, equipment.depth))
+        return format_html(
+            '<span title="{name}">{approximate}{weight} kg, {size} cm</span>',
+            name=equipment,
+            approximate="≈ " if equipment.approximate else "",
+            weight=equipment.weight if equipment.weight is not None else "?",
+            size=size,
+        )
+
+    @admin.display(description=_("claimed"), ordering="claimed_total")
     def claimed(self, item: OfferItem):
         if not item.amount:
             return None
@@ -823,20 +795,81 @@ class OfferItemAdmin(ImportExportActionModelAdmin):
 
 
 @admin.register(Change)
-class ChangeAdmin(ReadOnlyMixin, admin.ModelAdmin):
+class ChangeAdmin(IndexedSearchMixin, ReadOnlyMixin, admin.ModelAdmin):
     list_display = ("when", "who", "action", "type", "what")
     list_filter = (
         "action",
         "type",
-        ("who", admin.RelatedOnlyFieldListFilter),
+        ("who", CachedRelatedOnlyFieldListFilter),
     )
+    list_select_related = ("who__organisation",)
     date_hierarchy = "when"
     ordering = ("-when", "who")
+    fields = ("when", "who", "action", "type", "what", "admin_diff", "admin_before", "admin_after")
+    readonly_fields = ("admin_diff", "admin_before", "admin_after")
     search_fields = (
         "who__last_name",
         "who__first_name",
         "who__organisation__name",
         "what",
-        "before",
-        "after",
+        "snapshot",
+        "diff",
     )
+
+    def get_queryset(self, request):
+        # Joined instead of prefetched
+        return super().get_queryset(request).prefetch_related(None)
+
+    def get_object(self, request, object_id, from_field=None):
+        change = super().get_object(request, object_id, from_field)
+        if change is None and from_field is None:
+            # Old changes are moved to the archive by the archive_changes command
+            try:
+                archived = ArchivedChange.objects.select_related("who__organisation").filter(pk=object_id).first()
+            except (ValidationError, ValueError):
+                archived = None
+            if archived is not None:
+                change = archived.to_change()
+        return change
+
+    @admin.display(description=_("diff"))
+    def admin_diff(self, change: Change):
+        if not change.diff:
+            return "-"
+
+        return format_html(
+            '<pre style="margin: 0">{}</pre>',
+            "\n".join(change.diff_lines()),
+        )
+
+    @admin.display(description=_("before"))
+    def admin_before(self, change: Change):
+        return format_html('<pre style="margin: 0">{}</pre>', change.before) if change.before else "-"
+
+    @admin.display(description=_("after"))
+    def admin_after(self, change: Change):
+        return format_html('<pre style="margin: 0">{}</pre>', change.after) if change.after else "-"
+
+
+@admin.register(ArchivedChange)
+class ArchivedChangeAdmin(ReadOnlyMixin, admin.ModelAdmin):
+    list_display = ("when", "who", "action", "type", "what")
+    list_filter = ("action", "type")
+    list_select_related = ("who__organisation",)
+    date_hierarchy = "when"
+    ordering = ("-when", "who")
+    # The texts are compressed, only what is left uncompressed can be searched
+    search_fields = (
+        "who__last_name",
+        "who__first_name",
+        "who__organisation__name",
+        "what",
+    )
+
+    def get_queryset(self, request):
+        # The list doesn't show the compressed data
+        return super().get_queryset(request).defer("data")
+
+    def change_view(self, request, object_id, form_url="", extra_context=None):
+        # The change admin shows archived changes like the others
+        return HttpResponseRedirect(reverse("admin:supply_demand_change_change", args=(object_id,)))
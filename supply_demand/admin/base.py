@@ -1,6 +1,18 @@
+from typing import Dict, Iterable, Sequence
+
+from admin_wizard.admin import UpdateAction
 from django.contrib import admin
-from django.db.models import Q, QuerySet
+from django.contrib.admin.views.main import ChangeList
+from django.db.models import Model, QuerySet
 from django.forms import NumberInput, TextInput
+from django.utils.safestring import SafeString
+from django.utils.translation import gettext_lazy as _
+
+from aid_coordinator.filters import forget_facets
+from supply_demand.models import Change, ChangeAction, ChangeType
+from supply_demand.permissions import owned_by
+from supply_demand.search import update_search_later
+from supply_demand.summaries import forget_summaries
 
 
 class ContactOnlyAdmin(admin.ModelAdmin):
@@ -10,10 +22,129 @@ class ContactOnlyAdmin(admin.ModelAdmin):
         if request.user.is_superuser or request.user.is_viewer:
             return queryset
 
-        if request.user.organisation_id:
-            return queryset.filter(Q(contact__organisation_id=request.user.organisation_id) | Q(contact=request.user))
+        return queryset.filter(owned_by(request.user))
+
+
+class ChangeLogMixin:
+    """
+    Log changes to a model with inline items, without fetching anything that the admin didn't already load.
+    """
+
+    change_type: ChangeType = None
+    item_model: Model = None
+    item_parent_field: str = None
+
+    def get_object(self, request, object_id, from_field=None):
+        obj = super().get_object(request, object_id, from_field)
+        if obj is not None:
+            # The items are prefetched by the manager, and the form hasn't touched the object yet
+            obj.change_id = obj.pk
+            obj.change_before = obj.change_snapshot()
+        return obj
+
+    def saved_items(self, form, formsets):
+        for formset in formsets:
+            if formset.model is self.item_model:
+                # Deleted items have lost their primary key, unused extra forms never had one
+                return [item_form.instance for item_form in formset.forms if item_form.instance.pk]
+
+        # No inline formset for this user, so ask the database
+        return self.item_model.objects.filter(**{self.item_parent_field: form.instance})
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+
+        # Now everything is saved, so we can add the change entry
+        change = Change.from_snapshots(
+            before=form.instance.change_before or {},
+            after=form.instance.change_snapshot(self.saved_items(form, formsets)),
+            who=request.user,
+            action=ChangeAction.CHANGE if form.instance.change_id else ChangeAction.ADD,
+            type=self.change_type,
+            what=str(form.instance),
+        )
+        if change:
+            change.save()
+
+    def delete_change(self, request, obj) -> Change:
+        return Change.from_snapshots(
+            before=obj.change_snapshot(),
+            after={},
+            who=request.user,
+            action=ChangeAction.DELETE,
+            type=self.change_type,
+            what=str(obj),
+        )
+
+    def delete_queryset(self, request, queryset):
+        changes = Change.objects.bulk_create([self.delete_change(request, obj) for obj in queryset])
+        update_search_later(Change, [change.pk for change in changes if change.pk])
+        forget_facets(Change)
+        super().delete_queryset(request, queryset)
+
+    def delete_model(self, request, obj):
+        self.delete_change(request, obj).save()
+        super().delete_model(request, obj)
+
+
+class ItemsSummaryChangeList(ChangeList):
+    def get_queryset(self, request):
+        # The summaries are cached, so don't prefetch the items of every row
+        queryset = super().get_queryset(request)
+        return queryset.prefetch_related(None).prefetch_related(*self.model_admin.changelist_prefetch)
+
+    def get_results(self, request):
+        super().get_results(request)
+
+        summaries = self.model_admin.items_summaries([obj.pk for obj in self.result_list])
+        for obj in self.result_list:
+            obj.items_summary = summaries[obj.pk]
+
+
+class ItemsSummaryMixin:
+    """
+    Show the items of each row in the changelist from the cached summaries, see supply_demand.summaries.
+    """
+
+    changelist_prefetch: Sequence[str] = ()
+
+    def items_summaries(self, pks: Iterable[int]) -> Dict[int, SafeString]:
+        raise NotImplementedError
+
+    def get_changelist(self, request, **kwargs):
+        return ItemsSummaryChangeList
+
+    @admin.display(description=_("items"))
+    def admin_items(self, obj: Model):
+        if not hasattr(obj, "items_summary"):
+            obj.items_summary = self.items_summaries([obj.pk])[obj.pk]
+
+        return obj.items_summary
+
+
+class MoveItemsAction(UpdateAction):
+    """
+    Move the selected items to another parent, the summaries and search texts of both the old and
+    the new parents change.
+    """
+
+    def __init__(self, parent_field: str, **kwargs):
+        super().__init__(**kwargs)
+        self.parent_field = parent_field
+
+    def form_valid(self, form):
+        # noinspection PyProtectedMember
+        parent_model = self.queryset.model._meta.get_field(self.parent_field).related_model
+        rows = list(self.queryset.prefetch_related(None).values_list("pk", self.parent_field))
+        item_ids = [pk for pk, _parent_id in rows]
+        parent_ids = [parent_id for _pk, parent_id in rows] + [form.cleaned_data[self.parent_field].pk]
 
-        return queryset.filter(contact=request.user)
+        response = super().form_valid(form)
+        forget_summaries(parent_model, parent_ids)
+        # update() doesn't send signals, and the texts of both the items and their parents change
+        update_search_later(self.queryset.model, item_ids)
+        update_search_later(parent_model, parent_ids)
+        return response
 
 
 # noinspection PyMethodMayBeStatic,PyUnusedLocal
@@ -19,9 +19,29 @@ class OverclaimedListFilter(admin.SimpleListFilter):
 
     def queryset(self, request: HttpRequest, queryset: QuerySet):
         if self.value() == "yes":
-            return queryset.filter(claimed__gt=F("amount"))
+            return queryset.filter(claimed_total__gt=F("amount"))
+        if self.value() == "no":
+            return queryset.filter(claimed_total__lte=F("amount"))
+        else:
+            return queryset
+
+
+class GroupAssignedListFilter(admin.SimpleListFilter):
+    title = _("group assigned")
+    parameter_name = "group_assigned"
+
+    def lookups(self, request: HttpRequest, model_admin: ModelAdmin):
+        return (
+            ("yes", _("Yes")),
+            ("no", _("No")),
+        )
+
+    def queryset(self, request: HttpRequest, queryset: QuerySet):
+        # The admin annotates group_assigned
         if self.value() == "yes":
-            return queryset.filter(claimed__lte=F("amount"))
+            return queryset.filter(group_assigned=True)
+        if self.value() == "no":
+            return queryset.filter(group_assigned=False)
         else:
             return queryset
 
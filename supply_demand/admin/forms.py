@@ -1,4 +1,5 @@
 from django import forms
+from django.utils.translation import gettext_lazy as _
 
 from supply_demand.models import Offer, OfferItem, RequestItem
 
@@ -22,3 +23,17 @@ class MoveToRequestForm(forms.ModelForm):
     class Meta:
         model = RequestItem
         fields = ("request",)
+
+
+class MatchForm(forms.Form):
+    claims = forms.Field(widget=forms.CheckboxSelectMultiple, required=False)
+
+    def clean_claims(self):
+        claims = []
+        for value in self.cleaned_data["claims"] or []:
+            try:
+                requested_item_id, offered_item_id, amount = (int(part) for part in value.split(":"))
+            except ValueError:
+                raise forms.ValidationError(_("Invalid claim proposal: %(value)s"), params={"value": value})
+            claims.append((requested_item_id, offered_item_id, amount))
+        return claims
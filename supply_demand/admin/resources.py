@@ -1,11 +1,19 @@
 import sys
 
 from django import forms
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import transaction
 from django.http import HttpRequest
 from import_export import fields, resources
 from import_export.forms import ConfirmImportForm, ImportForm
 
+from aid_coordinator.filters import forget_facets
+from logistics.equipment import resolve_equipment
+from supply_demand.api import forget_api_responses
 from supply_demand.models import Offer, OfferItem, RequestItem
+from supply_demand.search import update_search_later
+from supply_demand.summaries import forget_summaries
 
 
 class MyModelResource(resources.ModelResource):
@@ -53,13 +61,92 @@ class CustomConfirmImportForm(ConfirmImportForm):
         queryset=Offer.objects.order_by("contact__organisation__name", "contact__last_name", "description"),
         required=True,
     )
+    import_token = forms.CharField(widget=forms.HiddenInput, required=False)
+
+
+def import_cache_key(request: HttpRequest, token: str) -> str:
+    return f"offer-item-import-{request.user.pk}-{token}"
 
 
 class OfferItemImportResource(MyModelResource):
+    """
+    Imports offered items in bulk.
+
+    The preview only validates the rows and doesn't touch the database. The validated dataset is cached so the
+    confirmation doesn't have to parse the file again, and then all rows are written with bulk_create in a single
+    transaction without a savepoint per row.
+    """
+
+    write_batch_size = 500
+    cache_timeout = 3600
+
+    # Shown in the preview, so unknown equipment can be spotted before confirming
+    equipment = fields.Field(column_name="equipment data", readonly=True)
+
     class Meta:
         model = OfferItem
-        fields = ("brand", "model", "amount", "notes")
+        fields = ("brand", "model", "amount", "notes", "equipment")
+        export_order = fields
         force_init_instance = True
+        use_bulk = True
+        batch_size = None
+
+    def import_data(
+        self,
+        dataset,
+        dry_run=False,
+        raise_errors=False,
+        use_transactions=None,
+        collect_failed_rows=False,
+        rollback_on_validation_errors=False,
+        **kwargs,
+    ):
+        self.created_ids = []
+        if dry_run:
+            result = self.import_data_inner(dataset, dry_run, raise_errors, False, collect_failed_rows, **kwargs)
+            if "import_token" in kwargs and not result.has_errors() and not result.has_validation_errors():
+                cache.set(import_cache_key(self.request, kwargs["import_token"]), dataset, self.cache_timeout)
+            return result
+
+        using = self.get_db_connection_name()
+        with transaction.atomic(using=using):
+            result = self.import_data_inner(dataset, dry_run, raise_errors, False, collect_failed_rows, **kwargs)
+
+            # bulk_create doesn't send signals
+            if "form" in kwargs and "offer" in kwargs["form"].cleaned_data:
+                forget_summaries(Offer, [kwargs["form"].cleaned_data["offer"].id], using)
+                # The texts of the offer, and through it those of the indexes that include the offer
+                update_search_later(Offer, [kwargs["form"].cleaned_data["offer"].id], using)
+            # The texts of the items themselves, some indexes don't include the offer
+            update_search_later(OfferItem, self.created_ids, using)
+            forget_api_responses(using)
+            forget_facets(OfferItem, using)
+
+        return result
+
+    def bulk_create(self, using_transactions, dry_run, raise_errors, batch_size=None):
+        # The instances are cleared afterwards, their ids are set by bulk_create
+        instances = list(self.create_instances)
+        # Always raise: an error that is only logged reports success without any rows, and leaves the transaction
+        # aborted on PostgreSQL. Raising rolls back the whole import.
+        super().bulk_create(using_transactions, dry_run, True, batch_size=self.write_batch_size)
+        self.created_ids.extend(instance.pk for instance in instances if instance.pk)
+
+    def validate_instance(self, instance, import_validation_errors=None, validate_unique=True):
+        # The offer comes from the form and is the same for every row, so check the other fields without queries
+        errors = dict(import_validation_errors or {})
+        try:
+            instance.clean_fields(exclude=["offer", *errors])
+        except ValidationError as e:
+            errors = e.update_error_dict(errors)
+
+        if errors:
+            raise ValidationError(errors)
+
+    # noinspection PyMethodMayBeStatic
+    def dehydrate_equipment(self, item: OfferItem) -> str:
+        equipment = resolve_equipment(item.brand, item.model)
+        return str(equipment) if equipment else ""
 
     def after_import_instance(self, instance, new, row_number=None, **kwargs):
         if "form" in kwargs and "offer" in kwargs["form"].cleaned_data:
@@ -1,12 +1,28 @@
-from django.db.models import Sum
+import hashlib
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Min, Sum
 from django.db.models.functions import Coalesce
-from django_filters import CharFilter, NumberFilter
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.http import parse_etags, quote_etag
+from django.utils.translation import get_language
+from django_filters import BooleanFilter, CharFilter, NumberFilter
 from django_filters.rest_framework import FilterSet
+from rest_framework import status
 from rest_framework.fields import CharField, Field
+from rest_framework.pagination import CursorPagination
+from rest_framework.request import Request
+from rest_framework.response import Response
 from rest_framework.serializers import HyperlinkedModelSerializer
 from rest_framework.viewsets import ReadOnlyModelViewSet
 
-from supply_demand.models import ItemType, OfferItem, RequestItem
+from logistics.models import Claim
+from supply_demand.models import ItemType, OfferItem, RequestItem, group_assigned
+
+API_CACHE_VERSION_KEY = "api-version"
 
 
 class OfferItemFilterSet(FilterSet):
@@ -25,6 +41,7 @@ class OfferItemFilterSet(FilterSet):
 class RequestItemFilterSet(FilterSet):
     type__not = NumberFilter(field_name="type", lookup_expr="exact", exclude=True)
     brand__not = CharFilter(field_name="brand", lookup_expr="icontains", exclude=True)
+    group_assigned = BooleanFilter(field_name="group_assigned")
 
     class Meta:
         model = RequestItem
@@ -62,20 +79,81 @@ class RequestItemSerializer(HyperlinkedModelSerializer):
         fields = ["type", "brand", "model", "notes", "amount"]
 
 
+class ItemCursorPagination(CursorPagination):
+    ordering = "id"
+    page_size = 100
+    page_size_query_param = "page_size"
+    max_page_size = 1000
+
+
+class RequestItemCursorPagination(ItemCursorPagination):
+    # The requested items are grouped, the lowest id is unique for each group
+    ordering = "first_id"
+
+
+# The version is in the ETag of every response, it has to be the same in every worker, so this needs the shared cache,
+# see settings.CACHES
+def api_cache_version() -> str:
+    return cache.get_or_set(API_CACHE_VERSION_KEY, lambda: uuid4().hex, None)
+
+
+def forget_api_responses(using=None):
+    # A new random version instead of incrementing, so an evicted version can't bring back old responses
+    transaction.on_commit(lambda: cache.set(API_CACHE_VERSION_KEY, uuid4().hex, None), using=using)
+
+
+class CachedListMixin:
+    """
+    Cache the list responses until the items or claims change, and let clients revalidate them with an ETag.
+    """
+
+    cache_timeout = 3600
+
+    def list(self, request: Request, *args, **kwargs):
+        # Everything that changes the output is in the key: the data version, the URL including the filters and
+        # the cursor, and the language of the item type labels
+        key = ":".join((api_cache_version(), get_language(), request.build_absolute_uri()))
+        etag = quote_etag(hashlib.md5(key.encode()).hexdigest())
+
+        if etag in parse_etags(request.META.get("HTTP_IF_NONE_MATCH", "")):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+        data = cache.get(f"api-response-{etag}")
+        if data is None:
+            data = super().list(request, *args, **kwargs).data
+            cache.set(f"api-response-{etag}", data, self.cache_timeout)
+
+        return Response(data, headers={"ETag": etag})
+
+
 # ViewSets define the view behavior.
-class OfferItemViewSet(ReadOnlyModelViewSet):
-    queryset = OfferItem.objects.filter(claim=None)
+class OfferItemViewSet(CachedListMixin, ReadOnlyModelViewSet):
+    queryset = OfferItem.objects.prefetch_related(None).filter(claimed_total=0)
     serializer_class = OfferItemSerializer
     filterset_class = OfferItemFilterSet
+    pagination_class = ItemCursorPagination
     search_fields = ["brand", "model", "notes"]
 
 
-class RequestItemViewSet(ReadOnlyModelViewSet):
+class RequestItemViewSet(CachedListMixin, ReadOnlyModelViewSet):
     queryset = (
-        RequestItem.objects.filter(claim=None)
+        RequestItem.objects.annotate(group_assigned=group_assigned())
+        .filter(claim=None)
         .values("type", "brand", "model", "notes")
-        .annotate(amount=Sum(Coalesce("up_to", "amount")))
+        .annotate(amount=Sum(Coalesce("up_to", "amount")), first_id=Min("id"))
     )
     serializer_class = RequestItemSerializer
     filterset_class = RequestItemFilterSet
+    pagination_class = RequestItemCursorPagination
     search_fields = ["brand", "model"]
+
+
+# noinspection PyUnusedLocal
+@receiver(post_save, sender=OfferItem)
+@receiver(post_delete, sender=OfferItem)
+@receiver(post_save, sender=RequestItem)
+@receiver(post_delete, sender=RequestItem)
+@receiver(post_save, sender=Claim)
+@receiver(post_delete, sender=Claim)
+def item_changed(sender, using=None, **kwargs):
+    forget_api_responses(using)
@@ -6,3 +6,7 @@ class SupplyDemandConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "supply_demand"
     verbose_name = _("Supply & Demand")
+
+    def ready(self):
+        # Register the signal handlers
+        from supply_demand import api, search, summaries  # noqa: F401
@@ -0,0 +1,63 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandParser
+from django.db import connection, transaction
+from django.utils.timezone import now
+from django.utils.translation import gettext as _
+
+from supply_demand.models import ArchivedChange, Change
+
+
+class Command(BaseCommand):
+    help = _("Move old changes from the change log to the compressed archive")
+
+    def add_arguments(self, parser: CommandParser):
+        parser.add_argument(
+            "--days",
+            default=settings.CHANGE_RETENTION_DAYS,
+            type=int,
+            help=_("archive changes older than this number of days (default: %(default)s)"),
+        )
+        parser.add_argument(
+            "--batch-size",
+            default=1000,
+            type=int,
+            help=_("number of changes moved per transaction (default: %(default)s)"),
+        )
+        parser.add_argument(
+            "--vacuum",
+            action="store_true",
+            help=_("afterwards, give the space of the moved changes back to the database"),
+        )
+
+    def handle(self, *args, **options):
+        before = now() - timedelta(days=options["days"])
+        # The organisations of who made the changes aren't needed to archive them
+        changes = Change.objects.prefetch_related(None).filter(when__lt=before).order_by("pk")
+
+        moved = 0
+        while True:
+            # Short transactions, so the application can keep logging changes in between
+            with transaction.atomic():
+                batch = list(changes[: options["batch_size"]])
+                if not batch:
+                    break
+
+                ArchivedChange.objects.bulk_create([ArchivedChange.from_change(change) for change in batch])
+                changes.filter(pk__in=[change.pk for change in batch]).delete()
+
+            moved += len(batch)
+            if options["verbosity"] > 1:
+                self.stdout.write(f"{moved} changes archived")
+
+        self.stdout.write(f"{moved} changes older than {before:%Y-%m-%d} archived")
+
+        if moved and options["vacuum"]:
+            # noinspection PyProtectedMember
+            table = Change._meta.db_table
+            with connection.cursor() as cursor:
+                if connection.vendor == "postgresql":
+                    cursor.execute(f"VACUUM ANALYZE {table}")
+                elif connection.vendor == "sqlite":
+                    cursor.execute("VACUUM")
@@ -0,0 +1,47 @@
+import time
+
+from django.core.management import BaseCommand, CommandParser
+from django.utils.translation import gettext as _
+
+from supply_demand.matching import MatchEngine
+
+
+class Command(BaseCommand):
+    help = _("Propose offered items for requested items that haven't been assigned yet")
+
+    def add_arguments(self, parser: CommandParser):
+        parser.add_argument(
+            "--limit",
+            default=5,
+            type=int,
+            help=_("maximum number of candidates per requested item (default: 5)"),
+        )
+        parser.add_argument(
+            "--min-score",
+            default=0.3,
+            type=float,
+            help=_("minimum similarity between requested and offered item (default: 0.3)"),
+        )
+
+    def handle(self, *args, **options):
+        start = time.monotonic()
+        engine = MatchEngine()
+        indexed = time.monotonic()
+        proposals = engine.propose(limit=options["limit"], min_score=options["min_score"])
+        done = time.monotonic()
+
+        for proposal in proposals:
+            self.stdout.write(f"- {proposal.requested_item.counted_name} [{proposal.requested_item.request}]")
+            for candidate in proposal.candidates:
+                marker = "" if candidate.complete else " (partial)"
+                self.stdout.write(
+                    f"  | {candidate.score:.2f} {candidate.amount}x {candidate.offered_item} "
+                    f"[{candidate.offered_item.offer}]{marker}"
+                )
+            self.stdout.write("")
+
+        if options["verbosity"] > 1:
+            self.stderr.write(
+                f"{len(engine.index.items)} offered items and {len(engine.requested_items)} requested items, "
+                f"indexed in {indexed - start:.3f}s, matched in {done - indexed:.3f}s"
+            )
@@ -0,0 +1,42 @@
+import time
+
+from django.core.management import BaseCommand, CommandError, CommandParser
+from django.utils.translation import gettext as _
+
+from supply_demand.models import SearchEntry
+from supply_demand.search import indexes, search_terms
+
+
+class Command(BaseCommand):
+    help = _("Rebuild the search indexes of the admin and the API")
+
+    def add_arguments(self, parser: CommandParser):
+        parser.add_argument(
+            "index",
+            nargs="*",
+            help=_("the indexes to rebuild (default: all)"),
+        )
+        parser.add_argument(
+            "--search",
+            help=_("afterwards, show how long searching for this takes in every index"),
+        )
+
+    def handle(self, *args, **options):
+        names = {index.name for index in indexes}
+        unknown = set(options["index"]) - names
+        if unknown:
+            raise CommandError(_("Unknown indexes: %(unknown)s") % {"unknown": ", ".join(sorted(unknown))})
+
+        selected = [index for index in indexes if not options["index"] or index.name in options["index"]]
+        for index in selected:
+            start = time.monotonic()
+            index.rebuild()
+            count = SearchEntry.objects.filter(index=index.name).count()
+            self.stdout.write(f"{index.name}: {count} objects in {time.monotonic() - start:.2f}s")
+
+        if options["search"]:
+            terms = search_terms(options["search"])
+            for index in selected:
+                start = time.monotonic()
+                found = index.matches(terms).count()
+                self.stdout.write(f"{index.name}: {found} found in {(time.monotonic() - start) * 1000:.1f}ms")
@@ -0,0 +1,46 @@
+from django.core.management import BaseCommand, CommandParser
+from django.db import transaction
+from django.db.models import F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils.translation import gettext as _
+
+from logistics.models import Claim
+from supply_demand.models import OfferItem
+
+
+class Command(BaseCommand):
+    help = _("Recalculate the claimed totals of offered items from their claims")
+
+    def add_arguments(self, parser: CommandParser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help=_("only report offered items with a wrong total"),
+        )
+
+    def handle(self, *args, **options):
+        totals = (
+            Claim.objects.filter(offered_item=OuterRef("pk"))
+            .values("offered_item")
+            .annotate(total=Sum("amount"))
+            .values("total")
+        )
+
+        with transaction.atomic():
+            wrong = (
+                OfferItem.objects.select_for_update()
+                .annotate(actual=Coalesce(Subquery(totals), 0))
+                .filter(~Q(claimed_total=F("actual")))
+            )
+
+            count = 0
+            for item in wrong:
+                self.stdout.write(f"- {item}: {item.claimed_total} -> {item.actual}")
+                if not options["dry_run"]:
+                    OfferItem.objects.filter(pk=item.pk).update(claimed_total=Coalesce(Subquery(totals), 0))
+                count += 1
+
+        if options["dry_run"]:
+            self.stdout.write(_("{count} offered items have a wrong claimed total").format(count=count))
+        else:
+            self.stdout.write(_("{count} offered items have been corrected").format(count=count))
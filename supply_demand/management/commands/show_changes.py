@@ -3,9 +3,10 @@ from datetime import timedelta
 
 from django.core.management import BaseCommand, CommandParser
 from django.utils.datetime_safe import date, datetime
+from django.utils.timezone import make_aware
 from django.utils.translation import gettext as _
 
-from supply_demand.models import Change
+from supply_demand.models import ArchivedChange, Change
 
 
 def change_date(value: str) -> date:
@@ -31,7 +32,15 @@ class Command(BaseCommand):
         self.stdout.write(f"Donation/request changes of {when}:")
         self.stdout.write("")
 
-        items = Change.objects.filter(when__year=when.year, when__month=when.month, when__day=when.day).order_by("when")
+        # A range instead of when__date so the database can use the index on when
+        start = make_aware(datetime.combine(when, datetime.min.time()))
+        period = {"when__gte": start, "when__lt": start + timedelta(days=1)}
+        # Old changes can have been moved to the archive
+        archived = ArchivedChange.objects.select_related("who__organisation").filter(**period)
+        items = sorted(
+            [*Change.objects.filter(**period), *(change.to_change() for change in archived)],
+            key=lambda change: change.when,
+        )
         if not items:
             self.stdout.write("- no changes")
             return
@@ -40,6 +49,12 @@ class Command(BaseCommand):
         for item in items:
             self.stdout.write(f"- {item}")
 
+            if item.diff:
+                self.stdout.write("  | " + "\n  | ".join(item.diff_lines()))
+                self.stdout.write("")
+                continue
+
+            # Changes from before structured diffs were recorded
             diff_lines = differ.compare(item.before.splitlines(), item.after.splitlines())
             diff = "\n  | ".join([line.rstrip() for line in diff_lines])
             self.stdout.write("  | " + diff)
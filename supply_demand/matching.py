@@ -0,0 +1,182 @@
+import math
+import re
+from collections import defaultdict
+from typing import Dict, Iterable, List, NamedTuple, Set, Tuple
+
+from django.db.models import F, Q
+
+from supply_demand.models import OfferItem, RequestItem, group_assigned
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+def normalize(text: str) -> str:
+    return " ".join(TOKEN_RE.findall((text or "").casefold()))
+
+
+def tokenize(brand: str, model: str) -> Set[str]:
+    tokens = set(TOKEN_RE.findall(normalize(f"{brand} {model}")))
+
+    # Also index the model number without separators, so "EX4300-48T" matches "ex4300 48t" and "EX430048T"
+    compact = normalize(model).replace(" ", "")
+    if compact:
+        tokens.add(compact)
+
+    return tokens
+
+
+class Candidate(NamedTuple):
+    requested_item: RequestItem
+    offered_item: OfferItem
+    score: float
+    amount: int
+
+    @property
+    def complete(self) -> bool:
+        return self.amount >= self.requested_item.amount
+
+
+class Proposal(NamedTuple):
+    requested_item: RequestItem
+    candidates: List[Candidate]
+
+
+class MatchIndex:
+    """
+    An inverted index from (type, token) to the open offered items containing that token.
+
+    Candidates are only generated from selective tokens, a brand name shared by thousands of items is still
+    counted in the score but doesn't make every item with that brand a candidate.
+    """
+
+    def __init__(self, offered_items: Iterable[OfferItem], max_postings: int = 200):
+        self.max_postings = max_postings
+        self.items: Dict[int, OfferItem] = {}
+        self.available: Dict[int, int] = {}
+        self.tokens: Dict[int, Set[str]] = {}
+        self.weights: Dict[int, float] = {}
+        self.postings: Dict[Tuple[int, str], Set[int]] = defaultdict(set)
+
+        for item in offered_items:
+            self.items[item.id] = item
+            self.available[item.id] = item.available
+            self.tokens[item.id] = tokenize(item.brand, item.model)
+            for token in self.tokens[item.id]:
+                self.postings[(item.type, token)].add(item.id)
+
+        self.max_idf = math.log(1 + len(self.items))
+        self.idf = {key: math.log(1 + len(self.items) / len(ids)) for key, ids in self.postings.items()}
+        self.min_weights: Dict[Tuple[int, str], float] = {}
+        for item_id, tokens in self.tokens.items():
+            item_type = self.items[item_id].type
+            self.weights[item_id] = self.weight(item_type, tokens)
+            for token in tokens:
+                key = (item_type, token)
+                self.min_weights[key] = min(self.min_weights.get(key, self.weights[item_id]), self.weights[item_id])
+
+    def weight(self, item_type: int, tokens: Set[str]) -> float:
+        # Tokens that no offer contains don't get an idf, give them the maximum so they still count against a match
+        return sum(self.idf.get((item_type, token), self.max_idf) for token in tokens)
+
+    def search(self, item_type: int, tokens: Set[str], min_score: float = 0.0) -> List[Tuple[int, float]]:
+        keys = sorted(
+            ((item_type, token) for token in tokens if (item_type, token) in self.postings),
+            key=lambda key: len(self.postings[key]),
+        )
+        if not keys:
+            return []
+
+        weight = self.weight(item_type, tokens)
+
+        if len(self.postings[keys[0]]) <= self.max_postings:
+            candidates = set()
+            for key in keys:
+                if len(self.postings[key]) > self.max_postings:
+                    break
+                candidates.update(self.postings[key])
+        else:
+            # Only common tokens: every candidate must contain all of them, and even the lightest such item has to be
+            # able to reach the minimum score before it's worth looking at them one by one
+            shared = sum(self.idf[key] for key in keys)
+            lightest = max(self.min_weights[key] for key in keys)
+            if shared / math.sqrt(weight * lightest) < min_score:
+                return []
+
+            candidates = set.intersection(*(self.postings[key] for key in keys))
+
+        results = []
+        for item_id in candidates:
+            shared = self.weight(item_type, tokens & self.tokens[item_id])
+            score = shared / math.sqrt(weight * self.weights[item_id])
+            if score >= min_score:
+                results.append((item_id, score))
+
+        results.sort(key=lambda result: result[1], reverse=True)
+        return results
+
+
+def open_offered_items():
+    return OfferItem.objects.filter(rejected=False).filter(Q(amount=None) | Q(amount__gt=F("claimed_total")))
+
+
+def request_items():
+    return RequestItem.objects.annotate(group_assigned=group_assigned()).filter(group_assigned=False)
+
+
+class MatchEngine:
+    """
+    Proposes claims for requested items that aren't assigned yet.
+
+    Requested items are grouped by their alternative group, groups that already have a claim on any of their members
+    are considered fulfilled and aren't loaded. Within a group the primary item is preferred over alternatives.
+    Availability is reserved greedily, best matches first, so the top candidates don't overbook an offered item.
+    """
+
+    def __init__(self, offered_items: Iterable[OfferItem] = None, requested_items: Iterable[RequestItem] = None):
+        self.index = MatchIndex(open_offered_items() if offered_items is None else offered_items)
+        self.requested_items = list(request_items() if requested_items is None else requested_items)
+
+    def groups(self) -> Dict[int, List[Tuple[int, RequestItem]]]:
+        groups = defaultdict(list)
+        for item in self.requested_items:
+            groups[item.group_root_id or item.id].append((item.group_depth, item))
+
+        return groups
+
+    def propose(self, limit: int = 5, min_score: float = 0.3, penalty: float = 0.1) -> List[Proposal]:
+        ranked = []
+        for members in self.groups().values():
+            candidates = []
+            for depth, item in members:
+                for item_id, score in self.index.search(item.type, tokenize(item.brand, item.model), min_score):
+                    candidates.append((score * (1 - penalty) ** depth, item, self.index.items[item_id]))
+
+            if candidates:
+                candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+                ranked.append(candidates[:limit])
+
+        ranked.sort(key=lambda group_candidates: group_candidates[0][0], reverse=True)
+
+        remaining = dict(self.index.available)
+        proposals = []
+        for group_candidates in ranked:
+            proposal = None
+            for score, requested_item, offered_item in group_candidates:
+                amount = min(remaining[offered_item.id], requested_item.up_to or requested_item.amount)
+                if amount <= 0:
+                    continue
+
+                candidate = Candidate(requested_item, offered_item, round(score, 3), amount)
+                if proposal is None:
+                    proposal = Proposal(requested_item, [])
+                    remaining[offered_item.id] -= amount
+                proposal.candidates.append(candidate)
+
+            if proposal is not None:
+                proposals.append(proposal)
+
+        return proposals
+
+
+def find_matches(limit: int = 5, min_score: float = 0.3) -> List[Proposal]:
+    return MatchEngine().propose(limit=limit, min_score=min_score)
@@ -0,0 +1,40 @@
+# Generated by Django 4.0.3 on 2026-10-18 02:49
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def calculate_claimed_totals(apps, schema_editor):
+    db_alias = schema_editor.connection.alias
+
+    # noinspection PyPep8Naming
+    Claim = apps.get_model("logistics", "Claim")
+    # noinspection PyPep8Naming
+    OfferItem = apps.get_model("supply_demand", "OfferItem")
+
+    totals = (
+        Claim.objects.using(db_alias)
+        .filter(offered_item=OuterRef("pk"))
+        .values("offered_item")
+        .annotate(total=Sum("amount"))
+        .values("total")
+    )
+    OfferItem.objects.using(db_alias).update(claimed_total=Coalesce(Subquery(totals), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("logistics", "0019_alter_equipmentdata_weight"),
+        ("supply_demand", "0028_offeritem_rejected"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="offeritem",
+            name="claimed_total",
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name="claimed"),
+        ),
+        migrations.RunPython(calculate_claimed_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.0.3 on 2026-10-18 02:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("supply_demand", "0029_offeritem_claimed_total"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="change",
+            name="diff",
+            field=models.JSONField(blank=True, default=dict, verbose_name="diff"),
+        ),
+        migrations.AlterField(
+            model_name="change",
+            name="when",
+            field=models.DateTimeField(auto_now_add=True, db_index=True, verbose_name="when"),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 4.0.3 on 2026-10-18 03:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def calculate_groups(apps, schema_editor):
+    db_alias = schema_editor.connection.alias
+
+    # noinspection PyPep8Naming
+    RequestItem = apps.get_model("supply_demand", "RequestItem")
+
+    items = {item.id: item for item in RequestItem.objects.using(db_alias).all()}
+    for item in items.values():
+        path = [item.id]
+        parent_id = item.alternative_for_id
+        while parent_id in items and parent_id not in path:
+            path.insert(0, parent_id)
+            parent_id = items[parent_id].alternative_for_id
+
+        item.group_root_id = path[0]
+        item.group_depth = len(path) - 1
+        item.group_path = "".join(f"{item_id}/" for item_id in path)
+
+    RequestItem.objects.using(db_alias).bulk_update(
+        items.values(), ["group_root", "group_depth", "group_path"], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("supply_demand", "0030_change_diff"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="requestitem",
+            name="group_depth",
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name="group depth"),
+        ),
+        migrations.AddField(
+            model_name="requestitem",
+            name="group_path",
+            field=models.CharField(blank=True, editable=False, max_length=250, verbose_name="group path"),
+        ),
+        migrations.AddField(
+            model_name="requestitem",
+            name="group_root",
+            field=models.ForeignKey(
+                blank=True,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="group_items",
+                to="supply_demand.requestitem",
+                verbose_name="group root",
+            ),
+        ),
+        migrations.RunPython(calculate_groups, migrations.RunPython.noop),
+    ]
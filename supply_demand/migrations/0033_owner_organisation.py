@@ -0,0 +1,56 @@
+# Generated by Django 4.0.3 on 2026-10-18 04:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_owner_organisations(apps, schema_editor):
+    db_alias = schema_editor.connection.alias
+
+    # noinspection PyPep8Naming
+    Contact = apps.get_model("contacts", "Contact")
+    organisations = Contact.objects.using(db_alias).filter(pk=OuterRef("contact")).values("organisation")[:1]
+    for model_name in ("Request", "Offer"):
+        model = apps.get_model("supply_demand", model_name)
+        model.objects.using(db_alias).update(owner_organisation=Subquery(organisations))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contacts", "0014_outgoingemail"),
+        ("supply_demand", "0032_trigram_search_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="offer",
+            name="owner_organisation",
+            field=models.ForeignKey(
+                blank=True,
+                editable=False,
+                help_text="The organisation of the contact, copied here so permissions can filter on it",
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="contacts.organisation",
+                verbose_name="owner organisation",
+            ),
+        ),
+        migrations.AddField(
+            model_name="request",
+            name="owner_organisation",
+            field=models.ForeignKey(
+                blank=True,
+                editable=False,
+                help_text="The organisation of the contact, copied here so permissions can filter on it",
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="contacts.organisation",
+                verbose_name="owner organisation",
+            ),
+        ),
+        migrations.RunPython(copy_owner_organisations, migrations.RunPython.noop),
+    ]
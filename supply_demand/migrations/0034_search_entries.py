@@ -0,0 +1,77 @@
+# Generated by Django 4.0.3 on 2026-10-18 04:40
+
+from django.db import OperationalError, migrations, models
+
+FTS_TABLE = "supply_demand_searchentry_fts"
+
+
+def create_search_index(apps, schema_editor):
+    # noinspection PyProtectedMember
+    table = apps.get_model("supply_demand", "SearchEntry")._meta.db_table
+
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {table}_content_trgm ON {table} USING gin ((UPPER(content::text)) gin_trgm_ops)"
+        )
+    elif schema_editor.connection.vendor == "sqlite":
+        try:
+            schema_editor.execute(
+                f"CREATE VIRTUAL TABLE {FTS_TABLE} "
+                f"USING fts5(content, content='{table}', content_rowid='id', tokenize='trigram')"
+            )
+        except OperationalError:
+            # SQLite without FTS5 or older than 3.34 doesn't have the trigram tokenizer, search the entries with LIKE
+            return
+
+        # An external content table, the triggers keep it in sync with the entries
+        schema_editor.execute(
+            f"CREATE TRIGGER {FTS_TABLE}_insert AFTER INSERT ON {table} BEGIN "
+            f"INSERT INTO {FTS_TABLE}(rowid, content) VALUES (new.id, new.content); END"
+        )
+        schema_editor.execute(
+            f"CREATE TRIGGER {FTS_TABLE}_delete AFTER DELETE ON {table} BEGIN "
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, content) VALUES ('delete', old.id, old.content); END"
+        )
+        schema_editor.execute(
+            f"CREATE TRIGGER {FTS_TABLE}_update AFTER UPDATE ON {table} BEGIN "
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, content) VALUES ('delete', old.id, old.content); "
+            f"INSERT INTO {FTS_TABLE}(rowid, content) VALUES (new.id, new.content); END"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    # noinspection PyProtectedMember
+    table = apps.get_model("supply_demand", "SearchEntry")._meta.db_table
+
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(f"DROP INDEX IF EXISTS {table}_content_trgm")
+    elif schema_editor.connection.vendor == "sqlite":
+        for trigger in ("insert", "delete", "update"):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{trigger}")
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("supply_demand", "0033_owner_organisation"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SearchEntry",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("index", models.CharField(max_length=50, verbose_name="index")),
+                ("object_id", models.PositiveBigIntegerField(verbose_name="object id")),
+                ("content", models.TextField(verbose_name="content")),
+            ],
+            options={
+                "verbose_name": "search entry",
+                "verbose_name_plural": "search entries",
+                "unique_together": {("index", "object_id")},
+            },
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
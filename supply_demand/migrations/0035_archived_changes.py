@@ -0,0 +1,51 @@
+# Generated by Django 4.0.3 on 2026-10-18 05:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("supply_demand", "0034_search_entries"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivedChange",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False, verbose_name="id")),
+                ("when", models.DateTimeField(db_index=True, verbose_name="when")),
+                (
+                    "action",
+                    models.PositiveIntegerField(
+                        choices=[(1, "Add"), (2, "Change"), (3, "Delete")], verbose_name="action"
+                    ),
+                ),
+                ("type", models.PositiveIntegerField(choices=[(1, "Offer"), (2, "Request")], verbose_name="type")),
+                ("what", models.CharField(max_length=250, verbose_name="what")),
+                (
+                    "data",
+                    models.BinaryField(
+                        help_text="The before, after and diff as zlib compressed JSON", verbose_name="data"
+                    ),
+                ),
+                (
+                    "who",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.RESTRICT,
+                        related_name="archived_changes",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="who",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "archived change",
+                "verbose_name_plural": "archived changes",
+                "ordering": ("when", "who"),
+            },
+        ),
+    ]
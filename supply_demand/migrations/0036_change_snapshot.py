@@ -0,0 +1,59 @@
+# Generated by Django 4.0.3 on 2026-10-18 06:10
+
+import json
+import zlib
+
+from django.db import migrations, models
+
+
+def keep_texts(apps, schema_editor):
+    db_alias = schema_editor.connection.alias
+
+    # noinspection PyPep8Naming
+    Change = apps.get_model("supply_demand", "Change")
+    # noinspection PyPep8Naming
+    ArchivedChange = apps.get_model("supply_demand", "ArchivedChange")
+
+    # The texts can't be turned back into snapshots, so the existing changes keep them
+    changes = []
+    for change in Change.objects.using(db_alias).only("id", "before", "after").iterator(chunk_size=1000):
+        change.snapshot = {"texts": {"before": change.before, "after": change.after}}
+        changes.append(change)
+    Change.objects.using(db_alias).bulk_update(changes, ["snapshot"], batch_size=500)
+
+    archived_changes = []
+    for archived in ArchivedChange.objects.using(db_alias).iterator(chunk_size=1000):
+        data = json.loads(zlib.decompress(archived.data))
+        data = {"snapshot": {"texts": {"before": data["before"], "after": data["after"]}}, "diff": data["diff"]}
+        archived.data = zlib.compress(json.dumps(data, separators=(",", ":")).encode(), 9)
+        archived_changes.append(archived)
+    ArchivedChange.objects.using(db_alias).bulk_update(archived_changes, ["data"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("supply_demand", "0035_archived_changes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="change",
+            name="snapshot",
+            field=models.JSONField(blank=True, default=dict, verbose_name="snapshot"),
+        ),
+        migrations.RunPython(keep_texts, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name="change",
+            name="after",
+        ),
+        migrations.RemoveField(
+            model_name="change",
+            name="before",
+        ),
+        migrations.AlterField(
+            model_name="archivedchange",
+            name="data",
+            field=models.BinaryField(help_text="The snapshot and diff as zlib compressed JSON", verbose_name="data"),
+        ),
+    ]
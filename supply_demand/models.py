@@ -1,8 +1,14 @@
+import json
 import sys
+import zlib
+from typing import Iterable, List, Optional, Tuple
 
 from django.core.exceptions import ValidationError
-from django.db import models
-from django.db.models import Sum
+from django.db import models, transaction
+from django.db.models import Exists, F, OuterRef, Q, Value
+from django.db.models.functions import Cast, Coalesce, Concat, Substr
+from django.db.models.signals import post_save
+from django.dispatch import receiver
 from django.utils.translation import gettext_lazy as _
 
 from contacts.models import Contact, Organisation
@@ -41,9 +47,30 @@ class ChangeType(models.IntegerChoices):
     REQUEST = 2, _("Request")
 
 
+def change_log_text(snapshot: dict) -> str:
+    """
+    The text of a snapshot, its items are either by primary key or, in a stored snapshot, a list.
+    """
+    out = []
+    for label, value in snapshot.get("fields", {}).items():
+        if not value:
+            continue
+        elif "\n" in value:
+            out.append(f"{label}:\n{value}")
+        else:
+            out.append(f"{label}: {value}")
+
+    out.append("Items:")
+    items = snapshot.get("items", [])
+    for item in sorted(items.values() if isinstance(items, dict) else items):
+        out.append(f"- {item}")
+
+    return "\n".join(out)
+
+
 class RequestManager(models.Manager):
     def get_queryset(self):
-        return super().get_queryset().prefetch_related("items__alternatives__alternatives", "contact__organisation")
+        return super().get_queryset().prefetch_related("items", "contact__organisation")
 
 
 class Request(models.Model):
@@ -70,6 +97,17 @@ class Request(models.Model):
         help_text=_("Internal notes that will NOT be shown publicly"),
     )
 
+    owner_organisation = models.ForeignKey(
+        verbose_name=_("owner organisation"),
+        to=Organisation,
+        blank=True,
+        null=True,
+        editable=False,
+        related_name="+",
+        on_delete=models.SET_NULL,
+        help_text=_("The organisation of the contact, copied here so permissions can filter on it"),
+    )
+
     created_at = models.DateTimeField(verbose_name=_("created at"), auto_now_add=True)
     updated_at = models.DateTimeField(verbose_name=_("updated at"), auto_now=True)
 
@@ -96,27 +134,41 @@ class Request(models.Model):
         else:
             return f"{self.contact}: {self.goal}"
 
-    def change_log_entry(self):
-        out = f"Contact: {self.contact}"
-        out += f"\nGoal: {self.goal}"
-        out += f"\nDescription:\n{self.description}"
-        out += "\nItems:"
-        if self.pk:
-            for item in RequestItem.objects.filter(request_id=self.pk):
-                out += f"\n- {item}"
-        return out
-
     def save(self, *args, **kwargs):
-        self.change_id = self.pk
-        self.change_before = Request.objects.get(pk=self.pk).change_log_entry() if self.pk else ""
-
+        # The owner organisation follows the contact, see supply_demand.permissions
+        self.owner_organisation_id = self.contact.organisation_id
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "contact" in update_fields:
+            kwargs["update_fields"] = [*update_fields, "owner_organisation"]
         super().save(*args, **kwargs)
 
+    def change_snapshot(self, items: Iterable["RequestItem"] = None) -> dict:
+        if items is None and self.pk:
+            items = self.items.all()
+
+        return {
+            "fields": {
+                "Contact": str(self.contact),
+                "Goal": self.goal,
+                "Description": self.description,
+            },
+            "items": {item.pk: str(item) for item in items or []},
+        }
+
+    def change_log_entry(self, items: Iterable["RequestItem"] = None) -> str:
+        return change_log_text(self.change_snapshot(items))
+
 
 class RequestItemManager(models.Manager):
     def get_queryset(self):
         return super().get_queryset().prefetch_related("request__contact__organisation")
 
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = super().bulk_create(objs, *args, **kwargs)
+        # bulk_create doesn't call save(), which maintains the alternative groups
+        update_groups(objs, self.db)
+        return objs
+
 
 class RequestItem(models.Model):
     request = models.ForeignKey(
@@ -166,6 +218,20 @@ class RequestItem(models.Model):
         help_text=_("In case there are multiple options to solve your problem"),
     )
 
+    # The item with its alternatives at any depth form a group, maintained by save(). The path lists the ids from
+    # the root of the group down to this item, like "12/15/".
+    group_root = models.ForeignKey(
+        verbose_name=_("group root"),
+        to="RequestItem",
+        blank=True,
+        null=True,
+        related_name="group_items",
+        on_delete=models.CASCADE,
+        editable=False,
+    )
+    group_depth = models.PositiveSmallIntegerField(verbose_name=_("group depth"), default=0, editable=False)
+    group_path = models.CharField(verbose_name=_("group path"), max_length=250, blank=True, editable=False)
+
     created_at = models.DateTimeField(verbose_name=_("created at"), auto_now_add=True)
     updated_at = models.DateTimeField(verbose_name=_("updated at"), auto_now=True)
 
@@ -173,6 +239,11 @@ class RequestItem(models.Model):
 
     _assigned = None
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Moving an item changes the summary of the request it came from as well
+        self.original_request_id = self.request_id
+
     class Meta:
         ordering = ("type", "brand", "model")
         verbose_name = _("requested item")
@@ -206,15 +277,91 @@ class RequestItem(models.Model):
             if self.alternative_for_id == self.id:
                 raise ValidationError({"alternative_for": "An item can't be an alternative for itself"})
 
-            alt = self.alternative_for
-            while alt:
-                if alt.id == self.id:
-                    raise ValidationError({"alternative_for": "Alternatives can't form a loop"})
-                alt = alt.alternative_for if alt.alternative_for_id else None
+            # Only an item below this one in the group has a path that starts with ours. The paths come from the
+            # database, the loaded items can be older than a move of their group.
+            paths = dict(
+                RequestItem.objects.filter(pk__in=[self.id, self.alternative_for_id]).values_list("pk", "group_path")
+            )
+            path = paths.get(self.id) or f"{self.id}/"
+            if paths.get(self.alternative_for_id, "").startswith(path):
+                raise ValidationError({"alternative_for": "Alternatives can't form a loop"})
 
         if self.amount == self.up_to:
             self.up_to = None
 
+    def group_position(self, using=None) -> Tuple[int, int, str]:
+        if not self.alternative_for_id:
+            return self.id, 0, f"{self.id}/"
+
+        root_id, depth, path = (
+            RequestItem.objects.using(using)
+            .filter(pk=self.alternative_for_id)
+            .values_list("group_root", "group_depth", "group_path")
+            .get()
+        )
+        if root_id is None:
+            # Written without save(), so its group is set now
+            parent = RequestItem.objects.using(using).prefetch_related(None).get(pk=self.alternative_for_id)
+            parent.update_group(using)
+            root_id, depth, path = parent.group_root_id, parent.group_depth, parent.group_path
+
+        return root_id, depth + 1, f"{path}{self.id}/"
+
+    def update_group(self, using=None):
+        old_root_id, old_depth, old_path = self.group_root_id, self.group_depth, self.group_path
+        root_id, depth, path = self.group_position(using)
+        if (root_id, depth, path) == (old_root_id, old_depth, old_path):
+            return
+
+        self.group_root_id, self.group_depth, self.group_path = root_id, depth, path
+        RequestItem.objects.using(using).filter(pk=self.pk).update(
+            group_root=root_id, group_depth=depth, group_path=path
+        )
+
+        # The alternatives of this item move along with it
+        if old_path:
+            RequestItem.objects.using(using).filter(group_root=old_root_id, group_path__startswith=old_path).exclude(
+                pk=self.pk
+            ).update(
+                group_root=root_id,
+                group_depth=F("group_depth") + (depth - old_depth),
+                group_path=Concat(Value(path), Substr("group_path", len(old_path) + 1)),
+            )
+
+    def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
+        with transaction.atomic(using=using):
+            super().save(force_insert, force_update, using, update_fields)
+            self.update_group(using)
+
+
+def update_groups(items: Iterable[RequestItem], using=None):
+    """
+    Set the groups of items that were created without save(), the items without alternative_for in a single query.
+    """
+    items = [item for item in items if item.pk]
+    roots = [item for item in items if not item.alternative_for_id]
+    if roots:
+        RequestItem.objects.using(using).filter(pk__in=[item.pk for item in roots]).update(
+            group_root=F("pk"), group_depth=0, group_path=Concat(Cast("pk", models.CharField()), Value("/"))
+        )
+        for item in roots:
+            item.group_root_id, item.group_depth, item.group_path = item.pk, 0, f"{item.pk}/"
+
+    for item in items:
+        if item.alternative_for_id:
+            item.update_group(using)
+
+
+def group_assigned() -> Exists:
+    """
+    Whether an item in the same alternative group as the outer requested item has been claimed. Items that were
+    written without save() or bulk_create(), like with update(), may have no group root, they are their own root.
+    """
+    root = Coalesce(OuterRef("group_root"), OuterRef("pk"))
+    return Exists(
+        RequestItem.objects.filter(Q(group_root=root) | Q(group_root__isnull=True, pk=root), claim__isnull=False)
+    )
+
 
 class OfferManager(models.Manager):
     def get_queryset(self):
@@ -260,6 +407,17 @@ class Offer(models.Model):
         help_text=_("Internal notes that will NOT be shown publicly"),
     )
 
+    owner_organisation = models.ForeignKey(
+        verbose_name=_("owner organisation"),
+        to=Organisation,
+        blank=True,
+        null=True,
+        editable=False,
+        related_name="+",
+        on_delete=models.SET_NULL,
+        help_text=_("The organisation of the contact, copied here so permissions can filter on it"),
+    )
+
     created_at = models.DateTimeField(verbose_name=_("created at"), auto_now_add=True)
     updated_at = models.DateTimeField(verbose_name=_("updated at"), auto_now=True)
 
@@ -286,23 +444,30 @@ class Offer(models.Model):
         else:
             return f"{self.contact}: {self.description}"
 
-    def change_log_entry(self):
-        out = f"Contact: {self.contact}"
-        if self.location:
-            out += f"\nLocation:\n{self.location}"
-        out += f"\nDelivery method: {self.get_delivery_method_display()}"
-        out += "\nItems:"
-        if self.pk:
-            for item in OfferItem.objects.filter(offer_id=self.pk):
-                out += f"\n- {item}"
-        return out
-
     def save(self, *args, **kwargs):
-        self.change_id = self.pk
-        self.change_before = Offer.objects.get(pk=self.pk).change_log_entry() if self.pk else ""
-
+        # The owner organisation follows the contact, see supply_demand.permissions
+        self.owner_organisation_id = self.contact.organisation_id
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "contact" in update_fields:
+            kwargs["update_fields"] = [*update_fields, "owner_organisation"]
         super().save(*args, **kwargs)
 
+    def change_snapshot(self, items: Iterable["OfferItem"] = None) -> dict:
+        if items is None and self.pk:
+            items = self.items.all()
+
+        return {
+            "fields": {
+                "Contact": str(self.contact),
+                "Location": self.location,
+                "Delivery method": str(self.get_delivery_method_display()),
+            },
+            "items": {item.pk: str(item) for item in items or []},
+        }
+
+    def change_log_entry(self, items: Iterable["OfferItem"] = None) -> str:
+        return change_log_text(self.change_snapshot(items))
+
 
 class OfferItemManager(models.Manager):
     def get_queryset(self):
@@ -330,12 +495,18 @@ class OfferItem(models.Model):
     rejected = models.BooleanField(verbose_name=_("rejected"), default=False)
     received = models.BooleanField(verbose_name=_("received"), default=False)
 
+    # Maintained by Claim, use the reconcile_claimed command to recalculate
+    claimed_total = models.PositiveIntegerField(verbose_name=_("claimed"), default=0, editable=False)
+
     created_at = models.DateTimeField(verbose_name=_("created at"), auto_now_add=True)
     updated_at = models.DateTimeField(verbose_name=_("updated at"), auto_now=True)
 
     objects = OfferItemManager()
 
-    _claimed = None
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Moving an item changes the summary of the offer it came from as well
+        self.original_offer_id = self.offer_id
 
     class Meta:
         ordering = ("type", "brand", "model")
@@ -354,21 +525,30 @@ class OfferItem(models.Model):
 
     @property
     def claimed(self):
-        if self._claimed is not None:
-            return self._claimed
-
-        return self.claim_set.aggregate(Sum("amount"))["amount__sum"] or 0
-
-    @claimed.setter
-    def claimed(self, value: bool):
-        self._claimed = value or 0
+        return self.claimed_total
 
     @property
     def available(self):
         if not self.amount:
             return 10
 
-        return self.amount - self.claimed
+        return self.amount - self.claimed_total
+
+    def save(self, *args, **kwargs):
+        # Never write back a claimed_total that may have been changed by a claim since this item was loaded
+        if (
+            not self._state.adding
+            and not args
+            and not kwargs.get("force_insert")
+            and kwargs.get("update_fields") is None
+        ):
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != "claimed_total"
+            ]
+
+        super().save(*args, **kwargs)
 
 
 class ChangeManager(models.Manager):
@@ -377,7 +557,7 @@ class ChangeManager(models.Manager):
 
 
 class Change(models.Model):
-    when = models.DateTimeField(verbose_name=_("when"), auto_now_add=True)
+    when = models.DateTimeField(verbose_name=_("when"), auto_now_add=True, db_index=True)
     who = models.ForeignKey(
         verbose_name=_("who"),
         to=Contact,
@@ -387,8 +567,10 @@ class Change(models.Model):
     action = models.PositiveIntegerField(verbose_name=_("action"), choices=ChangeAction.choices)
     type = models.PositiveIntegerField(verbose_name=_("type"), choices=ChangeType.choices)
     what = models.CharField(verbose_name=_("what"), max_length=250)
-    before = models.TextField(verbose_name=_("before"), blank=True)
-    after = models.TextField(verbose_name=_("after"), blank=True)
+    # The object after the change, the texts before and after are rebuilt from it and the diff. Changes that were
+    # logged as texts only keep those, as {"texts": {"before": ..., "after": ...}}.
+    snapshot = models.JSONField(verbose_name=_("snapshot"), default=dict, blank=True)
+    diff = models.JSONField(verbose_name=_("diff"), default=dict, blank=True)
 
     objects = ChangeManager()
 
@@ -408,3 +590,186 @@ class Change(models.Model):
             action = _("did something to")
 
         return f"{self.who.display_name()} {action} {self.get_type_display().lower()} {_('of')} {self.what}"
+
+    @classmethod
+    def from_snapshots(cls, before: dict, after: dict, **kwargs) -> Optional["Change"]:
+        """
+        Create an unsaved change from two snapshots, or None if nothing changed.
+
+        The diff looks like {"fields": {label: [before, after]}, "added": [...], "removed": [...],
+        "changed": [[before, after]]}, with empty parts left out.
+        """
+        diff = {}
+
+        before_fields = before.get("fields", {})
+        after_fields = after.get("fields", {})
+        fields = {
+            label: [before_fields.get(label, ""), after_fields.get(label, "")]
+            for label in {**before_fields, **after_fields}
+            if before_fields.get(label, "") != after_fields.get(label, "")
+        }
+        if fields:
+            diff["fields"] = fields
+
+        before_items = before.get("items", {})
+        after_items = after.get("items", {})
+        added = sorted(item for pk, item in after_items.items() if pk not in before_items)
+        removed = sorted(item for pk, item in before_items.items() if pk not in after_items)
+        changed = sorted(
+            [item, after_items[pk]]
+            for pk, item in before_items.items()
+            if pk in after_items and item != after_items[pk]
+        )
+        if added:
+            diff["added"] = added
+        if removed:
+            diff["removed"] = removed
+        if changed:
+            diff["changed"] = changed
+
+        if not diff:
+            return None
+
+        # The primary keys of the items are only needed for the diff
+        snapshot = (
+            {"fields": after.get("fields", {}), "items": sorted(after.get("items", {}).values())} if after else {}
+        )
+        return cls(snapshot=snapshot, diff=diff, **kwargs)
+
+    def before_snapshot(self) -> dict:
+        """
+        The snapshot from before the change: the stored one with the diff undone.
+        """
+        fields = dict(self.snapshot.get("fields", {}))
+        for label, values in self.diff.get("fields", {}).items():
+            fields[label] = values[0]
+
+        items = list(self.snapshot.get("items", []))
+        for item in self.diff.get("added", []):
+            items.remove(item)
+        for before, after in self.diff.get("changed", []):
+            items[items.index(after)] = before
+        items += self.diff.get("removed", [])
+
+        return {"fields": fields, "items": items}
+
+    @property
+    def before(self) -> str:
+        if "texts" in self.snapshot:
+            return self.snapshot["texts"]["before"]
+        if self.action == ChangeAction.ADD:
+            return ""
+        return change_log_text(self.before_snapshot())
+
+    @property
+    def after(self) -> str:
+        if "texts" in self.snapshot:
+            return self.snapshot["texts"]["after"]
+        if self.action == ChangeAction.DELETE:
+            return ""
+        return change_log_text(self.snapshot)
+
+    def diff_lines(self) -> List[str]:
+        lines = []
+        for label, (before, after) in self.diff.get("fields", {}).items():
+            if "\n" in before or "\n" in after:
+                lines.append(f"{label}:")
+                lines += [f"  - {line}" for line in before.splitlines()]
+                lines += [f"  + {line}" for line in after.splitlines()]
+            else:
+                lines.append(f"{label}: {before or '-'} → {after or '-'}")
+
+        lines += [f"+ {item}" for item in self.diff.get("added", [])]
+        lines += [f"- {item}" for item in self.diff.get("removed", [])]
+        lines += [f"~ {before} → {after}" for before, after in self.diff.get("changed", [])]
+        return lines
+
+
+class ArchivedChange(models.Model):
+    """
+    A change moved out of the change log by the archive_changes command, with its texts and diff compressed.
+    """
+
+    # The id it had as a change, so links to it keep working
+    id = models.BigIntegerField(verbose_name=_("id"), primary_key=True)
+    when = models.DateTimeField(verbose_name=_("when"), db_index=True)
+    who = models.ForeignKey(
+        verbose_name=_("who"),
+        to=Contact,
+        on_delete=models.RESTRICT,
+        related_name="archived_changes",
+    )
+    action = models.PositiveIntegerField(verbose_name=_("action"), choices=ChangeAction.choices)
+    type = models.PositiveIntegerField(verbose_name=_("type"), choices=ChangeType.choices)
+    what = models.CharField(verbose_name=_("what"), max_length=250)
+    data = models.BinaryField(verbose_name=_("data"), help_text=_("The snapshot and diff as zlib compressed JSON"))
+
+    class Meta:
+        ordering = ("when", "who")
+        verbose_name = _("archived change")
+        verbose_name_plural = _("archived changes")
+
+    def __str__(self):
+        return str(self.to_change())
+
+    @classmethod
+    def from_change(cls, change: Change) -> "ArchivedChange":
+        data = {"snapshot": change.snapshot, "diff": change.diff}
+        return cls(
+            id=change.id,
+            when=change.when,
+            who_id=change.who_id,
+            action=change.action,
+            type=change.type,
+            what=change.what,
+            data=zlib.compress(json.dumps(data, separators=(",", ":")).encode(), 9),
+        )
+
+    def to_change(self) -> Change:
+        """
+        The change as it was before it was archived, not saved.
+        """
+        data = json.loads(zlib.decompress(self.data))
+        change = Change(
+            id=self.id,
+            when=self.when,
+            who_id=self.who_id,
+            action=self.action,
+            type=self.type,
+            what=self.what,
+            **data,
+        )
+        if "who" in self._state.fields_cache:
+            change.who = self.who
+        return change
+
+
+class SearchEntry(models.Model):
+    """
+    The searchable text of an object in a search index, see supply_demand.search.
+    """
+
+    index = models.CharField(verbose_name=_("index"), max_length=50)
+    object_id = models.PositiveBigIntegerField(verbose_name=_("object id"))
+    content = models.TextField(verbose_name=_("content"))
+
+    class Meta:
+        unique_together = (("index", "object_id"),)
+        verbose_name = _("search entry")
+        verbose_name_plural = _("search entries")
+
+    def __str__(self):
+        return f"{self.index} {self.object_id}"
+
+
+# noinspection PyUnusedLocal
+@receiver(post_save, sender=Contact)
+def contact_saved(sender, instance: Contact, update_fields=None, using=None, **kwargs):
+    if update_fields is not None and "organisation" not in update_fields:
+        return
+
+    # Requests and offers move along with their contact to another organisation
+    for model in (Request, Offer):
+        model.objects.using(using).filter(contact=instance).exclude(owner_organisation=instance.organisation_id).update(
+            owner_organisation=instance.organisation_id
+        )
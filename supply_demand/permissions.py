@@ -0,0 +1,41 @@
+"""
+Object permissions of requests, offers and their items, as filters and annotations that the database evaluates.
+
+Superusers can change everything, other contacts what they own: their own requests and offers, or those of their
+organisation if they have one. Requests and offers store the organisation of their contact as owner_organisation,
+so both cases are a filter on a single indexed column, for a whole changelist as well as for a single object.
+"""
+
+from django.db.models import BooleanField, ExpressionWrapper, Model, Q, QuerySet, Value
+
+from contacts.models import Contact
+
+
+def owned_by(user: Contact, prefix: str = "") -> Q:
+    """
+    The objects the user owns. The prefix leads from the model to the request or offer, like "request__".
+    """
+    if user.organisation_id:
+        return Q(**{f"{prefix}owner_organisation": user.organisation_id})
+    return Q(**{f"{prefix}contact": user.pk})
+
+
+def with_change_permission(queryset: QuerySet, user: Contact, prefix: str = "") -> QuerySet:
+    """
+    Annotate whether the user can change each object as can_change.
+    """
+    if user.is_superuser:
+        return queryset.annotate(can_change=Value(True, output_field=BooleanField()))
+    return queryset.annotate(can_change=ExpressionWrapper(owned_by(user, prefix), output_field=BooleanField()))
+
+
+def can_change(user: Contact, obj: Model, prefix: str = "") -> bool:
+    if user.is_superuser:
+        return True
+
+    can_change = getattr(obj, "can_change", None)
+    if can_change is None:
+        # Not loaded through with_change_permission
+        # noinspection PyProtectedMember
+        can_change = type(obj)._base_manager.filter(owned_by(user, prefix), pk=obj.pk).exists()
+    return bool(can_change)
@@ -0,0 +1,418 @@
+"""
+A full-text index for the admin search fields and the search filter of the API.
+
+Every SearchIndex keeps one text per object: the values of its fields, which are lookups like those in search_fields,
+across all joins. Searching filters on those texts instead of LIKE over the joins with DISTINCT. On SQLite the texts
+are in an FTS5 table with the trigram tokenizer, which answers LIKE '%term%' from its index, on PostgreSQL a pg_trgm
+index does the same for icontains. Either way the results are those of the search fields.
+
+The texts are updated after the commit of every save or delete that changes them, including those of related
+objects: renaming an organisation updates the texts of the requests, offers, items, claims and changes of its
+contacts. Changes that don't send signals, like bulk_create and update(), call update_search_later().
+"""
+
+import threading
+from collections import defaultdict
+from typing import Dict, FrozenSet, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Set, Type
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Model, QuerySet
+from django.db.models.constants import LOOKUP_SEP
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import post_migrate, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils.text import smart_split, unescape_string_literal
+from rest_framework.filters import SearchFilter
+
+from logistics.models import Claim
+from supply_demand.models import Change, Offer, OfferItem, Request, RequestItem, SearchEntry
+
+FTS_TABLE = "supply_demand_searchentry_fts"
+
+
+class Dependency(NamedTuple):
+    index: "SearchIndex"
+    # The lookup from the model of the index to this model, empty for the model itself
+    path: str
+    model: Type[Model]
+    # The fields of this model that the texts use
+    fields: FrozenSet[str]
+
+
+class SearchIndex:
+    chunk_size = 1000
+
+    def __init__(self, name: str, model: Type[Model], fields: Sequence[str]):
+        self.name = name
+        self.model = model
+        self.fields = tuple(fields)
+
+    def __repr__(self):
+        return f"<SearchIndex {self.name}>"
+
+    def dependencies(self) -> List[Dependency]:
+        paths = {"": (self.model, set())}
+        for lookup in self.fields:
+            model, path = self.model, ""
+            *relations, name = lookup.split(LOOKUP_SEP)
+            for relation in relations:
+                # noinspection PyProtectedMember
+                field = model._meta.get_field(relation)
+                related_path = f"{path}{LOOKUP_SEP}{relation}" if path else relation
+                paths.setdefault(related_path, (field.related_model, set()))
+                if field.concrete:
+                    paths[path][1].add(field.name)
+                else:
+                    # A reverse relation, the foreign key is on the related model
+                    paths[related_path][1].add(field.field.name)
+                model, path = field.related_model, related_path
+            paths[path][1].add(name)
+
+        return [Dependency(self, path, model, frozenset(fields)) for path, (model, fields) in paths.items()]
+
+    def many_prefix(self, lookup: str) -> str:
+        """
+        The lookup up to its first relation to many objects, or an empty string if there is none.
+        """
+        model, parts = self.model, lookup.split(LOOKUP_SEP)
+        for position, part in enumerate(parts[:-1]):
+            # noinspection PyProtectedMember
+            field = model._meta.get_field(part)
+            if field.one_to_many or field.many_to_many:
+                return LOOKUP_SEP.join(parts[: position + 1])
+            model = field.related_model
+        return ""
+
+    def texts(self, pks: Sequence[int], using=None) -> Dict[int, str]:
+        # One query per relation to many objects, so the rows of two of them don't multiply
+        groups = defaultdict(list)
+        for lookup in self.fields:
+            groups[self.many_prefix(lookup)].append(lookup)
+
+        values = defaultdict(dict)
+        # noinspection PyProtectedMember
+        objects = self.model._base_manager.using(using).filter(pk__in=pks).order_by()
+        for lookups in groups.values():
+            for pk, *row in objects.values_list("pk", *lookups):
+                values[pk].update((text, None) for value in row for text in text_values(value))
+
+        # On separate lines, so a phrase can't match across two values
+        return {pk: "\n".join(texts) for pk, texts in values.items()}
+
+    def write(self, pks: Sequence[int], using=None):
+        texts = self.texts(pks, using)
+        with transaction.atomic(using=using):
+            SearchEntry.objects.using(using).filter(index=self.name, object_id__in=pks).delete()
+            SearchEntry.objects.using(using).bulk_create(
+                [SearchEntry(index=self.name, object_id=pk, content=text) for pk, text in texts.items() if text]
+            )
+
+    def update(self, pks: Iterable[int], using=None):
+        """
+        Update the texts of these objects, and remove those of deleted objects.
+        """
+        pks = sorted(set(pks))
+        for start in range(0, len(pks), self.chunk_size):
+            self.write(pks[start : start + self.chunk_size], using)
+
+    def rebuild(self, using=None):
+        SearchEntry.objects.using(using).filter(index=self.name).delete()
+        # noinspection PyProtectedMember
+        pks = list(self.model._base_manager.using(using).order_by("pk").values_list("pk", flat=True))
+        self.update(pks, using)
+
+    def matches(self, terms: Sequence[str], using=None) -> QuerySet:
+        """
+        The entries whose text contains all the terms, ignoring case.
+        """
+        entries = SearchEntry.objects.using(using).filter(index=self.name)
+        if has_fts_table(using):
+            # The trigram index only answers LIKE without ESCAPE, which is only needed for terms with wildcards
+            conditions, patterns = [], []
+            for term in terms:
+                if "%" in term or "_" in term:
+                    conditions.append("content LIKE %s ESCAPE '\\'")
+                    patterns.append(f"%{escape_like(term)}%")
+                else:
+                    conditions.append("content LIKE %s")
+                    patterns.append(f"%{term}%")
+            condition = " AND ".join(conditions)
+            return entries.filter(id__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {condition}", patterns))
+
+        for term in terms:
+            entries = entries.filter(content__icontains=term)
+        return entries
+
+    def filter(self, queryset: QuerySet, terms: Sequence[str]) -> QuerySet:
+        terms = [term for term in terms if term]
+        if not terms:
+            return queryset
+        return queryset.filter(pk__in=self.matches(terms, queryset.db).values("object_id"))
+
+
+def text_values(value) -> Iterator[str]:
+    # The strings of a JSON value, without its keys and punctuation
+    if isinstance(value, dict):
+        value = list(value.values())
+    if isinstance(value, list):
+        for part in value:
+            yield from text_values(part)
+    elif value not in (None, ""):
+        yield str(value)
+
+
+def escape_like(term: str) -> str:
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def has_fts_table(using=None) -> bool:
+    # Without FTS5 or its trigram tokenizer the migration didn't create it, then the entries are searched with LIKE
+    using = using or DEFAULT_DB_ALIAS
+    if using not in fts_tables:
+        connection = connections[using]
+        fts_tables[using] = connection.vendor == "sqlite" and FTS_TABLE in connection.introspection.table_names()
+    return fts_tables[using]
+
+
+fts_tables: Dict[str, bool] = {}
+
+
+indexes = [
+    SearchIndex(
+        "request",
+        Request,
+        (
+            "goal",
+            "description",
+            "contact__first_name",
+            "contact__last_name",
+            "contact__organisation__name",
+            "items__brand",
+            "items__model",
+            "items__notes",
+        ),
+    ),
+    SearchIndex(
+        "requestitem",
+        RequestItem,
+        (
+            "brand",
+            "model",
+            "notes",
+            "request__description",
+            "request__contact__organisation__name",
+            "request__contact__last_name",
+        ),
+    ),
+    SearchIndex("requestitem-api", RequestItem, ("brand", "model")),
+    SearchIndex(
+        "offer",
+        Offer,
+        (
+            "description",
+            "contact__first_name",
+            "contact__last_name",
+            "contact__organisation__name",
+            "items__brand",
+            "items__model",
+            "items__notes",
+        ),
+    ),
+    SearchIndex(
+        "offeritem",
+        OfferItem,
+        (
+            "brand",
+            "model",
+            "notes",
+            "offer__description",
+            "offer__contact__organisation__name",
+            "offer__contact__last_name",
+        ),
+    ),
+    # The public API and contacts that aren't superusers only search these
+    SearchIndex("offeritem-public", OfferItem, ("brand", "model", "notes")),
+    SearchIndex(
+        "claim",
+        Claim,
+        (
+            "offered_item__brand",
+            "offered_item__model",
+            "requested_item__brand",
+            "requested_item__model",
+            "offered_item__offer__contact__organisation__name",
+            "requested_item__request__contact__organisation__name",
+        ),
+    ),
+    SearchIndex(
+        "change",
+        Change,
+        (
+            "who__last_name",
+            "who__first_name",
+            "who__organisation__name",
+            "what",
+            "snapshot",
+            "diff",
+        ),
+    ),
+]
+
+dependencies: Dict[Type[Model], List[Dependency]] = defaultdict(list)
+for _index in indexes:
+    for _dependency in _index.dependencies():
+        dependencies[_dependency.model].append(_dependency)
+
+
+def find_index(model: Type[Model], fields: Iterable[str]) -> Optional[SearchIndex]:
+    """
+    The index with exactly these fields, a search over other fields can't use the texts.
+    """
+    fields = set(fields)
+    for index in indexes:
+        if index.model is model and set(index.fields) == fields:
+            return index
+    return None
+
+
+def search_terms(search_term: str) -> List[str]:
+    # Split like the admin does, quotes keep a phrase together
+    terms = []
+    for bit in smart_split(search_term):
+        if bit.startswith(('"', "'")) and bit[0] == bit[-1]:
+            bit = unescape_string_literal(bit)
+        terms.append(bit)
+    return terms
+
+
+def affected(model: Type[Model], pks: Sequence[int], using=None, update_fields=None) -> Dict[SearchIndex, Set[int]]:
+    """
+    The objects per index whose texts include these objects.
+    """
+    result = defaultdict(set)
+    for dependency in dependencies[model]:
+        if update_fields is not None and not dependency.fields.intersection(update_fields):
+            continue
+
+        if not dependency.path:
+            result[dependency.index].update(pks)
+        else:
+            # noinspection PyProtectedMember
+            objects = dependency.index.model._base_manager.using(using)
+            result[dependency.index].update(
+                objects.filter(**{f"{dependency.path}__in": pks}).order_by().values_list("pk", flat=True)
+            )
+    return result
+
+
+class PendingUpdates(threading.local):
+    def __init__(self):
+        super().__init__()
+        self.updates: Dict[str, Dict[SearchIndex, Set[int]]] = defaultdict(lambda: defaultdict(set))
+
+
+pending = PendingUpdates()
+
+
+def flush_updates(using: str):
+    updates = pending.updates.pop(using, {})
+    for index, pks in updates.items():
+        index.update(pks, using)
+
+
+def update_later(updates: Dict[SearchIndex, Set[int]], using=None):
+    using = using or DEFAULT_DB_ALIAS
+    updates = {index: pks for index, pks in updates.items() if pks}
+    if not updates:
+        return
+
+    # Everything of a transaction is written by the first callback. The updates of a transaction that is rolled back
+    # stay pending until the next commit, updating them then only costs some time.
+    for index, pks in updates.items():
+        pending.updates[using][index].update(pks)
+    transaction.on_commit(lambda: flush_updates(using), using=using)
+
+
+def update_search_later(model: Type[Model], pks: Iterable[int], using=None):
+    """
+    Update the texts that include these objects after the commit, for changes that don't send signals.
+    """
+    update_later(affected(model, list(pks), using), using)
+
+
+# noinspection PyUnusedLocal
+def object_saving(sender, instance: Model, raw=False, using=None, update_fields=None, **kwargs):
+    if raw or instance._state.adding:
+        return
+
+    # Moving an item to another request changes the text of the request it came from as well
+    instance.search_before = affected(sender, [instance.pk], using, update_fields)
+
+
+# noinspection PyUnusedLocal
+def object_saved(sender, instance: Model, raw=False, using=None, update_fields=None, **kwargs):
+    if raw:
+        return
+
+    updates = affected(sender, [instance.pk], using, update_fields)
+    for index, pks in getattr(instance, "search_before", {}).items():
+        updates[index].update(pks)
+    update_later(updates, using)
+
+
+# noinspection PyUnusedLocal
+def object_deleting(sender, instance: Model, using=None, **kwargs):
+    # Before the delete, when the related objects can still be found
+    update_later(affected(sender, [instance.pk], using), using)
+
+
+for _model in dependencies:
+    pre_save.connect(object_saving, sender=_model, dispatch_uid=f"search-saving-{_model._meta.label_lower}")
+    post_save.connect(object_saved, sender=_model, dispatch_uid=f"search-saved-{_model._meta.label_lower}")
+    pre_delete.connect(object_deleting, sender=_model, dispatch_uid=f"search-deleting-{_model._meta.label_lower}")
+
+
+# noinspection PyUnusedLocal
+@receiver(post_migrate)
+def build_missing_indexes(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    # Right after the migration that adds an index, the texts of the existing objects are missing
+    if sender.name != "supply_demand":
+        return
+
+    for index in indexes:
+        # noinspection PyProtectedMember
+        if (
+            not SearchEntry.objects.using(using).filter(index=index.name).exists()
+            and index.model._base_manager.using(using).exists()
+        ):
+            index.rebuild(using)
+
+
+class IndexedSearchMixin:
+    """
+    Search the admin through the index when there is one for the search fields.
+    """
+
+    def get_search_results(self, request, queryset, search_term):
+        index = find_index(queryset.model, self.get_search_fields(request))
+        terms = search_terms(search_term)
+        if index is None or not terms:
+            return super().get_search_results(request, queryset, search_term)
+
+        # Every object is in the index once, so there are no duplicates to remove
+        return index.filter(queryset, terms), False
+
+
+class IndexedSearchFilter(SearchFilter):
+    """
+    The search filter of the API, through the index when there is one for the search fields of the view.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        search_fields = self.get_search_fields(view, request)
+        terms = self.get_search_terms(request)
+        index = find_index(queryset.model, search_fields or ())
+        if index is None or not terms:
+            return super().filter_queryset(request, queryset, view)
+
+        return index.filter(queryset, terms)
@@ -0,0 +1,123 @@
+"""
+Rendered item summaries for the Request and Offer changelists.
+
+The summaries are cached per request or offer, and the missing ones of a page are rendered together from a single
+query. Anything that changes items or claims forgets the summaries of the requests and offers involved, in the cache
+that all workers share, see settings.CACHES.
+"""
+
+from collections import defaultdict
+from typing import Dict, Iterable, List, Type
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Exists, Model, OuterRef
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.html import format_html_join
+from django.utils.safestring import SafeString, mark_safe
+
+from logistics.models import Claim
+from supply_demand.models import Offer, OfferItem, Request, RequestItem
+
+SUMMARY_TIMEOUT = 3600
+
+
+def summary_key(model: Type[Model], pk: int) -> str:
+    # noinspection PyProtectedMember
+    return f"{model._meta.label_lower}-items-{pk}"
+
+
+def forget_summaries(model: Type[Model], pks: Iterable[int], using=None):
+    keys = [summary_key(model, pk) for pk in set(pks) if pk]
+    if keys:
+        # Only forget after the commit, otherwise a concurrent page view can cache the old state again
+        transaction.on_commit(lambda: cache.delete_many(keys), using=using)
+
+
+def cached_summaries(model: Type[Model], pks: Iterable[int], render) -> Dict[int, SafeString]:
+    pks = list(pks)
+    keys = {summary_key(model, pk): pk for pk in pks}
+    found = cache.get_many(keys.keys())
+    summaries = {keys[key]: summary for key, summary in found.items()}
+
+    missing = [pk for pk in pks if pk not in summaries]
+    if missing:
+        rendered = render(missing)
+        cache.set_many({summary_key(model, pk): rendered[pk] for pk in missing}, SUMMARY_TIMEOUT)
+        summaries.update(rendered)
+
+    return summaries
+
+
+def render_request_summaries(request_ids: List[int]) -> Dict[int, SafeString]:
+    items = (
+        RequestItem.objects.prefetch_related(None)
+        .filter(request_id__in=request_ids)
+        .annotate(assigned=Exists(Claim.objects.filter(requested_item=OuterRef("pk"))))
+    )
+
+    roots = defaultdict(list)
+    alternatives = defaultdict(list)
+    for item in items:
+        if item.alternative_for_id:
+            alternatives[item.alternative_for_id].append(item)
+        else:
+            roots[item.request_id].append(item)
+
+    def render(item: RequestItem) -> str:
+        out = ("✅ " if item.assigned else "") + item.counted_name
+        for alternative in alternatives[item.id]:
+            # Only the alternatives in the same request, so the summary doesn't depend on the other rows of the page
+            if alternative.request_id == item.request_id:
+                out += " or " + render(alternative)
+        return out
+
+    return {
+        request_id: format_html_join(mark_safe("<br>"), "{}", ((render(item),) for item in roots[request_id]))
+        for request_id in request_ids
+    }
+
+
+def render_offer_summaries(offer_ids: List[int]) -> Dict[int, SafeString]:
+    lines = defaultdict(list)
+    for item in OfferItem.objects.prefetch_related(None).filter(offer_id__in=offer_ids):
+        lines[item.offer_id].append(("⛔️ " if item.rejected else "", item.counted_name))
+
+    return {offer_id: format_html_join(mark_safe("<br>"), "{}{}", lines[offer_id]) for offer_id in offer_ids}
+
+
+def request_summaries(request_ids: Iterable[int]) -> Dict[int, SafeString]:
+    return cached_summaries(Request, request_ids, render_request_summaries)
+
+
+def offer_summaries(offer_ids: Iterable[int]) -> Dict[int, SafeString]:
+    return cached_summaries(Offer, offer_ids, render_offer_summaries)
+
+
+# noinspection PyUnusedLocal
+@receiver(post_save, sender=RequestItem)
+@receiver(post_delete, sender=RequestItem)
+def request_item_changed(sender, instance: RequestItem, using=None, **kwargs):
+    forget_summaries(Request, [instance.request_id, instance.original_request_id], using)
+
+
+# noinspection PyUnusedLocal
+@receiver(post_save, sender=OfferItem)
+@receiver(post_delete, sender=OfferItem)
+def offer_item_changed(sender, instance: OfferItem, using=None, **kwargs):
+    forget_summaries(Offer, [instance.offer_id, instance.original_offer_id], using)
+
+
+# noinspection PyUnusedLocal
+@receiver(post_save, sender=Claim)
+@receiver(post_delete, sender=Claim)
+def claim_changed(sender, instance: Claim, using=None, **kwargs):
+    # Claims decide which requested items are assigned
+    request_ids = (
+        RequestItem.objects.using(using)
+        .prefetch_related(None)
+        .filter(pk__in=[instance.requested_item_id, instance.original_requested_item_id])
+        .values_list("request_id", flat=True)
+    )
+    forget_summaries(Request, request_ids, using)
@@ -0,0 +1,480 @@
+from datetime import timedelta
+from functools import reduce
+from io import StringIO
+from operator import or_
+from types import SimpleNamespace
+from unittest import mock
+
+from django.contrib.auth.models import Group, Permission
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import IntegrityError
+from django.db.models import Q
+from django.test import TestCase
+from django.urls import reverse
+from django.utils.timezone import now
+from tablib import Dataset
+
+from aid_coordinator.testing import QueryBudgetMixin, QueryBudgetTestCase
+from contacts.models import Contact, Organisation
+from logistics.models import Claim
+from supply_demand.admin.admin import ChangeAdmin, RequestAdmin
+from supply_demand.admin.resources import OfferItemImportResource
+from supply_demand.matching import MatchEngine
+from supply_demand.models import (
+    ArchivedChange,
+    Change,
+    ChangeAction,
+    ChangeType,
+    Offer,
+    OfferItem,
+    Request,
+    RequestItem,
+    SearchEntry,
+    change_log_text,
+    group_assigned,
+)
+from supply_demand.search import SearchIndex, find_index, indexes
+
+
+class AdminQueryBudgetTests(QueryBudgetTestCase):
+    def test_request_changelist(self):
+        self.assertGetWithinBudget(reverse("admin:supply_demand_request_changelist"), 8)
+
+    def test_request_change_form(self):
+        request = Request.objects.order_by("pk").first()
+        self.assertGetWithinBudget(reverse("admin:supply_demand_request_change", args=(request.pk,)), 25)
+
+    def test_request_item_changelist(self):
+        self.assertGetWithinBudget(reverse("admin:supply_demand_requestitem_changelist"), 11)
+
+    def test_request_item_change_form(self):
+        item = RequestItem.objects.filter(claim__isnull=False).order_by("pk").first()
+        self.assertGetWithinBudget(reverse("admin:supply_demand_requestitem_change", args=(item.pk,)), 30)
+
+    def test_offer_changelist(self):
+        self.assertGetWithinBudget(reverse("admin:supply_demand_offer_changelist"), 9)
+
+    def test_offer_change_form(self):
+        offer = Offer.objects.order_by("pk").first()
+        self.assertGetWithinBudget(reverse("admin:supply_demand_offer_change", args=(offer.pk,)), 19)
+
+    def test_offer_item_changelist(self):
+        self.assertGetWithinBudget(reverse("admin:supply_demand_offeritem_changelist"), 19)
+
+    def test_offer_item_change_form(self):
+        item = OfferItem.objects.filter(claim__isnull=False).order_by("pk").first()
+        self.assertGetWithinBudget(reverse("admin:supply_demand_offeritem_change", args=(item.pk,)), 26)
+
+    def test_offer_item_changelist_cached_facets(self):
+        url = reverse("admin:supply_demand_offeritem_changelist")
+        self.client.get(url)
+        # The brand and organisation filters come from the cache
+        self.assertGetWithinBudget(url, 16)
+
+    def test_offer_item_changelist_new_brand(self):
+        url = reverse("admin:supply_demand_offeritem_changelist")
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            OfferItem.objects.create(offer=Offer.objects.first(), brand="Brocade", model="ICX 7150")
+        self.assertContains(self.client.get(url), "Brocade")
+
+    def test_change_changelist(self):
+        self.assertGetWithinBudget(reverse("admin:supply_demand_change_changelist"), 8)
+
+
+class ExportQueryBudgetTests(QueryBudgetTestCase):
+    def test_request_item_csv(self):
+        response = self.export(RequestItem, "export_csv", 8)
+        self.assertEqual(response["Content-Type"], "text/csv")
+
+    def test_request_item_xlsx(self):
+        self.export(RequestItem, "export_xlsx", 8)
+
+    def test_offer_item_csv(self):
+        response = self.export(OfferItem, "export_csv", 22)
+        self.assertEqual(response["Content-Type"], "text/csv")
+
+    def test_offer_item_xlsx(self):
+        self.export(OfferItem, "export_xlsx", 22)
+
+    def first_pks(self, model, count=20):
+        return list(model.objects.order_by("pk").values_list("pk", flat=True)[:count])
+
+    def test_request_item_columns(self):
+        self.assertSameExport(RequestItem, self.first_pks(RequestItem))
+
+    def test_offer_item_columns(self):
+        self.assertSameExport(OfferItem, self.first_pks(OfferItem))
+
+    def test_viewer_columns(self):
+        viewer = Contact.objects.create(username="viewer")
+        viewer.groups.add(Group.objects.get(name="Viewers"))
+        # django-import-export asks for the permission to view
+        viewer.user_permissions.add(Permission.objects.get(codename="view_offeritem"))
+        self.client.force_login(viewer)
+
+        lines = self.assertSameExport(OfferItem, self.first_pks(OfferItem))
+        self.assertNotIn("offer__contact__email", lines[0].split(","))
+
+
+class APIQueryBudgetTests(QueryBudgetTestCase):
+    def test_offered_items(self):
+        self.assertGetWithinBudget(reverse("offeritem-list"), 3, data={"page_size": 1000})
+
+    def test_requested_items(self):
+        self.assertGetWithinBudget(reverse("requestitem-list"), 3, data={"page_size": 1000})
+
+
+class ScopedQueryBudgetTests(QueryBudgetTestCase):
+    """
+    A requester only sees the requests of their organisation, filtered in the database.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.requester)
+
+    def test_request_changelist(self):
+        response = self.assertGetWithinBudget(reverse("admin:supply_demand_request_changelist"), 10)
+        own = Request.objects.filter(contact__organisation=self.requester.organisation_id).count()
+        self.assertEqual(response.context_data["cl"].result_count, own)
+
+    def test_request_change_form(self):
+        request = Request.objects.filter(contact__organisation=self.requester.organisation_id).order_by("pk").first()
+        self.assertGetWithinBudget(reverse("admin:supply_demand_request_change", args=(request.pk,)), 28)
+
+    def test_request_item_change_form(self):
+        item = RequestItem.objects.filter(request__contact__organisation=self.requester.organisation_id).first()
+        self.assertGetWithinBudget(reverse("admin:supply_demand_requestitem_change", args=(item.pk,)), 12)
+
+    def test_other_request_item(self):
+        item = RequestItem.objects.exclude(request__contact__organisation=self.requester.organisation_id).first()
+        response = self.client.get(reverse("admin:supply_demand_requestitem_change", args=(item.pk,)))
+        self.assertEqual(response.status_code, 403)
+
+
+class SearchTests(QueryBudgetTestCase):
+    """
+    Searching through the index finds the same objects as the search fields, with fewer queries.
+    """
+
+    @staticmethod
+    def searched(index: SearchIndex, terms):
+        # What the admin finds without the index
+        queryset = index.model.objects.all()
+        for term in terms:
+            queryset = queryset.filter(reduce(or_, (Q(**{f"{field}__icontains": term}) for field in index.fields)))
+        return set(queryset.values_list("pk", flat=True))
+
+    @staticmethod
+    def found(index: SearchIndex, terms):
+        return set(index.filter(index.model.objects.all(), terms).values_list("pk", flat=True))
+
+    def test_same_results_as_search_fields(self):
+        for index in indexes:
+            for terms in (["cisco"], ["organisation 1"], ["x12-", "juniper"], ["last 3", "notes 4"], ["x1_"], ["none"]):
+                with self.subTest(index=index.name, terms=terms):
+                    self.assertEqual(self.found(index, terms), self.searched(index, terms))
+
+    def test_request_changelist(self):
+        response = self.assertGetWithinBudget(reverse("admin:supply_demand_request_changelist"), 8, data={"q": "x12-"})
+        index = find_index(Request, RequestAdmin.search_fields)
+        self.assertEqual(response.context_data["cl"].result_count, len(self.searched(index, ["x12-"])))
+
+    def test_offer_item_changelist(self):
+        self.assertGetWithinBudget(reverse("admin:supply_demand_offeritem_changelist"), 19, data={"q": "cisco"})
+
+    def test_change_changelist(self):
+        self.assertGetWithinBudget(reverse("admin:supply_demand_change_changelist"), 8, data={"q": "last 3"})
+
+    def test_api(self):
+        response = self.assertGetWithinBudget(reverse("offeritem-list"), 3, data={"search": "x12- cisco"})
+        self.assertTrue(response.json())
+
+    def test_imported_items(self):
+        dataset = Dataset(headers=["brand", "model", "amount", "notes"])
+        dataset.append(["Brocade", "ICX 7150", 2, "Imported"])
+        form = SimpleNamespace(cleaned_data={"offer": Offer.objects.first()})
+        with self.captureOnCommitCallbacks(execute=True):
+            result = OfferItemImportResource().import_data(dataset, form=form)
+        self.assertFalse(result.has_errors())
+
+        response = self.client.get(reverse("offeritem-list"), {"search": "icx 7150"})
+        self.assertEqual([item["brand"] for item in response.json()["results"]], ["Brocade"])
+
+    def test_follows_related_changes(self):
+        organisation = Organisation.objects.get(name="Organisation 1")
+        with self.captureOnCommitCallbacks(execute=True):
+            organisation.name = "Renamed"
+            organisation.save()
+
+        requests = set(Request.objects.filter(contact__organisation=organisation).values_list("pk", flat=True))
+        self.assertTrue(requests)
+        self.assertEqual(self.found(find_index(Request, RequestAdmin.search_fields), ["renamed"]), requests)
+
+        item = OfferItem.objects.filter(claimed_total=0).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            item.delete()
+        self.assertFalse(SearchEntry.objects.filter(index="offeritem", object_id=item.pk).exists())
+
+
+class RequestItemGroupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        contact = Contact.objects.create(username="requester")
+        cls.request = Request.objects.create(contact=contact, goal="Network")
+        cls.offer = Offer.objects.create(contact=contact, description="Switches")
+
+    def group(self, item: RequestItem):
+        return RequestItem.objects.filter(pk=item.pk).values_list("group_root", "group_depth", "group_path").get()
+
+    def test_save(self):
+        root = RequestItem.objects.create(request=self.request, model="Root")
+        alternative = RequestItem.objects.create(request=self.request, model="Alternative", alternative_for=root)
+        self.assertEqual(self.group(root), (root.pk, 0, f"{root.pk}/"))
+        self.assertEqual(self.group(alternative), (root.pk, 1, f"{root.pk}/{alternative.pk}/"))
+
+    def test_bulk_create(self):
+        (root,) = RequestItem.objects.bulk_create([RequestItem(request=self.request, model="Root")])
+        (alternative,) = RequestItem.objects.bulk_create(
+            [RequestItem(request=self.request, model="Alternative", alternative_for=root)]
+        )
+        self.assertEqual(self.group(root), (root.pk, 0, f"{root.pk}/"))
+        self.assertEqual(self.group(alternative), (root.pk, 1, f"{root.pk}/{alternative.pk}/"))
+
+    def test_without_group(self):
+        root = RequestItem.objects.create(request=self.request, model="Root")
+        # Like items written by update() or raw SQL
+        RequestItem.objects.filter(pk=root.pk).update(group_root=None, group_path="")
+        alternative = RequestItem.objects.create(request=self.request, model="Alternative", alternative_for=root)
+        self.assertEqual(self.group(root), (root.pk, 0, f"{root.pk}/"))
+        self.assertEqual(self.group(alternative), (root.pk, 1, f"{root.pk}/{alternative.pk}/"))
+
+        other = RequestItem.objects.create(request=self.request, model="Other")
+        RequestItem.objects.filter(pk=other.pk).update(group_root=None, group_path="")
+        Claim.objects.create(
+            offered_item=OfferItem.objects.create(offer=self.offer, model="Other"), requested_item=other
+        )
+        assigned = RequestItem.objects.annotate(assigned=group_assigned()).values_list("pk", "assigned")
+        self.assertEqual(dict(assigned), {root.pk: False, alternative.pk: False, other.pk: True})
+
+    def test_loop(self):
+        first = RequestItem.objects.create(request=self.request, model="First")
+        second = RequestItem.objects.create(request=self.request, model="Second")
+        loaded = RequestItem.objects.get(pk=second.pk)
+
+        second.alternative_for = first
+        second.save()
+
+        # The loaded second item still has the path from before it moved below the first
+        first.alternative_for = loaded
+        with self.assertRaises(ValidationError):
+            first.clean()
+
+
+class MatchEngineTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        contact = Contact.objects.create(username="donor")
+        offer = Offer.objects.create(contact=contact, description="Switches")
+        cls.offered_item = OfferItem.objects.create(offer=offer, brand="Cisco", model="C9300-48P", amount=5)
+        cls.request = Request.objects.create(contact=contact, goal="Network")
+
+        # Two of the five are claimed already
+        claimed = RequestItem.objects.create(request=cls.request, brand="Cisco", model="C9300-48P", amount=2)
+        Claim.objects.create(offered_item=cls.offered_item, requested_item=claimed, amount=2)
+
+    def reserved(self, proposals):
+        return [proposal.candidates[0].amount for proposal in proposals]
+
+    def test_available(self):
+        for _ in range(3):
+            RequestItem.objects.create(request=self.request, brand="Cisco", model="C9300-48P", amount=2)
+
+        # The best candidates would all take 2, but only 3 are left
+        proposals = MatchEngine().propose()
+        self.assertEqual(self.reserved(proposals), [2, 1])
+        self.assertEqual(proposals[1].candidates[0].offered_item, self.offered_item)
+        self.assertFalse(proposals[1].candidates[0].complete)
+
+    def test_up_to(self):
+        RequestItem.objects.create(request=self.request, brand="Cisco", model="C9300-48P", amount=1, up_to=5)
+        self.assertEqual(self.reserved(MatchEngine().propose()), [3])
+
+    def test_alternatives(self):
+        # A group reserves for one of its members only
+        primary = RequestItem.objects.create(request=self.request, brand="Cisco", model="C9300-48P", amount=2)
+        RequestItem.objects.create(
+            request=self.request, brand="Cisco", model="C9300-48P", amount=2, alternative_for=primary
+        )
+        RequestItem.objects.create(request=self.request, brand="Cisco", model="C9300-48P", amount=2)
+
+        proposals = MatchEngine().propose()
+        self.assertEqual(sorted(self.reserved(proposals)), [1, 2])
+        self.assertIn(primary, [proposal.requested_item for proposal in proposals])
+
+
+class OfferItemImportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.offer = Offer.objects.create(contact=Contact.objects.create(username="donor"), description="Switches")
+
+    def import_items(self, *rows):
+        dataset = Dataset(*rows, headers=["brand", "model", "amount", "notes"])
+        form = SimpleNamespace(cleaned_data={"offer": self.offer})
+        with self.captureOnCommitCallbacks(execute=True):
+            return OfferItemImportResource().import_data(dataset, form=form)
+
+    def test_import(self):
+        result = self.import_items(["Brocade", "ICX 7150", 2, ""], ["Cisco", "C9300-48P", 1, "Spare"])
+        self.assertFalse(result.has_errors())
+        self.assertEqual(
+            sorted(self.offer.items.values_list("model", "amount")),
+            [("C9300-48P", 1), ("ICX 7150", 2)],
+        )
+
+    def test_failed_insert(self):
+        # Without raise_errors, import-export would only log this and report success
+        with mock.patch.object(type(OfferItem.objects), "bulk_create", side_effect=IntegrityError("failed")):
+            with self.assertRaises(IntegrityError):
+                self.import_items(["Brocade", "ICX 7150", 2, ""])
+        self.assertFalse(self.offer.items.exists())
+
+
+class ChangeTests(TestCase):
+    before = {
+        "fields": {"Contact": "Donor", "Location": "Kyiv\nWarehouse 2", "Delivery method": "Unknown"},
+        "items": {1: "1x Cisco C9300-48P", 2: "2x Juniper EX2300", 3: "1x Arista 7050"},
+    }
+    after = {
+        "fields": {"Contact": "Donor", "Location": "Lviv", "Delivery method": "Unknown"},
+        "items": {1: "2x Cisco C9300-48P", 3: "1x Arista 7050", 4: "4x Ubiquiti USW-24"},
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.who = Contact.objects.create(username="donor")
+
+    def change(self, before: dict, after: dict, action: ChangeAction) -> Change:
+        change = Change.from_snapshots(before, after, who=self.who, action=action, type=ChangeType.OFFER, what="Offer")
+        change.save()
+        return Change.objects.get(pk=change.pk)
+
+    def test_change(self):
+        change = self.change(self.before, self.after, ChangeAction.CHANGE)
+        self.assertEqual(change.before, change_log_text(self.before))
+        self.assertEqual(change.after, change_log_text(self.after))
+        self.assertEqual(
+            change.diff,
+            {
+                "fields": {"Location": ["Kyiv\nWarehouse 2", "Lviv"]},
+                "added": ["4x Ubiquiti USW-24"],
+                "removed": ["2x Juniper EX2300"],
+                "changed": [["1x Cisco C9300-48P", "2x Cisco C9300-48P"]],
+            },
+        )
+
+    def test_add(self):
+        change = self.change({}, self.after, ChangeAction.ADD)
+        self.assertEqual((change.before, change.after), ("", change_log_text(self.after)))
+
+    def test_delete(self):
+        change = self.change(self.before, {}, ChangeAction.DELETE)
+        self.assertEqual(change.snapshot, {})
+        self.assertEqual((change.before, change.after), (change_log_text(self.before), ""))
+
+    def test_texts(self):
+        # Logged before the snapshots, with only the texts
+        change = Change(
+            who=self.who,
+            action=ChangeAction.CHANGE,
+            type=ChangeType.OFFER,
+            what="Offer",
+            snapshot={"texts": {"before": "Items:\n- 1x Cisco", "after": "Items:\n- 2x Cisco"}},
+        )
+        self.assertEqual((change.before, change.after), ("Items:\n- 1x Cisco", "Items:\n- 2x Cisco"))
+
+    def test_search(self):
+        change = self.change(self.before, self.after, ChangeAction.CHANGE)
+        index = find_index(Change, ChangeAdmin.search_fields)
+        index.update([change.pk])
+
+        # Items that the change didn't touch, and what was removed
+        for term in ("arista", "juniper", "kyiv"):
+            self.assertEqual(list(index.filter(Change.objects.all(), [term])), [change])
+        # Only the values, not the keys of the snapshot
+        self.assertFalse(index.filter(Change.objects.all(), ["fields"]).exists())
+
+
+class ChangeArchiveTests(QueryBudgetMixin, TestCase):
+    """
+    Only changes, the archive doesn't need the offers, requests and claims of the other budgets.
+    """
+
+    changes = 300
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.superuser = Contact.objects.create(username="admin", is_superuser=True)
+        Change.objects.bulk_create(
+            [
+                Change.from_snapshots(
+                    before={"fields": {"Description": f"Offer {number}"}, "items": {number: f"1x Cisco X{number}"}},
+                    after={"fields": {"Description": f"Offer {number}"}, "items": {number: f"2x Cisco X{number}"}},
+                    who=cls.superuser,
+                    action=ChangeAction.CHANGE,
+                    type=ChangeType.OFFER,
+                    what=f"Offer {number}",
+                )
+                for number in range(cls.changes)
+            ]
+        )
+        # auto_now_add ignores the value given to bulk_create
+        Change.objects.filter(what__in=[f"Offer {number}" for number in range(cls.changes // 2)]).update(
+            when=now() - timedelta(days=400)
+        )
+        # bulk_create doesn't send signals
+        find_index(Change, ChangeAdmin.search_fields).rebuild()
+
+    def archive(self):
+        # The search texts of the moved changes are removed after the commit
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("archive_changes", days=365, batch_size=100, stdout=StringIO())
+
+    def test_archive(self):
+        originals = {change.pk: change for change in Change.objects.filter(when__lt=now() - timedelta(days=365))}
+        self.archive()
+
+        self.assertEqual(Change.objects.count(), self.changes - len(originals))
+        self.assertEqual(ArchivedChange.objects.count(), len(originals))
+        for archived in ArchivedChange.objects.all():
+            change, original = archived.to_change(), originals[archived.pk]
+            self.assertEqual(
+                (change.when, change.who_id, change.what, change.before, change.after, change.diff),
+                (original.when, original.who_id, original.what, original.before, original.after, original.diff),
+            )
+
+    def test_search_entries(self):
+        self.archive()
+
+        entries = SearchEntry.objects.filter(index="change")
+        self.assertFalse(entries.filter(object_id__in=ArchivedChange.objects.values("pk")).exists())
+        self.assertEqual(entries.count(), Change.objects.count())
+
+    def test_change_changelist(self):
+        self.archive()
+        response = self.assertGetWithinBudget(reverse("admin:supply_demand_change_changelist"), 9)
+        # Only the changes that aren't archived, with a link to the others
+        self.assertEqual(response.context["cl"].result_count, Change.objects.count())
+        self.assertContains(response, reverse("admin:supply_demand_archivedchange_changelist"))
+
+    def test_archived_changelist(self):
+        self.archive()
+        self.assertGetWithinBudget(reverse("admin:supply_demand_archivedchange_changelist"), 7, data={"q": "offer 1"})
+
+    def test_archived_change_form(self):
+        self.archive()
+        archived = ArchivedChange.objects.first()
+        response = self.assertGetWithinBudget(reverse("admin:supply_demand_change_change", args=(archived.pk,)), 7)
+        self.assertContains(response, f"1x Cisco X{archived.what.split()[-1]} → 2x Cisco")
@@ -0,0 +1,58 @@
+from django.contrib import messages
+from django.db import transaction
+from django.urls import reverse
+from django.utils.decorators import method_decorator
+from django.utils.translation import ngettext
+
+from aid_coordinator.decorators import superuser_required
+from aid_coordinator.views import AdminFormView
+from logistics.models import Claim
+from supply_demand.admin.forms import MatchForm
+from supply_demand.matching import find_matches, open_offered_items
+from supply_demand.models import RequestItem
+
+
+@method_decorator(superuser_required(), name="dispatch")
+class MatchView(AdminFormView):
+    template_name = "admin/matches.html"
+    form_class = MatchForm
+    admin_model = RequestItem
+    max_proposals = 100
+
+    def get_context_data(self, **kwargs):
+        data = super().get_context_data(**kwargs)
+        data["proposals"] = find_matches()[: self.max_proposals]
+        return data
+
+    def form_valid(self, form: MatchForm):
+        claims = form.cleaned_data["claims"]
+        offered_items = open_offered_items().in_bulk({offered_item_id for _, offered_item_id, _ in claims})
+
+        count = 0
+        with transaction.atomic():
+            for requested_item_id, offered_item_id, amount in claims:
+                offered_item = offered_items.get(offered_item_id)
+                if not offered_item:
+                    continue
+
+                # Things may have changed since the proposal was shown
+                amount = min(amount, offered_item.available)
+                if amount <= 0:
+                    continue
+
+                Claim.objects.create(offered_item=offered_item, requested_item_id=requested_item_id, amount=amount)
+                count += 1
+
+        messages.info(
+            self.request,
+            ngettext(
+                "%(count)s claim has been created",
+                "%(count)s claims have been created",
+                count,
+            )
+            % {"count": count},
+        )
+        return super().form_valid(form)
+
+    def get_success_url(self):
+        return reverse("admin:supply_demand_requestitem_matches")